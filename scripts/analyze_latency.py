@@ -5,22 +5,43 @@ python3 analyze_latency.py ../captures/sepolia/2024-07-18/setupMediator_2024-07-
 # Or analyze every capture for a given day / test slot
 python3 analyze_latency.py --day 2024-07-18 --slot all --test-name setupMediator --details --rpc-port 443
 
+# Same through the unified CLI, with a JSON result on stdout
+python3 sdr.py analyze --day 2024-07-18 --slot 1,2 --test-name setupMediator --rpc-port 443 --json
+
 '''
 import argparse
+import base64
+import bisect
 import csv
+import functools
 import json
+import math
 import os
 import re
 import shutil
 import statistics
 import string
 import subprocess
-import sqlite3
+import time
+from array import array
 from collections import Counter, deque
-from dataclasses import dataclass, replace
+from dataclasses import dataclass, field, replace
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple, Union
+
+from cli_args import add_json_arg, add_selection_args, run_command, slot_label
+from pcap_io import capture_stem, decompressed_stdin, is_capture, split_by_connection
+from record_store import RecordStore
+from stage_profile import (
+    StageProfiler,
+    StageTiming,
+    activate_profiler,
+    active_profiler,
+    print_profile_report,
+    profile_stage,
+    write_profile_report,
+)
 
 @dataclass
 class LatencyRecord:
@@ -40,6 +61,12 @@ class LatencyRecord:
     app_actor: Optional[str] = None
     related_payload_id: Optional[str] = None
     mediator_delta_ms: Optional[float] = None
+    request_bytes: Optional[int] = None
+    response_bytes: Optional[int] = None
+    tcp_segments: Optional[int] = None
+    goodput: Optional[float] = None
+    rpc_address: Optional[str] = None
+    rpc_selector: Optional[str] = None
 
 
 @dataclass
@@ -53,6 +80,28 @@ class HttpRequestInfo:
     src_port: Optional[str]
     dst_ip: Optional[str]
     dst_port: Optional[str]
+    request_bytes: Optional[int] = None
+    request_segments: Optional[int] = None
+    rpc_address: Optional[str] = None
+    rpc_selector: Optional[str] = None
+    didcomm: Optional["DidcommInfo"] = None
+
+
+@dataclass(frozen=True)
+class DidcommInfo:
+    envelope: str
+    msg_type: Optional[str]
+    msg_id: Optional[str]
+    from_did: Optional[str]
+    to_dids: Tuple[str, ...]
+    typ: Optional[str]
+    kid: Optional[str]
+    skid: Optional[str]
+    size: int
+
+    @property
+    def label(self) -> str:
+        return self.msg_type or self.typ or f"didcomm-{self.envelope}"
 
 
 @dataclass
@@ -63,6 +112,20 @@ class MediatorMessage:
     from_did: Optional[str]
     to_did: Optional[str]
     matched: bool = False
+    # Decoded `data` column (protocol bodies), filled when the table has one.
+    data: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class ClockOffset:
+    offset: float
+    drift: float
+    reference: float
+    spread: float
+    matches: int
+
+    def at(self, timestamp: float) -> float:
+        return self.offset + self.drift * (timestamp - self.reference)
 
 
 RESPONSE_MESSAGE_TYPES = {
@@ -70,6 +133,61 @@ RESPONSE_MESSAGE_TYPES = {
     "https://didcomm.org/messagepickup/3.0/messages-received",
 }
 
+# ERC-1056 registry reads issued by ethr-did-resolver: changed, identityOwner, nonce
+REGISTRY_SELECTORS = ("0xf96d0f9f", "0x8733d4e8", "0x70ae92d2")
+CHANGED_SELECTOR = REGISTRY_SELECTORS[0]
+
+SIZE_BUCKETS: List[Tuple[str, float]] = [
+    ("<1KB", 1024),
+    ("1-4KB", 4 * 1024),
+    ("4-16KB", 16 * 1024),
+    ("16-64KB", 64 * 1024),
+    (">=64KB", float("inf")),
+]
+
+# analyze_capture keeps records in a columnar RecordStore; the other scripts pass lists.
+Records = Union[List["LatencyRecord"], RecordStore]
+
+
+def as_store(records: Records) -> RecordStore:
+    return records if isinstance(records, RecordStore) else RecordStore.from_records(records)
+
+
+def request_start_times(records: Records) -> Iterable[float]:
+    if isinstance(records, RecordStore):
+        return records.request_times()
+    return (rec.timestamp - rec.latency for rec in records)
+
+
+def parse_int(value: Optional[str]) -> Optional[int]:
+    if not value:
+        return None
+    try:
+        return int(value.split(",")[0])
+    except ValueError:
+        return None
+
+
+def parse_float(value: Optional[str]) -> Optional[float]:
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def payload_size(payload: str) -> Optional[int]:
+    if not payload:
+        return None
+    return len(normalize_payload(payload).encode("utf-8"))
+
+
+def compute_goodput(
+    request_bytes: Optional[int], response_bytes: Optional[int], latency: float
+) -> Optional[float]:
+    if latency <= 0 or (request_bytes is None and response_bytes is None):
+        return None
+    return ((request_bytes or 0) + (response_bytes or 0)) / latency
+
 
 def normalize_payload(payload: str) -> str:
     if not payload:
@@ -124,7 +242,151 @@ def extract_rpc_info(payload: str) -> Tuple[Optional[str], Optional[str]]:
     if rpc_id is not None:
         rpc_id = str(rpc_id)
     return method, rpc_id
-    
+
+
+def extract_rpc_target(payload: str) -> Tuple[Optional[str], Optional[str]]:
+    # (DID address, 4-byte registry selector) of a registry read; eth_getLogs has no selector.
+    if not payload:
+        return None, None
+    try:
+        data = json.loads(normalize_payload(payload))
+    except json.JSONDecodeError:
+        return None, None
+    calls = data if isinstance(data, list) else [data]
+    for call in calls:
+        if not isinstance(call, dict):
+            continue
+        params = call.get("params")
+        if not isinstance(params, list) or not params or not isinstance(params[0], dict):
+            continue
+        method = call.get("method")
+        if method == "eth_call":
+            call_data = str(params[0].get("data") or params[0].get("input") or "")
+            selector = call_data[:10].lower()
+            if selector in REGISTRY_SELECTORS and len(call_data) >= 74:
+                return "0x" + call_data[34:74].lower(), selector
+        elif method == "eth_getLogs":
+            topics = params[0].get("topics")
+            if isinstance(topics, list) and len(topics) > 1 and isinstance(topics[1], str):
+                return "0x" + topics[1][-40:].lower(), None
+    return None, None
+
+
+def b64url_json(value: Any) -> Dict[str, Any]:
+    if not isinstance(value, str) or not value:
+        return {}
+    try:
+        raw = base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
+        data = json.loads(raw.decode("utf-8"))
+    except (ValueError, UnicodeDecodeError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def did_of(kid: Optional[str]) -> Optional[str]:
+    return kid.split("#", 1)[0] if isinstance(kid, str) and kid else None
+
+
+def as_did_tuple(value: Any) -> Tuple[str, ...]:
+    if isinstance(value, str):
+        return (value,)
+    if isinstance(value, list):
+        return tuple(str(item) for item in value if item)
+    return ()
+
+
+def plaintext_didcomm(
+    message: Dict[str, Any], envelope: str, size: int, **header: Optional[str]
+) -> Optional[DidcommInfo]:
+    msg_type = message.get("type")
+    if not isinstance(msg_type, str):
+        return None
+    to_dids = as_did_tuple(message.get("to"))
+    body = message.get("body")
+    if not to_dids and isinstance(body, dict) and body.get("next"):
+        to_dids = as_did_tuple(body.get("next"))
+    return DidcommInfo(
+        envelope=envelope,
+        msg_type=msg_type,
+        msg_id=str(message["id"]) if message.get("id") is not None else None,
+        from_did=message.get("from") or did_of(header.get("kid")),
+        to_dids=to_dids,
+        typ=header.get("typ") or message.get("typ"),
+        kid=header.get("kid"),
+        skid=None,
+        size=size,
+    )
+
+
+@functools.lru_cache(maxsize=4096)
+def decode_didcomm_payload(payload: str) -> Optional[DidcommInfo]:
+    text = normalize_payload(payload)
+    if not text:
+        return None
+    size = len(text.encode("utf-8"))
+    if text.count(".") == 2 and not text.startswith("{"):
+        header_b64, payload_b64, _ = text.split(".")
+        header = b64url_json(header_b64)
+        return plaintext_didcomm(
+            b64url_json(payload_b64), "signed", size, typ=header.get("typ"), kid=header.get("kid")
+        )
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(data, dict):
+        return None
+    if "ciphertext" in data:
+        protected = b64url_json(data.get("protected"))
+        kids = tuple(
+            str(recipient["header"]["kid"])
+            for recipient in data.get("recipients") or []
+            if isinstance(recipient, dict)
+            and isinstance(recipient.get("header"), dict)
+            and recipient["header"].get("kid")
+        )
+        skid = protected.get("skid")
+        return DidcommInfo(
+            envelope="encrypted",
+            msg_type=None,
+            msg_id=None,
+            from_did=did_of(skid),
+            to_dids=tuple(dict.fromkeys(did_of(kid) or kid for kid in kids)),
+            typ=protected.get("typ"),
+            kid=kids[0] if kids else None,
+            skid=skid,
+            size=size,
+        )
+    if "payload" in data and "signatures" in data:
+        signatures = data.get("signatures")
+        first = signatures[0] if isinstance(signatures, list) and signatures else {}
+        first = first if isinstance(first, dict) else {}
+        header = b64url_json(first.get("protected"))
+        if isinstance(first.get("header"), dict):
+            header.update(first["header"])
+        return plaintext_didcomm(
+            b64url_json(data.get("payload")),
+            "signed",
+            size,
+            typ=header.get("typ"),
+            kid=header.get("kid"),
+        )
+    return plaintext_didcomm(data, "plain", size)
+
+
+def run_tshark(pcap: Path, args: List[str]) -> str:
+    with profile_stage("tshark") as rows, decompressed_stdin(pcap) as (source, stdin):
+        result = subprocess.run(
+            ["tshark", "-r", source] + args,
+            stdin=stdin,
+            check=True,
+            capture_output=True,
+            text=True,
+        )
+        rows[0] = result.stdout.count("\n")
+    return result.stdout
+
+
 def check_tshark() -> None:
     if shutil.which("tshark") is None:
         raise RuntimeError(
@@ -161,14 +423,11 @@ def collect_requests(
         "tcp.srcport",
         "ip.dst",
         "tcp.dstport",
+        "http.content_length",
+        "tcp.len",
+        "tcp.segment.count",
     ]
-    cmd = [
-        "tshark",
-        "-r",
-        str(pcap),
-    ]
-    if extra_args:
-        cmd.extend(extra_args)
+    cmd: List[str] = list(extra_args or [])
     cmd.extend(
         [
             "-Y",
@@ -181,16 +440,30 @@ def collect_requests(
             "occurrence=f",
         ]
     )
-    for field in fields:
-        cmd.extend(["-e", field])
-    result = subprocess.run(cmd, check=True, capture_output=True, text=True)
+    for name in fields:
+        cmd.extend(["-e", name])
+    with profile_stage("collect_requests") as rows:
+        requests = parse_requests(run_tshark(pcap, cmd), len(fields))
+        rows[0] = len(requests)
+    return requests
+
+
+def parse_requests(output: str, field_count: int) -> Dict[str, HttpRequestInfo]:
     requests: Dict[str, HttpRequestInfo] = {}
-    for line in result.stdout.splitlines():
+    for line in output.splitlines():
         parts = line.split("\t")
-        if len(parts) != len(fields):
+        if len(parts) != field_count:
             continue
         payload = parts[4] if len(parts) > 4 else ""
-        rpc_method, rpc_id = extract_rpc_info(payload)
+        didcomm = decode_didcomm_payload(payload) if payload else None
+        if didcomm is not None:
+            rpc_method, rpc_id = didcomm.label, didcomm.msg_id
+        else:
+            rpc_method, rpc_id = extract_rpc_info(payload)
+        rpc_address, rpc_selector = (None, None) if didcomm else extract_rpc_target(payload)
+        request_bytes = (
+            parse_int(parts[9]) or payload_size(payload) or parse_int(parts[10])
+        )
         requests[parts[0]] = HttpRequestInfo(
             method=parts[1] or None,
             host=parts[2] or None,
@@ -201,11 +474,201 @@ def collect_requests(
             src_port=parts[6] or None,
             dst_ip=parts[7] or None,
             dst_port=parts[8] or None,
+            request_bytes=request_bytes,
+            request_segments=parse_int(parts[11]) or 1,
+            rpc_address=rpc_address,
+            rpc_selector=rpc_selector,
+            didcomm=didcomm,
         )
     return requests
 
 
+def merge_duplicate_keys(pairs: List[Tuple[str, Any]]) -> Dict[str, Any]:
+    # tshark -T json repeats a key when a packet carries several PDUs of one protocol.
+    merged: Dict[str, Any] = {}
+    for key, value in pairs:
+        if key in merged:
+            current = merged[key]
+            merged[key] = (current if isinstance(current, list) else [current]) + [value]
+        else:
+            merged[key] = value
+    return merged
+
+
+def json_values(node: Any, key: str) -> Iterable[Any]:
+    if isinstance(node, dict):
+        for name, value in node.items():
+            if name == key:
+                if isinstance(value, list):
+                    yield from value
+                else:
+                    yield value
+            else:
+                yield from json_values(value, key)
+    elif isinstance(node, list):
+        for item in node:
+            yield from json_values(item, key)
+
+
+def json_first(node: Any, key: str) -> Optional[str]:
+    value = next(iter(json_values(node, key)), None)
+    return str(value) if value is not None else None
+
+
+def http2_frames(layer: Any) -> Iterable[Dict[str, Any]]:
+    # Every HTTP/2 frame of a packet is a dict holding its own http2.streamid.
+    if isinstance(layer, dict):
+        if "http2.streamid" in layer:
+            yield layer
+            return
+        for value in layer.values():
+            yield from http2_frames(value)
+    elif isinstance(layer, list):
+        for item in layer:
+            yield from http2_frames(item)
+
+
+@dataclass
+class Http2Exchange:
+    src_ip: str
+    src_port: str
+    dst_ip: str
+    dst_port: str
+    headers: Dict[str, str]
+    request_body: bytearray
+    response_body: bytearray
+    request_end: Optional[float] = None
+    response_end: Optional[float] = None
+    response_frame: str = ""
+    status: str = ""
+
+
+def parse_http2_packets(packets: List[Dict[str, Any]], port: int) -> List[LatencyRecord]:
+    exchanges: Dict[Tuple[str, int], Http2Exchange] = {}
+    done: List[Http2Exchange] = []
+    for packet in packets:
+        layers = packet.get("_source", {}).get("layers", {})
+        if "http2" not in layers:
+            continue
+        timestamp = parse_float(json_first(layers.get("frame"), "frame.time_epoch"))
+        frame_number = json_first(layers.get("frame"), "frame.number") or ""
+        tcp = layers.get("tcp")
+        stream = json_first(tcp, "tcp.stream")
+        src_port = json_first(tcp, "tcp.srcport") or ""
+        dst_port = json_first(tcp, "tcp.dstport") or ""
+        ip_layer = layers.get("ip") or layers.get("ipv6")
+        src_ip = json_first(ip_layer, "ip.src") or json_first(ip_layer, "ipv6.src") or ""
+        dst_ip = json_first(ip_layer, "ip.dst") or json_first(ip_layer, "ipv6.dst") or ""
+        if timestamp is None or stream is None:
+            continue
+        from_client = dst_port == str(port)
+        for frame in http2_frames(layers["http2"]):
+            stream_id = parse_int(str(frame.get("http2.streamid")))
+            if not stream_id:
+                continue
+            key = (stream, stream_id)
+            exchange = exchanges.get(key)
+            if exchange is None:
+                if not from_client:
+                    continue
+                exchange = Http2Exchange(
+                    src_ip, src_port, dst_ip, dst_port, {}, bytearray(), bytearray()
+                )
+                exchanges[key] = exchange
+            for name in ("http2.headers.method", "http2.headers.path", "http2.headers.authority"):
+                value = json_first(frame, name)
+                if value is not None:
+                    exchange.headers.setdefault(name.rsplit(".", 1)[-1], value)
+            status = json_first(frame, "http2.headers.status")
+            if status is not None and not from_client:
+                exchange.status = status
+            for data in json_values(frame, "http2.data.data"):
+                chunk = bytes.fromhex(str(data).replace(":", "")) if data else b""
+                (exchange.request_body if from_client else exchange.response_body).extend(chunk)
+            if json_first(frame, "http2.flags.end_stream") in ("1", "True", "true"):
+                if from_client:
+                    exchange.request_end = timestamp
+                else:
+                    exchange.response_end = timestamp
+                    exchange.response_frame = frame_number
+                    done.append(exchanges.pop(key))
+    records: List[LatencyRecord] = []
+    for exchange in done:
+        if exchange.request_end is None or exchange.response_end is None:
+            continue
+        latency = exchange.response_end - exchange.request_end
+        if latency < 0:
+            continue
+        payload = exchange.request_body.decode("utf-8", errors="ignore")
+        didcomm = decode_didcomm_payload(payload) if payload else None
+        if didcomm is not None:
+            rpc_method, rpc_id = didcomm.label, didcomm.msg_id
+        else:
+            rpc_method, rpc_id = extract_rpc_info(payload)
+        rpc_address, rpc_selector = (None, None) if didcomm else extract_rpc_target(payload)
+        request_bytes = len(exchange.request_body) or None
+        response_bytes = len(exchange.response_body) or None
+        records.append(
+            LatencyRecord(
+                frame_number=exchange.response_frame,
+                timestamp=exchange.response_end,
+                src_ip=exchange.src_ip,
+                src_port=exchange.src_port,
+                dst_ip=exchange.dst_ip,
+                dst_port=exchange.dst_port,
+                method=exchange.headers.get("method", ""),
+                host=exchange.headers.get("authority", ""),
+                uri=exchange.headers.get("path", ""),
+                status=exchange.status,
+                latency=latency,
+                rpc_method=rpc_method,
+                rpc_id=rpc_id,
+                request_bytes=request_bytes,
+                response_bytes=response_bytes,
+                # Streams share the connection's TCP segments, so none are attributed.
+                tcp_segments=None,
+                goodput=compute_goodput(request_bytes, response_bytes, latency),
+                rpc_address=rpc_address,
+                rpc_selector=rpc_selector,
+                app_actor=didcomm.from_did if didcomm else None,
+            )
+        )
+    records.sort(key=lambda rec: rec.timestamp)
+    return records
+
+
+def collect_http2_records(
+    pcap: Path, port: int, extra_args: Optional[List[str]] = None
+) -> List[LatencyRecord]:
+    # http.time/request_in are HTTP/1.x only: HTTP/2 exchanges are paired on
+    # (tcp.stream, http2.streamid) and closed by the END_STREAM flag of each side.
+    cmd: List[str] = list(extra_args or [])
+    cmd.extend(
+        [
+            "-Y",
+            f"http2.streamid > 0 && tcp.port == {port}",
+            "-T",
+            "json",
+            "-j",
+            "frame ip ipv6 tcp http2",
+        ]
+    )
+    output = run_tshark(pcap, cmd)
+    if not output.strip():
+        return []
+    with profile_stage("http2_pairing") as rows:
+        packets = json.loads(output, object_pairs_hook=merge_duplicate_keys)
+        records = parse_http2_packets(packets if isinstance(packets, list) else [packets], port)
+        rows[0] = len(records)
+    return records
+
+
 def collect_tls_latencies(pcap: Path, port: int) -> List[LatencyRecord]:
+    return [rec for _, rec in tls_exchanges(pcap, port)]
+
+
+def tls_exchanges(pcap: Path, port: int) -> Iterable[Tuple[int, LatencyRecord]]:
+    # Yields (response frame, record) in response order.
     fields = [
         "frame.number",
         "frame.time_epoch",
@@ -214,11 +677,9 @@ def collect_tls_latencies(pcap: Path, port: int) -> List[LatencyRecord]:
         "ip.dst",
         "tcp.dstport",
         "tcp.stream",
+        "tcp.len",
     ]
     cmd = [
-        "tshark",
-        "-r",
-        str(pcap),
         "-Y",
         f"tls.record.content_type == 23 && tcp.port == {port}",
         "-T",
@@ -228,12 +689,11 @@ def collect_tls_latencies(pcap: Path, port: int) -> List[LatencyRecord]:
         "-E",
         "occurrence=f",
     ]
-    for field in fields:
-        cmd.extend(["-e", field])
-    result = subprocess.run(cmd, check=True, capture_output=True, text=True)
-    pending: Dict[str, Deque[Tuple[float, str, str, str, str, str]]] = {}
-    records: List[LatencyRecord] = []
-    for line in result.stdout.splitlines():
+    for name in fields:
+        cmd.extend(["-e", name])
+    output = run_tshark(pcap, cmd)
+    pending: Dict[str, Deque[Tuple[float, str, str, str, str, str, Optional[int]]]] = {}
+    for line in output.splitlines():
         parts = line.split("\t")
         if len(parts) != len(fields):
             continue
@@ -261,6 +721,7 @@ def collect_tls_latencies(pcap: Path, port: int) -> List[LatencyRecord]:
                     dst_ip,
                     dst_port,
                     parts[0],
+                    parse_int(parts[7]),
                 )
             )
             continue
@@ -268,13 +729,20 @@ def collect_tls_latencies(pcap: Path, port: int) -> List[LatencyRecord]:
             stream_queue = pending.get(stream_id)
             if not stream_queue:
                 continue
-            request_ts, req_src_ip, req_src_port, req_dst_ip, req_dst_port, req_frame = (
-                stream_queue.popleft()
-            )
+            (
+                request_ts,
+                req_src_ip,
+                req_src_port,
+                req_dst_ip,
+                req_dst_port,
+                req_frame,
+                request_bytes,
+            ) = stream_queue.popleft()
             latency = timestamp - request_ts
             if latency < 0:
                 continue
-            records.append(
+            response_bytes = parse_int(parts[7])
+            yield int(parts[0]), (
                 LatencyRecord(
                     frame_number=req_frame,
                     timestamp=timestamp,
@@ -287,9 +755,12 @@ def collect_tls_latencies(pcap: Path, port: int) -> List[LatencyRecord]:
                     uri="-",
                     status="-",
                     latency=latency,
+                    request_bytes=request_bytes,
+                    response_bytes=response_bytes,
+                    tcp_segments=2,
+                    goodput=compute_goodput(request_bytes, response_bytes, latency),
                 )
             )
-    return records
 
 
 def parse_timestamp(value: Optional[str]) -> Optional[float]:
@@ -304,20 +775,38 @@ def parse_timestamp(value: Optional[str]) -> Optional[float]:
     return dt.timestamp()
 
 
-def load_mediator_messages(db_path: Path) -> Tuple[List[MediatorMessage], Optional[str]]:
+def parse_message_data(value: Optional[str]) -> Dict[str, Any]:
+    if not value:
+        return {}
+    try:
+        data = json.loads(value)
+    except (TypeError, json.JSONDecodeError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def load_mediator_messages(
+    db_path: Path, mediator_only: bool = True
+) -> Tuple[List[MediatorMessage], Optional[str]]:
+    # mediator_only keeps the messages addressed to the mediator (what it received
+    # over HTTP); mediator_dwell.py needs the whole table, queued messages included.
     if not db_path.exists():
         return [], None
+    import sqlite3
+
     connection = sqlite3.connect(str(db_path))
     connection.row_factory = sqlite3.Row
     try:
         cursor = connection.cursor()
+        columns = {row["name"] for row in cursor.execute("PRAGMA table_info(message)")}
         mediator_row = cursor.execute(
             "SELECT did FROM identifier WHERE alias='mediator' LIMIT 1"
         ).fetchone()
         mediator_did = mediator_row["did"] if mediator_row else None
-        query = "SELECT id, type, saveDate, createdAt, fromDid, toDid FROM message"
+        data_column = "data" if "data" in columns else "NULL"
+        query = f"SELECT id, type, saveDate, createdAt, fromDid, toDid, {data_column} AS data FROM message"
         params: Tuple[object, ...] = ()
-        if mediator_did:
+        if mediator_did and mediator_only:
             query += " WHERE toDid = ? ORDER BY saveDate"
             params = (mediator_did,)
         else:
@@ -336,6 +825,7 @@ def load_mediator_messages(db_path: Path) -> Tuple[List[MediatorMessage], Option
                     timestamp=timestamp,
                     from_did=row["fromDid"],
                     to_did=row["toDid"],
+                    data=parse_message_data(row["data"]),
                 )
             )
         return messages, mediator_did
@@ -343,77 +833,166 @@ def load_mediator_messages(db_path: Path) -> Tuple[List[MediatorMessage], Option
         connection.close()
 
 
+def estimate_clock_offset(
+    records: Records,
+    messages: List[MediatorMessage],
+    search_window: float = 30.0,
+    bin_width: float = 0.05,
+    min_matches: int = 3,
+) -> Optional[ClockOffset]:
+    if not records or not messages:
+        return None
+    request_times = sorted(request_start_times(records))
+    diffs: List[Tuple[float, float, float]] = []
+    for msg in messages:
+        lo = bisect.bisect_left(request_times, msg.timestamp - search_window)
+        hi = bisect.bisect_right(request_times, msg.timestamp + search_window)
+        for request_time in request_times[lo:hi]:
+            diffs.append((msg.timestamp - request_time, request_time, msg.timestamp))
+    if not diffs:
+        return None
+    # Cross-correlate: the bin collecting most message/request pairs is the offset.
+    histogram = Counter(int(diff // bin_width) for diff, _, _ in diffs)
+    peak_bin = max(
+        histogram,
+        key=lambda key: histogram[key] + histogram.get(key - 1, 0) + histogram.get(key + 1, 0),
+    )
+    center = (peak_bin + 0.5) * bin_width
+    closest: Dict[float, Tuple[float, float]] = {}
+    for diff, request_time, msg_time in diffs:
+        if abs(diff - center) > 2 * bin_width:
+            continue
+        current = closest.get(msg_time)
+        if current is None or abs(diff - center) < abs(current[0] - center):
+            closest[msg_time] = (diff, request_time)
+    if len(closest) < min_matches:
+        return None
+    points = sorted(closest.values(), key=lambda item: item[1])
+    reference = points[0][1]
+    xs = [request_time - reference for _, request_time in points]
+    ys = [diff for diff, _ in points]
+    fit = linear_regression(xs, ys)
+    if fit is None:
+        offset, drift = statistics.median(ys), 0.0
+    else:
+        drift, offset, _ = fit
+    residuals = [abs(y - (offset + drift * x)) for x, y in zip(xs, ys)]
+    return ClockOffset(
+        offset=offset,
+        drift=drift,
+        reference=reference,
+        spread=statistics.median(residuals),
+        matches=len(points),
+    )
+
+
+def apply_clock_offset(
+    messages: List[MediatorMessage], clock: ClockOffset
+) -> List[MediatorMessage]:
+    return [
+        replace(msg, timestamp=msg.timestamp - clock.at(msg.timestamp))
+        for msg in messages
+    ]
+
+
+def align_mediator_messages(
+    records: Records,
+    messages: List[MediatorMessage],
+    manual_offset: Optional[float] = None,
+    auto: bool = True,
+    min_tolerance: float = 0.005,
+) -> Tuple[List[MediatorMessage], float, Optional[ClockOffset]]:
+    if manual_offset is not None:
+        clock = ClockOffset(manual_offset, 0.0, 0.0, 0.0, 0)
+        return apply_clock_offset(messages, clock), 5.0, clock
+    if not auto:
+        return messages, 5.0, None
+    clock = estimate_clock_offset(records, messages)
+    if clock is None:
+        return messages, 5.0, None
+    tolerance = max(min_tolerance, 4 * clock.spread)
+    return apply_clock_offset(messages, clock), tolerance, clock
+
+
 def annotate_with_mediator(
-    records: List[LatencyRecord],
+    records: Records,
     messages: List[MediatorMessage],
     mediator_did: Optional[str],
+    tolerance: float = 5.0,
 ) -> None:
     if not messages:
         return
+    store = as_store(records)
     messages_sorted = sorted(messages, key=lambda msg: msg.timestamp)
-    tolerance = 5.0
-    msg_index = 0
-    for rec in sorted(records, key=lambda r: r.timestamp):
-        request_time = rec.timestamp - rec.latency
+    message_times = [msg.timestamp for msg in messages_sorted]
+    request_times = store.request_times()
+    # Requests in start order, each searching its own +-tolerance window: with a
+    # millisecond tolerance a request that overlaps a slow earlier one must still
+    # reach its message, which a cursor advanced by response order would skip.
+    for index in sorted(range(len(request_times)), key=request_times.__getitem__):
+        request_time = request_times[index]
+        lo = bisect.bisect_left(message_times, request_time - tolerance)
+        hi = bisect.bisect_right(message_times, request_time + tolerance)
         best_match: Optional[MediatorMessage] = None
-        best_idx = msg_index
         best_diff = tolerance
-        for idx in range(msg_index, len(messages_sorted)):
-            msg = messages_sorted[idx]
+        for msg in messages_sorted[lo:hi]:
             if msg.matched:
                 continue
             diff = abs(msg.timestamp - request_time)
             if diff <= best_diff:
                 best_match = msg
                 best_diff = diff
-                best_idx = idx
-            if msg.timestamp > request_time + tolerance:
-                break
         if best_match:
             best_match.matched = True
-            msg_index = best_idx
-            rec.rpc_method = best_match.msg_type or rec.rpc_method
-            rec.rpc_id = best_match.id or rec.rpc_id
-            rec.related_payload_id = rec.rpc_id
-            rec.mediator_delta_ms = 0.0
-            rec.app_actor = best_match.from_did or rec.app_actor
+            rpc_id = best_match.id or store.get("rpc_id", index)
+            store.set("rpc_method", index, best_match.msg_type or store.get("rpc_method", index))
+            store.set("rpc_id", index, rpc_id)
+            store.set("related_payload_id", index, rpc_id)
+            store.set("mediator_delta_ms", index, 0.0)
+            store.set("app_actor", index, best_match.from_did or store.get("app_actor", index))
             swap_needed = False
             if mediator_did and best_match.from_did == mediator_did:
                 swap_needed = True
             if best_match.msg_type in RESPONSE_MESSAGE_TYPES:
                 swap_needed = True
             if swap_needed:
-                rec.src_ip, rec.dst_ip = rec.dst_ip, rec.src_ip
-                rec.src_port, rec.dst_port = rec.dst_port, rec.src_port
+                store.swap_endpoints(index)
+    if store is not records:
+        store.write_back(records)
 
 
 def link_rpc_to_mediator(
-    anvil_records: List[LatencyRecord],
-    mediator_records: List[LatencyRecord],
+    anvil_records: Records,
+    mediator_records: Records,
     tolerance: float = 5.0,
 ) -> None:
-    if not anvil_records or not mediator_records:
+    if not len(anvil_records) or not len(mediator_records):
         return
-    mediator_sorted = sorted(mediator_records, key=lambda r: r.timestamp)
-    mediator_times = [msg.timestamp for msg in mediator_sorted]
-    import bisect
-    for rec in sorted(anvil_records, key=lambda r: r.timestamp):
-        pos = bisect.bisect_right(mediator_times, rec.timestamp) - 1
+    anvil = as_store(anvil_records)
+    mediator = as_store(mediator_records)
+    mediator_order = mediator.order_by("timestamp")
+    mediator_column = mediator.column("timestamp")
+    mediator_times = [mediator_column[idx] for idx in mediator_order]
+    anvil_times = anvil.column("timestamp")
+    for index in anvil.order_by("timestamp"):
+        timestamp = anvil_times[index]
+        pos = bisect.bisect_right(mediator_times, timestamp) - 1
         best = None
         best_diff = float("inf")
         for offset in (0, 1):
             idx = pos + offset
-            if 0 <= idx < len(mediator_sorted):
-                cand = mediator_sorted[idx]
-                diff = rec.timestamp - cand.timestamp
+            if 0 <= idx < len(mediator_order):
+                diff = timestamp - mediator_times[idx]
                 if diff < 0:
                     continue
                 if diff < best_diff:
-                    best = cand
+                    best = mediator_order[idx]
                     best_diff = diff
-        if best and best_diff <= tolerance:
-            rec.related_payload_id = best.rpc_id
-            rec.mediator_delta_ms = best_diff * 1000.0
+        if best is not None and best_diff <= tolerance:
+            anvil.set("related_payload_id", index, mediator.get("rpc_id", best))
+            anvil.set("mediator_delta_ms", index, best_diff * 1000.0)
+    if anvil is not anvil_records:
+        anvil.write_back(anvil_records)
 
 
 def run_tshark_fields(
@@ -422,6 +1001,16 @@ def run_tshark_fields(
     requests: Dict[str, HttpRequestInfo],
     extra_args: Optional[List[str]] = None,
 ) -> Iterable[LatencyRecord]:
+    for fields in response_fields(pcap, port, requests, extra_args):
+        yield LatencyRecord(**fields)
+
+
+def response_fields(
+    pcap: Path,
+    port: int,
+    requests: Dict[str, HttpRequestInfo],
+    extra_args: Optional[List[str]] = None,
+) -> Iterable[Dict[str, Any]]:
     fields = [
         "frame.number",
         "frame.time_epoch",
@@ -435,14 +1024,12 @@ def run_tshark_fields(
         "http.response.code",
         "http.time",
         "http.request_in",
+        "http.content_length",
+        "tcp.reassembled.length",
+        "tcp.len",
+        "tcp.segment.count",
     ]
-    cmd = [
-        "tshark",
-        "-r",
-        str(pcap),
-    ]
-    if extra_args:
-        cmd.extend(extra_args)
+    cmd: List[str] = list(extra_args or [])
     cmd.extend(
         [
             "-Y",
@@ -455,10 +1042,9 @@ def run_tshark_fields(
             "occurrence=f",
         ]
     )
-    for field in fields:
-        cmd.extend(["-e", field])
-    result = subprocess.run(cmd, check=True, capture_output=True, text=True)
-    for line in result.stdout.splitlines():
+    for name in fields:
+        cmd.extend(["-e", name])
+    for line in run_tshark(pcap, cmd).splitlines():
         parts = line.split("\t")
         if len(parts) != len(fields):
             continue
@@ -476,7 +1062,14 @@ def run_tshark_fields(
             src_port = request_info.src_port if request_info and request_info.src_port else parts[3]
             dst_ip = request_info.dst_ip if request_info and request_info.dst_ip else parts[4]
             dst_port = request_info.dst_port if request_info and request_info.dst_port else parts[5]
-            yield LatencyRecord(
+            latency = float(parts[10])
+            request_bytes = request_info.request_bytes if request_info else None
+            response_bytes = (
+                parse_int(parts[12]) or parse_int(parts[13]) or parse_int(parts[14])
+            )
+            segments = (request_info.request_segments or 1) if request_info else 1
+            segments += parse_int(parts[15]) or 1
+            yield dict(
                 frame_number=parts[0],
                 timestamp=float(parts[1]),
                 src_ip=src_ip,
@@ -487,9 +1080,20 @@ def run_tshark_fields(
                 host=host,
                 uri=uri,
                 status=parts[9],
-                latency=float(parts[10]),
+                latency=latency,
                 rpc_method=rpc_method,
                 rpc_id=rpc_id,
+                request_bytes=request_bytes,
+                response_bytes=response_bytes,
+                tcp_segments=segments,
+                goodput=compute_goodput(request_bytes, response_bytes, latency),
+                rpc_address=request_info.rpc_address if request_info else None,
+                rpc_selector=request_info.rpc_selector if request_info else None,
+                app_actor=(
+                    request_info.didcomm.from_did
+                    if request_info and request_info.didcomm
+                    else None
+                ),
             )
         except ValueError:
             continue
@@ -500,9 +1104,70 @@ def percentile(values: List[float], pct: float) -> Optional[float]:
     index = max(0, min(len(values) - 1, int(round((pct / 100) * (len(values) - 1)))))
     return sorted(values)[index]
 
-def compute_summary(records: List[LatencyRecord]) -> Dict[str, Any]:
+def linear_regression(
+    xs: List[float], ys: List[float]
+) -> Optional[Tuple[float, float, float]]:
+    if len(xs) < 2:
+        return None
+    mean_x = statistics.mean(xs)
+    mean_y = statistics.mean(ys)
+    sxx = sum((x - mean_x) ** 2 for x in xs)
+    if sxx == 0:
+        return None
+    sxy = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys))
+    syy = sum((y - mean_y) ** 2 for y in ys)
+    slope = sxy / sxx
+    intercept = mean_y - slope * mean_x
+    r2 = (sxy * sxy) / (sxx * syy) if syy else 0.0
+    return slope, intercept, r2
+
+
+def compute_size_summary(records: Records) -> Dict[str, Any]:
+    store = as_store(records)
+    request_column = store.column("request_bytes")
+    response_column = store.column("response_bytes")
+    latency_column = store.column("latency")
+    sized = [
+        index
+        for index in range(len(store))
+        if request_column[index] >= 0 or response_column[index] >= 0
+    ]
+    if not sized:
+        return {}
+    request_sizes = [max(0, request_column[index]) for index in sized]
+    response_sizes = [max(0, response_column[index]) for index in sized]
+    totals = [req + resp for req, resp in zip(request_sizes, response_sizes)]
+    latencies = [latency_column[index] for index in sized]
+    buckets: List[Tuple[str, int, Optional[float], Optional[float]]] = []
+    lower = 0.0
+    for label, upper in SIZE_BUCKETS:
+        values = sorted(
+            latency for latency, size in zip(latencies, totals) if lower <= size < upper
+        )
+        lower = upper
+        if not values:
+            continue
+        buckets.append(
+            (label, len(values), percentile(values, 50), percentile(values, 95))
+        )
+    goodput_column = store.column("goodput")
+    segment_column = store.column("tcp_segments")
+    goodputs = [goodput_column[index] for index in sized if not math.isnan(goodput_column[index])]
+    segments = [segment_column[index] for index in sized if segment_column[index] >= 0]
+    return {
+        "request_bytes_avg": statistics.mean(request_sizes),
+        "response_bytes_avg": statistics.mean(response_sizes),
+        "segments_avg": statistics.mean(segments) if segments else None,
+        "goodput_avg": statistics.mean(goodputs) if goodputs else None,
+        "buckets": buckets,
+        # latency (s) as a function of payload size (bytes)
+        "regression": linear_regression([float(size) for size in totals], latencies),
+    }
+
+
+def compute_summary(records: Records) -> Dict[str, Any]:
     summary: Dict[str, Any] = {"count": len(records)}
-    if not records:
+    if not len(records):
         summary.update(
             {
                 "min": None,
@@ -512,14 +1177,20 @@ def compute_summary(records: List[LatencyRecord]) -> Dict[str, Any]:
                 "max": None,
                 "avg": None,
                 "method_counts": [],
+                "size": {},
             }
         )
         return summary
-    latencies = [rec.latency for rec in records]
-    latencies.sort()
+    store = as_store(records)
+    latencies = sorted(store.column("latency"))
     avg = statistics.mean(latencies)
     median = statistics.median(latencies)
-    method_counts = Counter(rec.rpc_method for rec in records if rec.rpc_method)
+    # Count interned codes, then resolve each distinct method once.
+    code_counts = Counter(store.column("rpc_method"))
+    code_counts.pop(0, None)
+    method_counts = Counter(
+        {store.strings.value(code): count for code, count in code_counts.items() if store.strings.value(code)}
+    )
     summary.update(
         {
             "min": latencies[0],
@@ -529,6 +1200,7 @@ def compute_summary(records: List[LatencyRecord]) -> Dict[str, Any]:
             "max": latencies[-1],
             "avg": avg,
             "method_counts": method_counts.most_common(),
+            "size": compute_size_summary(store),
         }
     )
     return summary
@@ -537,7 +1209,7 @@ def compute_summary(records: List[LatencyRecord]) -> Dict[str, Any]:
 
 
 def save_summary_csv(summary: Dict[str, Any], pcap: Path, suffix: str) -> Path:
-    csv_path = pcap.parent / f"{pcap.stem}_{suffix}_summary.csv"
+    csv_path = pcap.parent / f"{capture_stem(pcap)}_{suffix}_summary.csv"
     rows = [
         ("Metric", "Value"),
         ("Conteggio", summary["count"]),
@@ -556,6 +1228,23 @@ def save_summary_csv(summary: Dict[str, Any], pcap: Path, suffix: str) -> Path:
                 ("Media (ms)", fmt(summary["avg"])),
             ]
         )
+        size = summary.get("size") or {}
+        if size:
+            rows.append(("Req medio (B)", f"{size['request_bytes_avg']:.0f}"))
+            rows.append(("Resp medio (B)", f"{size['response_bytes_avg']:.0f}"))
+            if size["segments_avg"] is not None:
+                rows.append(("Segmenti TCP medi", f"{size['segments_avg']:.2f}"))
+            if size["goodput_avg"] is not None:
+                rows.append(("Goodput medio (KB/s)", f"{size['goodput_avg']/1024:.2f}"))
+            for label, count, p50, p95 in size["buckets"]:
+                rows.append((f"Bucket {label} Conteggio", str(count)))
+                rows.append((f"Bucket {label} P50 (ms)", fmt(p50)))
+                rows.append((f"Bucket {label} P95 (ms)", fmt(p95)))
+            if size["regression"] is not None:
+                slope, intercept, r2 = size["regression"]
+                rows.append(("Regressione pendenza (ms/KB)", f"{slope*1000*1024:.4f}"))
+                rows.append(("Regressione intercetta (ms)", f"{intercept*1000:.2f}"))
+                rows.append(("Regressione R2", f"{r2:.4f}"))
         for method, count in summary["method_counts"]:
             rows.append((f"Operazione: {method}", str(count)))
     with csv_path.open("w", newline="", encoding="utf-8") as handle:
@@ -564,7 +1253,127 @@ def save_summary_csv(summary: Dict[str, Any], pcap: Path, suffix: str) -> Path:
     return csv_path
 
 
-def prepare_table(records: List[LatencyRecord]) -> Tuple[Tuple[str, ...], List[List[str]]]:
+def compute_timeseries(
+    records: Records, window: float = 1.0, rolling: float = 10.0, top_operations: int = 8
+) -> Tuple[List[str], List[Dict[str, Any]]]:
+    store = as_store(records)
+    if not len(store) or window <= 0:
+        return [], []
+    ends = list(store.column("timestamp"))
+    starts = list(store.request_times())
+    latencies = list(store.column("latency"))
+    origin = min(starts)
+    method_codes = store.column("rpc_method")
+    code_counts = Counter(method_codes)
+    code_counts.pop(0, None)
+    operations = [
+        code for code, _ in code_counts.most_common() if store.strings.value(code)
+    ][:top_operations]
+    op_names = [store.strings.value(code) for code in operations]
+    op_slot = {code: slot for slot, code in enumerate(operations)}
+    buckets = int((max(ends) - origin) // window) + 1
+    completed = [0] * buckets
+    op_counts = [[0] * (len(operations) + 1) for _ in range(buckets)]
+    for index, end in enumerate(ends):
+        bucket = int((end - origin) // window)
+        completed[bucket] += 1
+        op_counts[bucket][op_slot.get(method_codes[index], len(operations))] += 1
+    # In-flight requests: sweep start/end events, integrating the count over each window.
+    events = sorted([(start, 1) for start in starts] + [(end, -1) for end in ends])
+    area = [0.0] * buckets
+    peak = [0] * buckets
+    in_flight = 0
+    cursor = origin
+    for time_point, delta in events:
+        while cursor < time_point:
+            bucket = min(buckets - 1, int((cursor - origin) // window))
+            boundary = min(time_point, origin + (bucket + 1) * window)
+            if boundary <= cursor:
+                boundary = time_point
+            area[bucket] += in_flight * (boundary - cursor)
+            cursor = boundary
+        in_flight += delta
+        bucket = min(buckets - 1, int((time_point - origin) // window))
+        peak[bucket] = max(peak[bucket], in_flight)
+    # Rolling percentiles over the responses completed in the trailing `rolling` seconds.
+    by_end = sorted(range(len(ends)), key=ends.__getitem__)
+    active: List[float] = []
+    head = tail = 0
+    rows: List[Dict[str, Any]] = []
+    for bucket in range(buckets):
+        bucket_end = origin + (bucket + 1) * window
+        while head < len(by_end) and ends[by_end[head]] < bucket_end:
+            bisect.insort(active, latencies[by_end[head]])
+            head += 1
+        while tail < head and ends[by_end[tail]] < bucket_end - rolling:
+            active.pop(bisect.bisect_left(active, latencies[by_end[tail]]))
+            tail += 1
+        mean_in_flight = area[bucket] / window
+        if not completed[bucket] and not mean_in_flight and not peak[bucket]:
+            continue
+        rate = completed[bucket] / window
+        window_latencies = [
+            latencies[index] for index in by_end[tail:head] if ends[index] >= bucket_end - window
+        ]
+        rows.append(
+            {
+                "t": bucket * window,
+                "completed": completed[bucket],
+                "rps": rate,
+                "p50": percentile(active, 50),
+                "p95": percentile(active, 95),
+                "in_flight_avg": mean_in_flight,
+                "in_flight_max": peak[bucket],
+                # Little's law: L = lambda * W with this window's completions.
+                "little_l": rate * statistics.mean(window_latencies) if window_latencies else 0.0,
+                "operations": [count / window for count in op_counts[bucket]],
+            }
+        )
+    return op_names + ["altro"], rows
+
+
+def save_timeseries_csv(
+    operations: List[str], rows: List[Dict[str, Any]], pcap: Path, suffix: str
+) -> Optional[Path]:
+    if not rows:
+        return None
+    csv_path = pcap.parent / f"{capture_stem(pcap)}_{suffix}_timeseries.csv"
+    used = [
+        slot for slot in range(len(operations)) if any(row["operations"][slot] for row in rows)
+    ]
+    with csv_path.open("w", newline="", encoding="utf-8") as handle:
+        writer = csv.writer(handle)
+        writer.writerow(
+            [
+                "t (s)",
+                "Completate",
+                "Req/s",
+                "P50 mobile (ms)",
+                "P95 mobile (ms)",
+                "In volo medio",
+                "In volo max",
+                "Little L",
+            ]
+            + [f"Op/s: {operations[slot]}" for slot in used]
+        )
+        for row in rows:
+            writer.writerow(
+                [
+                    f"{row['t']:.3f}",
+                    row["completed"],
+                    f"{row['rps']:.3f}",
+                    f"{row['p50']*1000:.2f}" if row["p50"] is not None else "-",
+                    f"{row['p95']*1000:.2f}" if row["p95"] is not None else "-",
+                    f"{row['in_flight_avg']:.3f}",
+                    row["in_flight_max"],
+                    f"{row['little_l']:.3f}",
+                ]
+                + [f"{row['operations'][slot]:.3f}" for slot in used]
+            )
+    return csv_path
+
+
+def prepare_table(records: Records) -> Tuple[Tuple[str, ...], Iterable[List[str]]]:
     headers = (
         "Frame",
         "Timestamp",
@@ -578,59 +1387,159 @@ def prepare_table(records: List[LatencyRecord]) -> Tuple[Tuple[str, ...], List[L
         "Payload Mediator",
         "Δ Mediator (ms)",
         "Latency (ms)",
+        "Req (B)",
+        "Resp (B)",
+        "Segmenti TCP",
+        "Goodput (KB/s)",
     )
-    rows = [
-        [
-            rec.frame_number,
-            f"{rec.timestamp:.6f}",
-            f"{rec.src_ip}:{rec.src_port}",
-            f"{rec.dst_ip}:{rec.dst_port}",
-            rec.method or "-",
-            rec.uri or "-",
-            rec.status or "-",
-            rec.rpc_method or "-",
-            rec.rpc_id or "-",
-            rec.related_payload_id or "-",
-            f"{rec.mediator_delta_ms:.2f}" if rec.mediator_delta_ms is not None else "-",
-            f"{rec.latency*1000:.2f}",
+    return headers, table_rows(as_store(records))
+
+
+def table_rows(store: RecordStore) -> Iterable[List[str]]:
+    # Rows are formatted one at a time while the CSV is written.
+    values = store.strings.values
+    codes = store.codes
+    floats = store.floats
+    ints = store.ints
+
+    def text(name: str, index: int) -> str:
+        return values[codes[name][index]] or "-"
+
+    def number(name: str, index: int) -> str:
+        value = ints[name][index]
+        return str(value) if value >= 0 else "-"
+
+    for index in range(len(store)):
+        frame = ints["frame_number"][index]
+        delta = floats["mediator_delta_ms"][index]
+        goodput = floats["goodput"][index]
+        status = store.status[index]
+        yield [
+            str(frame) if frame >= 0 else "",
+            f"{floats['timestamp'][index]:.6f}",
+            f"{values[codes['src_ip'][index]]}:{values[codes['src_port'][index]]}",
+            f"{values[codes['dst_ip'][index]]}:{values[codes['dst_port'][index]]}",
+            text("method", index),
+            text("uri", index),
+            str(status) if status else "-",
+            text("rpc_method", index),
+            text("rpc_id", index),
+            text("related_payload_id", index),
+            f"{delta:.2f}" if not math.isnan(delta) else "-",
+            f"{floats['latency'][index]*1000:.2f}",
+            number("request_bytes", index),
+            number("response_bytes", index),
+            number("tcp_segments", index),
+            f"{goodput/1024:.2f}" if not math.isnan(goodput) else "-",
         ]
-        for rec in records
-    ]
-    return headers, rows
 
 
-def save_csv(records: List[LatencyRecord], pcap: Path, suffix: str) -> Optional[Path]:
-    if not records:
+def save_csv(records: Records, pcap: Path, suffix: str) -> Optional[Path]:
+    if not len(records):
         return None
     headers, rows = prepare_table(records)
-    csv_path = pcap.parent / f"{pcap.stem}_{suffix}.csv"
+    csv_path = pcap.parent / f"{capture_stem(pcap)}_{suffix}.csv"
     with csv_path.open("w", newline="", encoding="utf-8") as handle:
         writer = csv.writer(handle)
         writer.writerow(headers)
         writer.writerows(rows)
     return csv_path
 
+def load_details_csv(path: Path) -> List[LatencyRecord]:
+    def optional(value: Optional[str]) -> Optional[str]:
+        return value if value and value != "-" else None
+
+    def optional_float(value: Optional[str]) -> Optional[float]:
+        value = optional(value)
+        try:
+            return float(value) if value is not None else None
+        except ValueError:
+            return None
+
+    def endpoint(value: str) -> Tuple[str, str]:
+        host, _, port = (value or "").rpartition(":")
+        return host, port
+
+    records: List[LatencyRecord] = []
+    with path.open("r", encoding="utf-8", newline="") as handle:
+        for row in csv.DictReader(handle):
+            try:
+                timestamp = float(row["Timestamp"])
+                latency = float(row["Latency (ms)"]) / 1000.0
+            except (KeyError, TypeError, ValueError):
+                continue
+            src_ip, src_port = endpoint(row.get("Src", ""))
+            dst_ip, dst_port = endpoint(row.get("Dst", ""))
+            goodput = optional_float(row.get("Goodput (KB/s)"))
+            request_bytes = optional_float(row.get("Req (B)"))
+            response_bytes = optional_float(row.get("Resp (B)"))
+            segments = optional_float(row.get("Segmenti TCP"))
+            records.append(
+                LatencyRecord(
+                    frame_number=row.get("Frame", ""),
+                    timestamp=timestamp,
+                    src_ip=src_ip,
+                    src_port=src_port,
+                    dst_ip=dst_ip,
+                    dst_port=dst_port,
+                    method=row.get("Metodo", ""),
+                    host="-",
+                    uri=row.get("URI", ""),
+                    status=row.get("Status", ""),
+                    latency=latency,
+                    rpc_method=optional(row.get("Operazione")),
+                    rpc_id=optional(row.get("Payload ID")),
+                    related_payload_id=optional(row.get("Payload Mediator")),
+                    mediator_delta_ms=optional_float(row.get("Δ Mediator (ms)")),
+                    request_bytes=int(request_bytes) if request_bytes is not None else None,
+                    response_bytes=int(response_bytes) if response_bytes is not None else None,
+                    tcp_segments=int(segments) if segments is not None else None,
+                    goodput=goodput * 1024 if goodput is not None else None,
+                )
+            )
+    return records
+
+
 def gather_pcaps(args: argparse.Namespace) -> List[Path]:
     if args.pcap is not None:
         if not args.pcap.exists():
             raise FileNotFoundError(f"CAPTURE NOT FOUND: {args.pcap}")
         return [args.pcap]
     base_dir = Path(args.base_dir)
+    if getattr(args, "catalog", False):
+        from capture_catalog import query_captures, update_catalog
+
+        update_catalog(base_dir)
+        pcap_files = []
+        for slot in args.slot or [None]:
+            pcap_files += query_captures(
+                base_dir,
+                network=args.network,
+                day=args.day,
+                hour=args.hour,
+                delay_ms=args.delay,
+                test=args.test_name,
+                run=slot,
+                since=args.since,
+                until=args.until,
+            )
+        if not pcap_files:
+            raise FileNotFoundError(f"No PCAP files in the catalog of {base_dir} match the filters")
+        return pcap_files
     day_value = args.day or datetime.now(timezone.utc).strftime("%Y-%m-%d")
     day_dir = base_dir / args.network / day_value
     if not day_dir.exists():
         raise FileNotFoundError(f"No captures folder for day '{day_value}': {day_dir}")
-    pcap_files = sorted(day_dir.glob("*.pcap"))
-    slot_filter = args.slot
-    if slot_filter in ("all", "both"):
-        slot_filter = None
-    if slot_filter:
-        pcap_files = [p for p in pcap_files if p.stem.endswith(f"run{slot_filter}")]
+    pcap_files = sorted(p for p in day_dir.glob("*") if is_capture(p))
+    if args.slot:
+        pcap_files = [
+            p for p in pcap_files if any(capture_stem(p).endswith(f"run{slot}") for slot in args.slot)
+        ]
     if args.test_name:
-        pcap_files = [p for p in pcap_files if args.test_name in p.stem]
+        pcap_files = [p for p in pcap_files if args.test_name in capture_stem(p)]
     if not pcap_files:
         raise FileNotFoundError(
-            f"No PCAP files found in {day_dir} for slot '{args.slot}'"
+            f"No PCAP files found in {day_dir} for slot '{slot_label(args.slot)}'"
         )
     return pcap_files
 
@@ -641,6 +1550,160 @@ def clone_mediator_messages(messages: List[MediatorMessage]) -> List[MediatorMes
     return [replace(msg, matched=False) for msg in messages]
 
 
+def collect_port_records(
+    pcap: Path,
+    port: int,
+    suffix: str,
+    tshark_extra_args: Optional[List[str]] = None,
+    tls_keylog_path: Optional[Path] = None,
+) -> Tuple[RecordStore, bool]:
+    requests = collect_requests(pcap, port, extra_args=tshark_extra_args)
+    with profile_stage("pair_responses") as rows:
+        http = list(response_fields(pcap, port, requests, tshark_extra_args))
+        rows[0] = len(http)
+    http2: List[Dict[str, Any]] = []
+    if tls_keylog_path is not None and suffix == "rpc":
+        # Decrypted provider traffic is often HTTP/2, which http.time does not cover.
+        http2 = [vars(rec) for rec in collect_http2_records(pcap, port, extra_args=tshark_extra_args)]
+    records = RecordStore()
+    # HTTP/2 streams are interleaved with the HTTP/1 rows by time.
+    for fields in sorted(http + http2, key=lambda fields: fields["timestamp"]) if http2 else http:
+        records.append(**fields)
+    tls_fallback_used = False
+    if not len(records) and suffix == "rpc" and port == 443:
+        with profile_stage("tls_fallback") as rows:
+            records = RecordStore.from_records(collect_tls_latencies(pcap, port))
+            rows[0] = len(records)
+        tls_fallback_used = bool(records)
+    return records, tls_fallback_used
+
+
+# (frame in the shard that closes the exchange, record fields)
+ShardRows = List[Tuple[int, Dict[str, Any]]]
+
+
+def shard_records_job(
+    shard: Path,
+    targets: List[Tuple[str, int, str]],
+    tshark_extra_args: Optional[List[str]],
+    tls_keylog_path: Optional[Path],
+    capture: str,
+    profile: bool = False,
+    with_pstats: bool = False,
+) -> Tuple[Dict[int, Dict[str, ShardRows]], List[StageTiming], Dict[str, List[str]]]:
+    # Same steps as collect_port_records, but every row keeps the frame that
+    # fixes its position in a serial run so the parent can merge shards exactly.
+    profiler = StageProfiler(capture, with_pstats) if profile else None
+    activate_profiler(profiler)
+    results: Dict[int, Dict[str, ShardRows]] = {}
+    try:
+        for _, port, suffix in targets:
+            requests = collect_requests(shard, port, extra_args=tshark_extra_args)
+            with profile_stage("pair_responses") as rows:
+                http = [
+                    (int(fields["frame_number"]), fields)
+                    for fields in response_fields(shard, port, requests, tshark_extra_args)
+                ]
+                rows[0] = len(http)
+            http2: ShardRows = []
+            if tls_keylog_path is not None and suffix == "rpc":
+                http2 = [
+                    (int(rec.frame_number), vars(rec))
+                    for rec in collect_http2_records(shard, port, extra_args=tshark_extra_args)
+                ]
+            tls: ShardRows = []
+            # A shard with HTTP rows means the serial run never falls back to TLS.
+            if not http and not http2 and suffix == "rpc" and port == 443:
+                with profile_stage("tls_fallback") as rows:
+                    tls = [(frame, vars(rec)) for frame, rec in tls_exchanges(shard, port)]
+                    rows[0] = len(tls)
+            results[port] = {"http": http, "http2": http2, "tls": tls}
+    finally:
+        activate_profiler(None)
+    if profiler is None:
+        return results, [], {}
+    return results, profiler.results(), profiler.dump_pstats() if with_pstats else {}
+
+
+def merge_shard_rows(
+    parts: List[Tuple[array, ShardRows]], by_time: bool = False
+) -> List[Dict[str, Any]]:
+    # Frame numbers go back to the original capture; rows are put back in the
+    # order a serial run emits them (closing frame, or time for HTTP/2 streams).
+    keyed: List[Tuple[Any, Dict[str, Any]]] = []
+    for frames, rows in parts:
+        for frame, fields in rows:
+            original = frames[frame - 1]
+            fields["frame_number"] = str(frames[int(fields["frame_number"]) - 1])
+            keyed.append(((fields["timestamp"], original) if by_time else original, fields))
+    keyed.sort(key=lambda item: item[0])
+    return [fields for _, fields in keyed]
+
+
+def collect_sharded_records(
+    pcap: Path,
+    targets: List[Tuple[str, int, str]],
+    shards: int,
+    tshark_extra_args: Optional[List[str]] = None,
+    tls_keylog_path: Optional[Path] = None,
+    workers: Optional[int] = None,
+) -> Dict[int, Tuple[RecordStore, bool]]:
+    import tempfile
+    from concurrent.futures import ProcessPoolExecutor
+
+    profiler = active_profiler()
+    with tempfile.TemporaryDirectory(prefix="analyze_shards_") as tmp:
+        with profile_stage("split_capture") as rows:
+            split = [
+                (path, frames)
+                for path, frames in split_by_connection(pcap, shards, Path(tmp))
+                if len(frames)
+            ]
+            rows[0] = sum(len(frames) for _, frames in split)
+        print(f"  [*] {len(split)} shard per connessione TCP")
+        with profile_stage("shard_workers") as rows:
+            # More shards than CPUs only queue up; --jobs passes its share of the CPUs.
+            max_workers = max(1, min(len(split), workers or os.cpu_count() or 1))
+            with ProcessPoolExecutor(max_workers=max_workers) as pool:
+                futures = [
+                    pool.submit(
+                        shard_records_job,
+                        path,
+                        targets,
+                        tshark_extra_args,
+                        tls_keylog_path,
+                        str(pcap),
+                        profiler is not None,
+                        profiler is not None and profiler.with_pstats,
+                    )
+                    for path, _ in split
+                ]
+                outcomes = [future.result() for future in futures]
+            rows[0] = len(outcomes)
+    if profiler is not None:
+        for _, timings, pstats_files in outcomes:
+            profiler.absorb(timings, pstats_files)
+    collected: Dict[int, Tuple[RecordStore, bool]] = {}
+    with profile_stage("merge_shards") as rows:
+        for _, port, suffix in targets:
+            def parts(kind: str) -> List[Tuple[array, ShardRows]]:
+                return [(frames, outcome[0][port][kind]) for (_, frames), outcome in zip(split, outcomes)]
+
+            records = RecordStore()
+            http, http2 = merge_shard_rows(parts("http")), merge_shard_rows(parts("http2"), by_time=True)
+            # Same order as collect_port_records: HTTP/2 streams interleaved by time.
+            for fields in sorted(http + http2, key=lambda fields: fields["timestamp"]) if http2 else http:
+                records.append(**fields)
+            tls_fallback_used = False
+            if not len(records) and suffix == "rpc" and port == 443:
+                for fields in merge_shard_rows(parts("tls")):
+                    records.append(**fields)
+                tls_fallback_used = bool(records)
+            collected[port] = (records, tls_fallback_used)
+            rows[0] += len(records)
+    return collected
+
+
 def analyze_capture(
     pcap: Path,
     details: bool,
@@ -649,44 +1712,74 @@ def analyze_capture(
     targets: List[Tuple[str, int, str]],
     tshark_extra_args: Optional[List[str]] = None,
     tls_keylog_path: Optional[Path] = None,
-) -> None:
+    clock_offset: Optional[float] = None,
+    estimate_offset: bool = True,
+    timeseries: Optional[Tuple[float, float]] = None,
+    shards: int = 1,
+    shard_workers: Optional[int] = None,
+) -> Dict[str, Dict[str, Any]]:
     if not pcap.exists():
         raise FileNotFoundError(f"CAPTURE NOT FOUND: {pcap}")
     print(f"\n[+] Analyzing {pcap}")
-    port_results: Dict[int, Tuple[str, str, List[LatencyRecord], bool]] = {}
-    for label, port, suffix in targets:
-        requests = collect_requests(pcap, port, extra_args=tshark_extra_args)
-        records = list(
-            run_tshark_fields(
-                pcap,
-                port,
-                requests,
-                extra_args=tshark_extra_args,
-            )
+    profiler = active_profiler()
+    if profiler is not None:
+        profiler.capture = str(pcap)
+    if shards > 1:
+        collected = collect_sharded_records(
+            pcap, targets, shards, tshark_extra_args, tls_keylog_path, shard_workers
         )
-        tls_fallback_used = False
-        if not records and suffix == "rpc" and port == 443:
-            records = collect_tls_latencies(pcap, port)
-            tls_fallback_used = bool(records)
+    else:
+        collected = {
+            port: collect_port_records(pcap, port, suffix, tshark_extra_args, tls_keylog_path)
+            for _, port, suffix in targets
+        }
+    port_results: Dict[int, Tuple[str, str, RecordStore, bool]] = {}
+    for label, port, suffix in targets:
+        records, tls_fallback_used = collected[port]
         if suffix == "mediator" and mediator_messages:
-            annotate_with_mediator(records, mediator_messages, mediator_did)
+            with profile_stage("mediator_match") as rows:
+                aligned, tolerance, clock = align_mediator_messages(
+                    records, mediator_messages, clock_offset, estimate_offset
+                )
+                annotate_with_mediator(records, aligned, mediator_did, tolerance=tolerance)
+                rows[0] = len(records)
+            if clock is not None:
+                print(
+                    f"  [*] Offset orologio DB/capture: {clock.offset*1000:+.2f} ms,"
+                    f" drift {clock.drift*1e6:.1f} ppm, tolleranza {tolerance*1000:.2f} ms"
+                )
         port_results[port] = (label, suffix, records, tls_fallback_used)
     mediator_port = next((port for _, port, suffix in targets if suffix == "mediator"), None)
     rpc_port = next((port for _, port, suffix in targets if suffix == "rpc"), None)
     if mediator_port in port_results and rpc_port in port_results:
-        link_rpc_to_mediator(
-            port_results[rpc_port][2],
-            port_results[mediator_port][2],
-        )
+        with profile_stage("link_rpc") as rows:
+            link_rpc_to_mediator(
+                port_results[rpc_port][2],
+                port_results[mediator_port][2],
+            )
+            rows[0] = len(port_results[rpc_port][2])
+    outputs: Dict[str, Dict[str, Any]] = {}
     for label, port, suffix in targets:
         label_out, suffix_out, records, tls_fallback_used = port_results.get(
-            port, (label, suffix, [], False)
+            port, (label, suffix, RecordStore(), False)
         )
-        summary = compute_summary(records)
-        summary_csv = save_summary_csv(summary, pcap, suffix_out)
-        details_csv = None
-        if details:
-            details_csv = save_csv(records, pcap, suffix_out)
+        with profile_stage("summary") as rows:
+            summary = compute_summary(records)
+            rows[0] = len(records)
+        with profile_stage("write_csv") as rows:
+            summary_csv = save_summary_csv(summary, pcap, suffix_out)
+            details_csv = None
+            if details:
+                details_csv = save_csv(records, pcap, suffix_out)
+            rows[0] = len(records) if details else 0
+        timeseries_csv = None
+        if timeseries is not None:
+            with profile_stage("timeseries") as rows:
+                operations, series = compute_timeseries(
+                    records, window=timeseries[0], rolling=timeseries[1]
+                )
+                timeseries_csv = save_timeseries_csv(operations, series, pcap, suffix_out)
+                rows[0] = len(series)
         print(f"  {label_out}: {summary['count']} richieste -> {summary_csv}")
         if (
             summary["count"] == 0
@@ -706,12 +1799,48 @@ def analyze_capture(
             )
         if details and details_csv:
             print(f"    Dettagli -> {details_csv}")
+        if timeseries_csv:
+            print(f"    Serie temporale -> {timeseries_csv}")
+        outputs[suffix_out] = {
+            "port": port,
+            "summary": summary,
+            "tls_fallback": tls_fallback_used,
+            "summary_csv": summary_csv,
+            "details_csv": details_csv,
+            "timeseries_csv": timeseries_csv,
+        }
+    return outputs
 
 
-def main() -> None:
-    parser = argparse.ArgumentParser(
-        description="ANALYZE LATENCY FROM PCAP FILES",
-    )
+def analyze_capture_job(
+    pcap: Path,
+    mediator_messages: List[MediatorMessage],
+    options: Dict[str, Any],
+    profile: bool = False,
+    with_pstats: bool = False,
+) -> Tuple[List[StageTiming], Dict[str, List[str]], Dict[str, Dict[str, Any]]]:
+    # Runs in a worker process with --jobs: timings and outputs travel back to the parent.
+    profiler = StageProfiler(str(pcap), with_pstats) if profile else None
+    activate_profiler(profiler)
+    try:
+        outputs = analyze_capture(pcap, mediator_messages=mediator_messages, **options)
+    finally:
+        activate_profiler(None)
+    if profiler is None:
+        return [], {}, outputs
+    return profiler.results(), profiler.dump_pstats() if with_pstats else {}, outputs
+
+
+def parse_clock_offset(value: str) -> Union[str, float]:
+    if value in ("auto", "none"):
+        return value
+    try:
+        return float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid --clock-offset value: {value}") from None
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
     parser.add_argument(
         "pcap",
         nargs="?",
@@ -724,30 +1853,35 @@ def main() -> None:
         help="Save every request/response row.",
     )
     parser.add_argument(
-        "--day",
-        help="Day folder (YYYY-MM-DD). Defaults to today when --pcap is omitted.",
+        "--timeseries",
+        nargs="?",
+        type=float,
+        const=1.0,
+        metavar="WINDOW",
+        help="Also save a per-run time series (rolling P50/P95, req/s, in-flight requests,"
+        " per-operation rates) in WINDOW-second buckets (default: 1).",
     )
     parser.add_argument(
-        "--slot",
-        choices=["1", "2", "3", "all", "both"],
-        default="all",
-        help="Which of the three daily runs to analyze when using --day (use 'all' or 'both' for every run).",
+        "--ts-rolling",
+        type=float,
+        default=10.0,
+        help="Seconds of completed requests behind each rolling percentile (default: 10).",
     )
-    parser.add_argument(
-        "--test-name",
-        help="Filter by test/scenario name when scanning by day.",
+    add_selection_args(
+        parser,
+        day_help="Day folder (YYYY-MM-DD). Defaults to today when --pcap is omitted.",
+        test_help="Filter by test/scenario name when scanning by day.",
     )
     parser.add_argument(
-        "--base-dir",
-        type=Path,
-        default=Path("captures"),
-        help="Base captures directory (default: ./captures).",
-    )
-    parser.add_argument(
-        "--network",
-        default="sepolia",
-        help="Network subfolder under --base-dir (default: sepolia).",
+        "--catalog",
+        action="store_true",
+        help="Select captures through the <base-dir>/catalog.sqlite index (see capture_catalog.py);"
+        " byte-identical captures are analyzed once.",
     )
+    parser.add_argument("--hour", help="Hour slot folder (15, 18, 21) when using --catalog.")
+    parser.add_argument("--delay", type=int, help="Local netem delay folder in ms when using --catalog.")
+    parser.add_argument("--since", help="Captures ending after this date/time (ISO, UTC) when using --catalog.")
+    parser.add_argument("--until", help="Captures starting before this date/time (ISO, UTC) when using --catalog.")
     parser.add_argument(
         "--mediator-port",
         type=int,
@@ -770,7 +1904,45 @@ def main() -> None:
         type=Path,
         help="Mediator sqlite database path for DID correlation.",
     )
-    args = parser.parse_args()
+    parser.add_argument(
+        "--clock-offset",
+        type=parse_clock_offset,
+        default="auto",
+        help="Mediator DB clock minus capture clock in seconds, 'auto' to estimate it"
+        " (default) or 'none' to match with the fixed 5 s tolerance.",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Captures analyzed in parallel worker processes (default: 1).",
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=1,
+        help="Split each capture by TCP connection into N shards analyzed in parallel;"
+        " the output is the same as a serial run (default: 1).",
+    )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        type=Path,
+        const=Path("analyze_profile.json"),
+        help="Record wall/CPU time, rows and peak RSS per stage and capture into a JSON report"
+        " (default path: analyze_profile.json).",
+    )
+    parser.add_argument(
+        "--profile-pstats",
+        type=Path,
+        help="Also run cProfile per stage and dump the hottest Python stage to this pstats file"
+        " (slows the Python stages down).",
+    )
+    add_json_arg(parser)
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    clock_offset = args.clock_offset if isinstance(args.clock_offset, float) else None
     check_tshark()
     tls_keylog_path = resolve_tls_keylog_path(args.tls_keylog)
     tshark_extra_args: List[str] = []
@@ -783,28 +1955,112 @@ def main() -> None:
         default_db = Path("mediator.sqlite")
         if default_db.exists():
             mediator_db_path = default_db
+    profiling = args.profile is not None or args.profile_pstats is not None
+    started = time.perf_counter()
+    main_profiler = StageProfiler("-", args.profile_pstats is not None) if profiling else None
+    activate_profiler(main_profiler)
     if mediator_db_path:
         if mediator_db_path.exists():
-            mediator_messages_template, mediator_did = load_mediator_messages(
-                mediator_db_path
-            )
+            with profile_stage("load_mediator_db") as rows:
+                mediator_messages_template, mediator_did = load_mediator_messages(
+                    mediator_db_path
+                )
+                rows[0] = len(mediator_messages_template)
         elif args.mediator_db:
             print(f"[Avviso] DATABASE NOT FOUND: {mediator_db_path}")
-    pcap_paths = gather_pcaps(args)
+    with profile_stage("gather_captures") as rows:
+        pcap_paths = gather_pcaps(args)
+        rows[0] = len(pcap_paths)
+    activate_profiler(None)
     targets: List[Tuple[str, int, str]] = [
         (f"Mediator (port {args.mediator_port})", args.mediator_port, "mediator"),
         (f"RPC (port {args.rpc_port})", args.rpc_port, "rpc"),
     ]
-    for pcap_path in pcap_paths:
-        mediator_messages = clone_mediator_messages(mediator_messages_template)
-        analyze_capture(
-            pcap_path,
-            args.details,
-            mediator_messages,
-            mediator_did,
-            targets,
-            tshark_extra_args=tshark_extra_args,
-            tls_keylog_path=tls_keylog_path,
+    jobs = max(1, min(args.jobs, len(pcap_paths)))
+    options = {
+        "details": args.details,
+        "mediator_did": mediator_did,
+        "targets": targets,
+        "tshark_extra_args": tshark_extra_args,
+        "tls_keylog_path": tls_keylog_path,
+        "clock_offset": clock_offset,
+        "estimate_offset": args.clock_offset == "auto",
+        "timeseries": (args.timeseries, args.ts_rolling) if args.timeseries else None,
+        "shards": max(1, args.shards),
+        # --jobs and --shards share the CPUs instead of nesting a full pool per capture.
+        "shard_workers": max(1, (os.cpu_count() or 1) // jobs),
+    }
+    timings: List[StageTiming] = main_profiler.results() if main_profiler else []
+    pstats_files: Dict[str, List[str]] = main_profiler.dump_pstats() if args.profile_pstats else {}
+
+    outputs: Dict[str, Dict[str, Dict[str, Any]]] = {}
+
+    def collect(
+        pcap_path: Path,
+        result: Tuple[List[StageTiming], Dict[str, List[str]], Dict[str, Dict[str, Any]]],
+    ) -> None:
+        timings.extend(result[0])
+        for stage, paths in result[1].items():
+            pstats_files.setdefault(stage, []).extend(paths)
+        outputs[str(pcap_path)] = result[2]
+
+    if jobs > 1:
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = {
+                pool.submit(
+                    analyze_capture_job,
+                    pcap_path,
+                    clone_mediator_messages(mediator_messages_template),
+                    options,
+                    profiling,
+                    args.profile_pstats is not None,
+                ): pcap_path
+                for pcap_path in pcap_paths
+            }
+            for future in as_completed(futures):
+                collect(futures[future], future.result())
+    else:
+        for pcap_path in pcap_paths:
+            collect(
+                pcap_path,
+                analyze_capture_job(
+                    pcap_path,
+                    clone_mediator_messages(mediator_messages_template),
+                    options,
+                    profiling,
+                    args.profile_pstats is not None,
+                )
+            )
+    if profiling:
+        report_path = args.profile or Path("analyze_profile.json")
+        report = write_profile_report(
+            report_path,
+            timings,
+            time.perf_counter() - started,
+            jobs,
+            pstats_files=pstats_files,
+            pstats_path=args.profile_pstats,
         )
+        print_profile_report(report)
+        print(f"  Report -> {report_path}")
+        if report["pstats"]:
+            print(f"  pstats ({report['hottest_python_stage']}) -> {report['pstats']}")
+    # Same order as a serial run, whatever order the workers finished in.
+    result: Dict[str, Any] = {"captures": [{"pcap": str(path), **outputs[str(path)]} for path in pcap_paths]}
+    if profiling:
+        result["profile"] = report_path
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="ANALYZE LATENCY FROM PCAP FILES",
+    )
+    add_arguments(parser)
+    run_command(run, parser.parse_args())
+
+
 if __name__ == "__main__":
     main()
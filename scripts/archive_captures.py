@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+'''
+# Archive every capture of a day as zstd pcapng, TLS payloads cut to 64 bytes
+python3 archive_captures.py ../captures/sepolia/2025-11-13 --format zst
+
+# Keep TLS payloads intact, gzip instead of zstd, drop the originals once verified
+python3 archive_captures.py ../captures/local --format gz --tls-keep -1 --delete
+
+'''
+import argparse
+import gzip
+import shutil
+import subprocess
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO, Iterator, List, Set, Tuple
+
+from pcap_io import (
+    Packet,
+    PcapngWriter,
+    capture_stem,
+    compression_of,
+    is_capture,
+    iter_packets,
+    parse_tcp,
+)
+
+
+@contextmanager
+def open_archive(path: Path, fmt: str, level: int) -> Iterator[BinaryIO]:
+    if fmt == "gz":
+        with gzip.open(path, "wb", compresslevel=level) as handle:
+            yield handle
+        return
+    try:
+        import zstandard
+    except ImportError:
+        zstandard = None
+    if zstandard is not None:
+        with path.open("wb") as raw:
+            with zstandard.ZstdCompressor(level=level).stream_writer(raw) as handle:
+                yield handle
+        return
+    if shutil.which("zstd") is None:
+        raise RuntimeError("zstd not found: install it or the `zstandard` Python package.")
+    process = subprocess.Popen(
+        ["zstd", "-q", "-f", f"-{level}", "-o", str(path), "-"], stdin=subprocess.PIPE
+    )
+    try:
+        yield process.stdin
+    finally:
+        process.stdin.close()
+        if process.wait() != 0:
+            raise RuntimeError(f"zstd failed while writing {path}")
+
+
+def truncate_payload(packet: Packet, tls_ports: Set[int], keep: int) -> Packet:
+    if keep < 0:
+        return packet
+    tcp = parse_tcp(packet)
+    if tcp is None or not (tcp.src_port in tls_ports or tcp.dst_port in tls_ports):
+        return packet
+    limit = tcp.payload_offset + keep
+    if len(packet.data) <= limit:
+        return packet
+    # orig_len is kept, so sequence analysis and byte counts still see the full segment.
+    return Packet(packet.timestamp, packet.linktype, packet.data[:limit], packet.orig_len)
+
+
+def archive_capture(
+    pcap: Path, target: Path, fmt: str, level: int, tls_ports: Set[int], keep: int
+) -> Tuple[int, int]:
+    packets = 0
+    truncated = 0
+    with open_archive(target, fmt, level) as handle:
+        writer = PcapngWriter(handle)
+        for packet in iter_packets(pcap):
+            stored = truncate_payload(packet, tls_ports, keep)
+            truncated += stored is not packet
+            writer.write(stored)
+            packets += 1
+    return packets, truncated
+
+
+def gather_captures(paths: List[Path]) -> List[Path]:
+    captures: List[Path] = []
+    for path in paths:
+        if path.is_dir():
+            captures.extend(p for p in sorted(path.rglob("*")) if p.is_file() and is_capture(p))
+        elif path.exists():
+            captures.append(path)
+        else:
+            raise FileNotFoundError(f"CAPTURE NOT FOUND: {path}")
+    return [p for p in captures if compression_of(p) is None]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Rewrite captures as compressed pcapng, optionally truncating TLS payloads.",
+    )
+    parser.add_argument("paths", nargs="+", type=Path, help="Captures or folders to archive.")
+    parser.add_argument("--format", choices=["zst", "gz"], default="zst", help="Compression (default: zst).")
+    parser.add_argument("--level", type=int, help="Compression level (default: 19 for zst, 9 for gz).")
+    parser.add_argument(
+        "--tls-ports",
+        default="443",
+        help="Comma-separated TCP ports whose payloads are opaque TLS records (default: 443).",
+    )
+    parser.add_argument(
+        "--tls-keep",
+        type=int,
+        default=64,
+        help="Payload bytes kept per TLS segment, -1 keeps everything (default: 64).",
+    )
+    parser.add_argument("--delete", action="store_true", help="Remove each original once its archive is verified.")
+    parser.add_argument("--overwrite", action="store_true", help="Rewrite archives that already exist.")
+    args = parser.parse_args()
+
+    level = args.level if args.level is not None else (19 if args.format == "zst" else 9)
+    tls_ports = {int(port) for port in args.tls_ports.split(",") if port.strip()}
+    total_before = total_after = 0
+    for pcap in gather_captures(args.paths):
+        target = pcap.with_name(f"{capture_stem(pcap)}.pcapng.{args.format}")
+        if target.exists() and not args.overwrite:
+            print(f"[skip] {target} esiste gia'")
+            continue
+        packets, truncated = archive_capture(pcap, target, args.format, level, tls_ports, args.tls_keep)
+        stored = sum(1 for _ in iter_packets(target))
+        if stored != packets:
+            target.unlink()
+            raise RuntimeError(f"{target}: {stored} pacchetti riletti, attesi {packets}")
+        before, after = pcap.stat().st_size, target.stat().st_size
+        total_before += before
+        total_after += after
+        print(
+            f"[ok] {pcap} -> {target.name}: {packets} pacchetti ({truncated} TLS troncati),"
+            f" {before/1e6:.2f} -> {after/1e6:.2f} MB"
+        )
+        if args.delete:
+            pcap.unlink()
+    if total_before:
+        print(f"[+] Totale {total_before/1e6:.2f} -> {total_after/1e6:.2f} MB ({100*total_after/total_before:.1f}%)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+'''
+# Attribute slow mediator requests from existing details CSVs
+python3 attribution_report.py --mediator-csv ../captures/local/74ms/testSdr_74ms_mediator.csv \
+    --rpc-csv ../captures/local/74ms/testSdr_74ms_anvil.csv --top 5
+
+# Or straight from a capture (runs the same extraction as analyze_latency.py)
+python3 attribution_report.py ../captures/sepolia/2025-11-21/21/testSdr21_2025-11-21_run1.pcap --rpc-port 443
+
+'''
+import argparse
+import bisect
+import csv
+from collections import defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+from pcap_io import capture_stem
+from analyze_latency import (
+    LatencyRecord,
+    check_tshark,
+    collect_requests,
+    link_rpc_to_mediator,
+    load_details_csv,
+    percentile,
+    resolve_tls_keylog_path,
+    run_tshark_fields,
+)
+
+Interval = Tuple[float, float]
+Endpoint = Tuple[str, str]
+
+
+@dataclass
+class Attribution:
+    record: LatencyRecord
+    rpc_time: float
+    mediator_time: float
+    local_time: float
+    chain: List[LatencyRecord] = field(default_factory=list)
+
+
+def request_start(rec: LatencyRecord) -> float:
+    return rec.timestamp - rec.latency
+
+
+def union(intervals: List[Interval]) -> List[Interval]:
+    merged: List[Interval] = []
+    for start, end in sorted(intervals):
+        if end <= start:
+            continue
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def covered(intervals: List[Interval]) -> float:
+    return sum(end - start for start, end in intervals)
+
+
+def subtract(intervals: List[Interval], removed: List[Interval]) -> List[Interval]:
+    result: List[Interval] = []
+    for start, end in intervals:
+        cursor = start
+        for r_start, r_end in removed:
+            if r_end <= cursor or r_start >= end:
+                continue
+            if r_start > cursor:
+                result.append((cursor, r_start))
+            cursor = max(cursor, r_end)
+        if cursor < end:
+            result.append((cursor, end))
+    return result
+
+
+def mediator_rpc_sources(
+    mediator_records: List[LatencyRecord], rpc_records: List[LatencyRecord]
+) -> Set[Endpoint]:
+    # RPC connections opened by the mediator: from a mediator host, and every call
+    # made while a mediator request was in flight. A client's own RPC connection
+    # also calls outside mediator requests, which tells them apart on one host.
+    hosts = {rec.dst_ip for rec in mediator_records}
+    windows = union([(request_start(rec), rec.timestamp) for rec in mediator_records])
+    window_starts = [start for start, _ in windows]
+    inside: Dict[Endpoint, bool] = {}
+    for rec in rpc_records:
+        if rec.src_ip not in hosts:
+            continue
+        pos = bisect.bisect_right(window_starts, request_start(rec)) - 1
+        source = (rec.src_ip, rec.src_port)
+        inside[source] = inside.get(source, True) and pos >= 0 and rec.timestamp <= windows[pos][1]
+    return {source for source, only_inside in inside.items() if only_inside}
+
+
+def linked_rpc(
+    mediator: LatencyRecord, rpc_records: List[LatencyRecord], sources: Set[Endpoint]
+) -> List[LatencyRecord]:
+    start, end = request_start(mediator), mediator.timestamp
+    linked = []
+    for rec in rpc_records:
+        by_payload = mediator.rpc_id is not None and rec.related_payload_id == mediator.rpc_id
+        by_source = (rec.src_ip, rec.src_port) in sources
+        inside = start <= request_start(rec) and rec.timestamp <= end
+        if by_payload or (by_source and inside):
+            linked.append(rec)
+    return sorted(linked, key=request_start)
+
+
+def waits_behind(mediator: LatencyRecord, other: LatencyRecord) -> bool:
+    # Requests of other clients run concurrently in the mediator; only an earlier
+    # request on the same connection, or from the same DIDComm sender, is ahead of it.
+    if other is mediator or request_start(other) >= request_start(mediator):
+        return False
+    same_connection = (other.src_ip, other.src_port) == (mediator.src_ip, mediator.src_port)
+    same_actor = mediator.app_actor is not None and other.app_actor == mediator.app_actor
+    return same_connection or same_actor
+
+
+def attribute(
+    mediator: LatencyRecord,
+    mediator_records: List[LatencyRecord],
+    rpc_records: List[LatencyRecord],
+    sources: Optional[Set[Endpoint]] = None,
+) -> Attribution:
+    if sources is None:
+        sources = mediator_rpc_sources(mediator_records, rpc_records)
+    start, end = request_start(mediator), mediator.timestamp
+    chain = linked_rpc(mediator, rpc_records, sources)
+    rpc_union = union([(max(start, request_start(r)), min(end, r.timestamp)) for r in chain])
+    others = union(
+        [
+            (max(start, request_start(other)), min(end, other.timestamp))
+            for other in mediator_records
+            if waits_behind(mediator, other)
+        ]
+    )
+    rpc_time = covered(rpc_union)
+    mediator_time = covered(subtract(others, rpc_union))
+    return Attribution(
+        record=mediator,
+        rpc_time=rpc_time,
+        mediator_time=mediator_time,
+        local_time=max(0.0, mediator.latency - rpc_time - mediator_time),
+        chain=chain,
+    )
+
+
+def format_chain(chain: List[LatencyRecord], limit: int = 12) -> str:
+    parts = [f"{rec.rpc_method or '-'} {rec.latency*1000:.1f}ms" for rec in chain[:limit]]
+    if len(chain) > limit:
+        parts.append(f"... (+{len(chain) - limit})")
+    return " -> ".join(parts) if parts else "-"
+
+
+def aggregate(attributions: List[Attribution]) -> List[Tuple[str, int, float, float, float, float]]:
+    totals: Dict[str, List[float]] = defaultdict(lambda: [0, 0.0, 0.0, 0.0, 0.0])
+    for item in attributions:
+        entry = totals[item.record.rpc_method or "-"]
+        entry[0] += 1
+        entry[1] += item.record.latency
+        entry[2] += item.rpc_time
+        entry[3] += item.mediator_time
+        entry[4] += item.local_time
+    rows = [
+        (op, int(values[0]), values[1], values[2], values[3], values[4])
+        for op, values in totals.items()
+    ]
+    rows.sort(key=lambda row: row[2], reverse=True)
+    return rows
+
+
+def write_report(
+    attributions: List[Attribution], output_dir: Path, stem: str
+) -> Tuple[Path, Path]:
+    output_dir.mkdir(parents=True, exist_ok=True)
+    details_path = output_dir / f"{stem}_attribution.csv"
+    with details_path.open("w", newline="", encoding="utf-8") as handle:
+        writer = csv.writer(handle)
+        writer.writerow(
+            (
+                "Frame",
+                "Timestamp",
+                "Operazione",
+                "Latency (ms)",
+                "RPC (ms)",
+                "Altro mediator (ms)",
+                "Locale (ms)",
+                "RPC collegate",
+                "Catena",
+            )
+        )
+        for item in attributions:
+            rec = item.record
+            writer.writerow(
+                (
+                    rec.frame_number,
+                    f"{rec.timestamp:.6f}",
+                    rec.rpc_method or "-",
+                    f"{rec.latency*1000:.2f}",
+                    f"{item.rpc_time*1000:.2f}",
+                    f"{item.mediator_time*1000:.2f}",
+                    f"{item.local_time*1000:.2f}",
+                    len(item.chain),
+                    format_chain(item.chain, limit=len(item.chain)),
+                )
+            )
+    summary_path = output_dir / f"{stem}_attribution_summary.csv"
+    with summary_path.open("w", newline="", encoding="utf-8") as handle:
+        writer = csv.writer(handle)
+        writer.writerow(
+            (
+                "Operazione",
+                "Conteggio",
+                "Totale (ms)",
+                "RPC (%)",
+                "Altro mediator (%)",
+                "Locale (%)",
+            )
+        )
+        for op, count, total, rpc, mediator, local in aggregate(attributions):
+            share = (lambda value: f"{100*value/total:.1f}") if total else (lambda value: "-")
+            writer.writerow(
+                (op, count, f"{total*1000:.2f}", share(rpc), share(mediator), share(local))
+            )
+    return details_path, summary_path
+
+
+def load_from_capture(
+    pcap: Path, mediator_port: int, rpc_port: int, extra_args: List[str]
+) -> Tuple[List[LatencyRecord], List[LatencyRecord]]:
+    check_tshark()
+    records: Dict[int, List[LatencyRecord]] = {}
+    for port in (mediator_port, rpc_port):
+        requests = collect_requests(pcap, port, extra_args=extra_args)
+        records[port] = list(run_tshark_fields(pcap, port, requests, extra_args=extra_args))
+    link_rpc_to_mediator(records[rpc_port], records[mediator_port])
+    return records[mediator_port], records[rpc_port]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Break slow mediator requests into RPC, mediator and local time.",
+    )
+    parser.add_argument("pcap", nargs="?", type=Path, help="Capture to analyze.")
+    parser.add_argument("--mediator-csv", type=Path, help="Mediator details CSV (--details output).")
+    parser.add_argument("--rpc-csv", type=Path, help="RPC details CSV (--details output).")
+    parser.add_argument("--mediator-port", type=int, default=3000, help="Mediator HTTP port (default: 3000).")
+    parser.add_argument("--rpc-port", type=int, default=8545, help="RPC port (default: 8545).")
+    parser.add_argument(
+        "--tls-keylog",
+        type=Path,
+        help="Path to an SSLKEYLOGFILE used to decrypt HTTPS captures (defaults to $SSLKEYLOGFILE).",
+    )
+    parser.add_argument(
+        "--slow-percentile",
+        type=float,
+        default=90.0,
+        help="Mediator requests at or above this latency percentile are attributed (default: 90).",
+    )
+    parser.add_argument("--top", type=int, default=10, help="Slowest requests to print (default: 10).")
+    parser.add_argument("--output-dir", type=Path, help="Output folder (default: input folder).")
+    args = parser.parse_args()
+
+    if args.mediator_csv and args.rpc_csv:
+        mediator_records = load_details_csv(args.mediator_csv)
+        rpc_records = load_details_csv(args.rpc_csv)
+        source = args.mediator_csv
+        stem = source.stem[: -len("_mediator")] if source.stem.endswith("_mediator") else source.stem
+    elif args.pcap is not None:
+        if not args.pcap.exists():
+            raise FileNotFoundError(f"CAPTURE NOT FOUND: {args.pcap}")
+        tls_keylog_path = resolve_tls_keylog_path(args.tls_keylog)
+        extra_args = ["-o", f"tls.keylog_file:{tls_keylog_path}"] if tls_keylog_path else []
+        mediator_records, rpc_records = load_from_capture(
+            args.pcap, args.mediator_port, args.rpc_port, extra_args
+        )
+        source, stem = args.pcap, capture_stem(args.pcap)
+    else:
+        parser.error("pass a capture or both --mediator-csv and --rpc-csv")
+
+    if not mediator_records:
+        print("[Avviso] Nessuna richiesta mediator da attribuire.")
+        return
+    threshold: Optional[float] = percentile(
+        sorted(rec.latency for rec in mediator_records), args.slow_percentile
+    )
+    slow = [rec for rec in mediator_records if threshold is None or rec.latency >= threshold]
+    sources = mediator_rpc_sources(mediator_records, rpc_records)
+    attributions = [attribute(rec, mediator_records, rpc_records, sources) for rec in slow]
+    attributions.sort(key=lambda item: item.record.latency, reverse=True)
+    details_path, summary_path = write_report(
+        attributions, args.output_dir or source.parent, stem
+    )
+    print(
+        f"[+] {len(attributions)} richieste mediator >= P{args.slow_percentile:g}"
+        f" ({(threshold or 0)*1000:.2f} ms)"
+    )
+    for item in attributions[: args.top]:
+        rec = item.record
+        print(
+            f"  frame {rec.frame_number} {rec.rpc_method or '-'}: {rec.latency*1000:.2f} ms"
+            f" = RPC {item.rpc_time*1000:.2f} + mediator {item.mediator_time*1000:.2f}"
+            f" + locale {item.local_time*1000:.2f}"
+        )
+        print(f"    {format_chain(item.chain)}")
+    print(f"  Dettagli -> {details_path}")
+    print(f"  Riepilogo -> {summary_path}")
+
+
+if __name__ == "__main__":
+    main()
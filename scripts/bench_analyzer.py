@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+'''
+# Throughput and ground-truth check of analyze_latency.py on 1k..1M synthetic frames
+python3 bench_analyzer.py --work-dir ../captures/bench
+
+# Full range, regenerating the captures with another seed
+python3 bench_analyzer.py --work-dir ../captures/bench --sizes 1k,10k,100k,1M,10M --seed 3 --regenerate
+
+'''
+import argparse
+import csv
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from analyze_latency import LatencyRecord, check_tshark, load_details_csv
+from pcap_io import iter_packets
+from synth_captures import PORTS, SynthConfig, generate, truth_path, write_truth
+
+ANALYZER = Path(__file__).resolve().parent / "analyze_latency.py"
+UNUSED_PORT = 9
+
+
+@dataclass
+class KindCheck:
+    expected: int = 0
+    recovered: int = 0
+    extra: int = 0
+    wrong_operation: int = 0
+    errors_ms: List[float] = field(default_factory=list)
+
+    @property
+    def missing(self) -> int:
+        return self.expected - self.recovered
+
+
+@dataclass
+class BenchResult:
+    frames: int
+    size_bytes: int
+    generate_s: float
+    analyze_s: float
+    peak_rss_kb: int
+    checks: Dict[str, KindCheck]
+
+    @property
+    def frames_per_s(self) -> float:
+        return self.frames / self.analyze_s if self.analyze_s else 0.0
+
+
+def parse_size(value: str) -> int:
+    value = value.strip().lower()
+    scale = {"k": 1_000, "m": 1_000_000}.get(value[-1:], 1)
+    return int(float(value[:-1] if scale > 1 else value) * scale)
+
+
+def size_label(frames: int) -> str:
+    if frames >= 1_000_000 and frames % 1_000_000 == 0:
+        return f"{frames // 1_000_000}M"
+    if frames >= 1_000 and frames % 1_000 == 0:
+        return f"{frames // 1_000}k"
+    return str(frames)
+
+
+def run_measured(cmd: List[str], cwd: Path) -> Tuple[float, int]:
+    # wait4 reports the peak RSS of the analyzer and of the tshark children it waited for.
+    start = time.perf_counter()
+    process = subprocess.Popen(cmd, cwd=cwd, stdout=subprocess.DEVNULL)
+    _, status, usage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if process.returncode != 0:
+        raise RuntimeError(f"{' '.join(cmd)} exited with {process.returncode}")
+    return elapsed, usage.ru_maxrss
+
+
+def load_truth(path: Path) -> Dict[Tuple[str, str], Dict[str, str]]:
+    with path.open("r", encoding="utf-8", newline="") as handle:
+        return {(row["Porta client"], row["Risposta"]): row for row in csv.DictReader(handle)}
+
+
+def check_records(
+    truth: Dict[Tuple[str, str], Dict[str, str]], records_by_kind: Dict[str, List[LatencyRecord]]
+) -> Dict[str, KindCheck]:
+    checks: Dict[str, KindCheck] = defaultdict(KindCheck)
+    for row in truth.values():
+        checks[row["Tipo"]].expected += 1
+    for kind, records in records_by_kind.items():
+        for rec in records:
+            row = truth.get((rec.src_port, f"{rec.timestamp:.6f}"))
+            if row is None or row["Tipo"] != kind:
+                checks[kind].extra += 1
+                continue
+            check = checks[kind]
+            check.recovered += 1
+            check.errors_ms.append(abs(rec.latency * 1000 - float(row["Latency (ms)"])))
+            if kind != "tls" and (rec.rpc_method or "") != row["Operazione"]:
+                check.wrong_operation += 1
+    return checks
+
+
+def bench_size(
+    frames: int, work_dir: Path, seed: int, regenerate: bool
+) -> BenchResult:
+    pcap = work_dir / f"synth_{size_label(frames)}.pcapng"
+    generate_s = 0.0
+    if regenerate or not pcap.exists() or not truth_path(pcap).exists():
+        start = time.perf_counter()
+        _, exchanges = generate(pcap, SynthConfig(frames=frames, seed=seed))
+        write_truth(pcap, exchanges)
+        generate_s = time.perf_counter() - start
+    stem = pcap.name[: -len(".pcapng")]
+    base = [sys.executable, str(ANALYZER), str(pcap), "--details", "--clock-offset", "none"]
+    # Pass 1: TLS fallback on 443. Its rpc details are renamed before pass 2 rewrites them.
+    tls_s, tls_rss = run_measured(
+        base + ["--mediator-port", str(UNUSED_PORT), "--rpc-port", str(PORTS["tls"])], work_dir
+    )
+    tls_csv = work_dir / f"{stem}_rpc.csv"
+    if tls_csv.exists():
+        tls_csv.replace(work_dir / f"{stem}_tls.csv")
+    http_s, http_rss = run_measured(
+        base + ["--mediator-port", str(PORTS["didcomm"]), "--rpc-port", str(PORTS["rpc"])], work_dir
+    )
+    records_by_kind: Dict[str, List[LatencyRecord]] = {}
+    for kind, suffix in (("rpc", "rpc"), ("didcomm", "mediator"), ("tls", "tls")):
+        details = work_dir / f"{stem}_{suffix}.csv"
+        records_by_kind[kind] = load_details_csv(details) if details.exists() else []
+    return BenchResult(
+        frames=sum(1 for _ in iter_packets(pcap)),
+        size_bytes=pcap.stat().st_size,
+        generate_s=generate_s,
+        analyze_s=tls_s + http_s,
+        peak_rss_kb=max(tls_rss, http_rss),
+        checks=dict(check_records(load_truth(truth_path(pcap)), records_by_kind)),
+    )
+
+
+def write_results(results: List[BenchResult], path: Path, tolerance_ms: float) -> Path:
+    with path.open("w", newline="", encoding="utf-8") as handle:
+        writer = csv.writer(handle)
+        writer.writerow(
+            (
+                "Frame",
+                "Tipo",
+                "Dimensione (MB)",
+                "Analisi (s)",
+                "Frame/s",
+                "Picco RSS (MB)",
+                "Attesi",
+                "Recuperati",
+                "Mancanti",
+                "Extra",
+                "Operazioni errate",
+                "Errore P50 (ms)",
+                "Errore max (ms)",
+                f"Oltre {tolerance_ms:g} ms",
+            )
+        )
+        for result in results:
+            for kind, check in sorted(result.checks.items()):
+                errors = check.errors_ms
+                writer.writerow(
+                    (
+                        result.frames,
+                        kind,
+                        f"{result.size_bytes / 1e6:.2f}",
+                        f"{result.analyze_s:.2f}",
+                        f"{result.frames_per_s:.0f}",
+                        f"{result.peak_rss_kb / 1024:.1f}",
+                        check.expected,
+                        check.recovered,
+                        check.missing,
+                        check.extra,
+                        check.wrong_operation,
+                        f"{statistics.median(errors):.3f}" if errors else "-",
+                        f"{max(errors):.3f}" if errors else "-",
+                        sum(1 for error in errors if error > tolerance_ms),
+                    )
+                )
+    return path
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Benchmark analyze_latency.py on synthetic captures and check it against ground truth.",
+    )
+    parser.add_argument(
+        "--work-dir",
+        type=Path,
+        default=Path("captures/bench"),
+        help="Folder for synthetic captures and analyzer output (default: ./captures/bench).",
+    )
+    parser.add_argument(
+        "--sizes",
+        default="1k,10k,100k,1M",
+        help="Comma-separated frame counts, k/M suffixes allowed (default: 1k,10k,100k,1M).",
+    )
+    parser.add_argument("--seed", type=int, default=1, help="Generator seed (default: 1).")
+    parser.add_argument("--regenerate", action="store_true", help="Rewrite captures that already exist.")
+    parser.add_argument(
+        "--tolerance-ms",
+        type=float,
+        default=0.01,
+        help="Max latency error against ground truth; details CSVs round to 0.01 ms (default: 0.01).",
+    )
+    args = parser.parse_args()
+    check_tshark()
+    args.work_dir.mkdir(parents=True, exist_ok=True)
+    results: List[BenchResult] = []
+    failed = False
+    for frames in (parse_size(value) for value in args.sizes.split(",") if value.strip()):
+        print(f"\n[+] {size_label(frames)} frame")
+        result = bench_size(frames, args.work_dir, args.seed, args.regenerate)
+        results.append(result)
+        if result.generate_s:
+            print(f"  Generazione: {result.generate_s:.2f} s")
+        print(
+            f"  Analisi: {result.analyze_s:.2f} s, {result.frames_per_s:,.0f} frame/s,"
+            f" picco RSS {result.peak_rss_kb / 1024:.1f} MB"
+        )
+        for kind, check in sorted(result.checks.items()):
+            worst = max(check.errors_ms) if check.errors_ms else 0.0
+            ok = (
+                check.missing == 0
+                and check.extra == 0
+                and check.wrong_operation == 0
+                and worst <= args.tolerance_ms + 1e-9
+            )
+            failed = failed or not ok
+            print(
+                f"  {'[ok]' if ok else '[!] '} {kind}: {check.recovered}/{check.expected} recuperati,"
+                f" {check.extra} extra, {check.wrong_operation} operazioni errate, errore max {worst:.3f} ms"
+            )
+    output = write_results(results, args.work_dir / "bench_results.csv", args.tolerance_ms)
+    print(f"\nRisultati -> {output}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
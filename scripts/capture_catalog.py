@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+'''
+# Index (or refresh) every capture under ../captures
+python3 capture_catalog.py update --base-dir ../captures
+
+# Select captures without opening them: Sepolia 15h slot, run 1, across days
+python3 capture_catalog.py query --base-dir ../captures --network sepolia --hour 15 --run 1
+
+# List byte-identical captures stored under different names
+python3 capture_catalog.py duplicates --base-dir ../captures
+
+'''
+import argparse
+import hashlib
+import re
+import sqlite3
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from pcap_io import capture_stem, is_capture, iter_packets, parse_tcp
+
+CATALOG_NAME = "catalog.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS captures (
+    path TEXT PRIMARY KEY,
+    sha256 TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    packets INTEGER NOT NULL,
+    first_ts REAL,
+    last_ts REAL,
+    linktype INTEGER,
+    ports TEXT,
+    network TEXT,
+    day TEXT,
+    hour TEXT,
+    delay_ms INTEGER,
+    test TEXT,
+    run TEXT
+);
+CREATE INDEX IF NOT EXISTS captures_dims ON captures (network, day, hour, test, run);
+CREATE INDEX IF NOT EXISTS captures_hash ON captures (sha256);
+CREATE INDEX IF NOT EXISTS captures_time ON captures (first_ts, last_ts);
+"""
+
+
+@dataclass
+class CaptureEntry:
+    path: str
+    sha256: str
+    size: int
+    mtime: float
+    packets: int
+    first_ts: Optional[float]
+    last_ts: Optional[float]
+    linktype: Optional[int]
+    ports: str
+    network: Optional[str]
+    day: Optional[str]
+    hour: Optional[str]
+    delay_ms: Optional[int]
+    test: Optional[str]
+    run: Optional[str]
+
+
+def catalog_path(base_dir: Path) -> Path:
+    return base_dir / CATALOG_NAME
+
+
+def connect(db_path: Path) -> sqlite3.Connection:
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    connection = sqlite3.connect(str(db_path))
+    connection.row_factory = sqlite3.Row
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def parse_dimensions(relative: Path) -> Dict[str, Optional[str]]:
+    dims: Dict[str, Optional[str]] = {
+        "network": None,
+        "day": None,
+        "hour": None,
+        "delay_ms": None,
+        "test": None,
+        "run": None,
+    }
+    parts = relative.parts
+    if len(parts) > 1:
+        dims["network"] = parts[0]
+    for part in parts[1:-1]:
+        if re.fullmatch(r"\d{4}-\d{2}-\d{2}", part):
+            dims["day"] = part
+        elif re.fullmatch(r"\d{1,2}", part):
+            dims["hour"] = part
+        elif re.fullmatch(r"\d+ms", part):
+            dims["delay_ms"] = part[:-2]
+    stem = capture_stem(relative)
+    run_match = re.search(r"_run(\d+)$", stem)
+    if run_match:
+        dims["run"] = run_match.group(1)
+    test = stem.split("_", 1)[0]
+    if dims["hour"] and test.endswith(dims["hour"]):
+        test = test[: -len(dims["hour"])]
+    dims["test"] = test or None
+    return dims
+
+
+def file_digest(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as handle:
+        for chunk in iter(lambda: handle.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def scan_capture(path: Path, base_dir: Path) -> CaptureEntry:
+    stat = path.stat()
+    packets = 0
+    first_ts: Optional[float] = None
+    last_ts: Optional[float] = None
+    linktype: Optional[int] = None
+    ports: Set[int] = set()
+    try:
+        for packet in iter_packets(path):
+            packets += 1
+            if first_ts is None:
+                first_ts = packet.timestamp
+                linktype = packet.linktype
+            last_ts = packet.timestamp
+            tcp = parse_tcp(packet)
+            if tcp is not None:
+                ports.add(min(tcp.src_port, tcp.dst_port))
+    except (ValueError, IndexError) as exc:
+        print(f"[Avviso] {path}: {exc}")
+    dims = parse_dimensions(path.relative_to(base_dir))
+    return CaptureEntry(
+        path=str(path.relative_to(base_dir)),
+        sha256=file_digest(path),
+        size=stat.st_size,
+        mtime=stat.st_mtime,
+        packets=packets,
+        first_ts=first_ts,
+        last_ts=last_ts,
+        linktype=linktype,
+        ports=",".join(str(port) for port in sorted(ports)),
+        network=dims["network"],
+        day=dims["day"],
+        hour=dims["hour"],
+        delay_ms=int(dims["delay_ms"]) if dims["delay_ms"] else None,
+        test=dims["test"],
+        run=dims["run"],
+    )
+
+
+def iter_capture_files(base_dir: Path) -> Iterable[Path]:
+    for path in sorted(base_dir.rglob("*")):
+        if is_capture(path) and path.is_file():
+            yield path
+
+
+def update_catalog(base_dir: Path, db_path: Optional[Path] = None) -> Tuple[int, int, int]:
+    connection = connect(db_path or catalog_path(base_dir))
+    try:
+        known = {
+            row["path"]: (row["size"], row["mtime"])
+            for row in connection.execute("SELECT path, size, mtime FROM captures")
+        }
+        seen: Set[str] = set()
+        added = 0
+        for path in iter_capture_files(base_dir):
+            relative = str(path.relative_to(base_dir))
+            seen.add(relative)
+            stat = path.stat()
+            if known.get(relative) == (stat.st_size, stat.st_mtime):
+                continue
+            entry = scan_capture(path, base_dir)
+            connection.execute(
+                "INSERT OR REPLACE INTO captures VALUES "
+                "(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    entry.path,
+                    entry.sha256,
+                    entry.size,
+                    entry.mtime,
+                    entry.packets,
+                    entry.first_ts,
+                    entry.last_ts,
+                    entry.linktype,
+                    entry.ports,
+                    entry.network,
+                    entry.day,
+                    entry.hour,
+                    entry.delay_ms,
+                    entry.test,
+                    entry.run,
+                ),
+            )
+            added += 1
+        removed = [path for path in known if path not in seen]
+        connection.executemany("DELETE FROM captures WHERE path = ?", [(p,) for p in removed])
+        connection.commit()
+        return added, len(removed), len(seen)
+    finally:
+        connection.close()
+
+
+def parse_time_bound(value: Optional[str], end: bool = False) -> Optional[float]:
+    if not value:
+        return None
+    dt = datetime.fromisoformat(value)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    if end and len(value) == 10:
+        return dt.timestamp() + 86400
+    return dt.timestamp()
+
+
+def query_captures(
+    base_dir: Path,
+    db_path: Optional[Path] = None,
+    network: Optional[str] = None,
+    day: Optional[str] = None,
+    hour: Optional[str] = None,
+    delay_ms: Optional[int] = None,
+    test: Optional[str] = None,
+    run: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    port: Optional[int] = None,
+    unique: bool = True,
+) -> List[Path]:
+    clauses: List[str] = []
+    params: List[object] = []
+    for column, value in (
+        ("network", network),
+        ("day", day),
+        ("hour", hour),
+        ("delay_ms", delay_ms),
+        ("run", run),
+    ):
+        if value is not None:
+            clauses.append(f"{column} = ?")
+            params.append(value)
+    if test:
+        clauses.append("(test = ? OR path LIKE ?)")
+        params.extend([test, f"%{test}%"])
+    since_ts = parse_time_bound(since)
+    until_ts = parse_time_bound(until, end=True)
+    if since_ts is not None:
+        clauses.append("last_ts >= ?")
+        params.append(since_ts)
+    if until_ts is not None:
+        clauses.append("first_ts < ?")
+        params.append(until_ts)
+    if port is not None:
+        clauses.append("(',' || ports || ',') LIKE ?")
+        params.append(f"%,{port},%")
+    query = "SELECT path, sha256 FROM captures"
+    if clauses:
+        query += " WHERE " + " AND ".join(clauses)
+    query += " ORDER BY first_ts, path"
+    connection = connect(db_path or catalog_path(base_dir))
+    try:
+        rows = connection.execute(query, params).fetchall()
+    finally:
+        connection.close()
+    paths: List[Path] = []
+    hashes: Set[str] = set()
+    for row in rows:
+        if unique and row["sha256"] in hashes:
+            continue
+        hashes.add(row["sha256"])
+        paths.append(base_dir / row["path"])
+    return paths
+
+
+def find_duplicates(base_dir: Path, db_path: Optional[Path] = None) -> List[List[str]]:
+    connection = connect(db_path or catalog_path(base_dir))
+    try:
+        rows = connection.execute(
+            "SELECT sha256, path FROM captures WHERE sha256 IN "
+            "(SELECT sha256 FROM captures GROUP BY sha256 HAVING COUNT(*) > 1) "
+            "ORDER BY sha256, path"
+        ).fetchall()
+    finally:
+        connection.close()
+    groups: Dict[str, List[str]] = {}
+    for row in rows:
+        groups.setdefault(row["sha256"], []).append(row["path"])
+    return list(groups.values())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Index captures for fast selection.")
+    parser.add_argument("command", choices=["update", "query", "duplicates"])
+    parser.add_argument(
+        "--base-dir",
+        type=Path,
+        default=Path("captures"),
+        help="Base captures directory (default: ./captures).",
+    )
+    parser.add_argument("--catalog", type=Path, help=f"Catalog path (default: <base-dir>/{CATALOG_NAME}).")
+    parser.add_argument("--network", help="Network folder (sepolia, local, ...).")
+    parser.add_argument("--day", help="Day folder (YYYY-MM-DD).")
+    parser.add_argument("--hour", help="Hour slot folder (15, 18, 21).")
+    parser.add_argument("--delay", type=int, help="Local netem delay folder in ms.")
+    parser.add_argument("--test-name", help="Test/scenario name.")
+    parser.add_argument("--run", help="Run slot (1, 2, 3).")
+    parser.add_argument("--since", help="Captures ending after this date/time (ISO, UTC).")
+    parser.add_argument("--until", help="Captures starting before this date/time (ISO, UTC).")
+    parser.add_argument("--port", type=int, help="Only captures that observed this TCP port.")
+    parser.add_argument("--all", action="store_true", help="Keep byte-identical duplicates in query output.")
+    args = parser.parse_args()
+
+    added, removed, total = update_catalog(args.base_dir, args.catalog)
+    if args.command == "update":
+        print(f"[ok] {total} capture indicizzate ({added} aggiornate, {removed} rimosse)")
+        return
+    if args.command == "duplicates":
+        for group in find_duplicates(args.base_dir, args.catalog):
+            print("  " + " = ".join(group))
+        return
+    for path in query_captures(
+        args.base_dir,
+        args.catalog,
+        network=args.network,
+        day=args.day,
+        hour=args.hour,
+        delay_ms=args.delay,
+        test=args.test_name,
+        run=args.run,
+        since=args.since,
+        until=args.until,
+        port=args.port,
+        unique=not args.all,
+    ):
+        print(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+'''
+Argument vocabulary shared by analyze_latency.py, summarize_runs.py, plot_results.py
+and their sdr.py subcommands: the same flag selects the same captures everywhere.
+
+    --base-dir captures --network sepolia --day 2025-11-21 --slot 1,3 --test-name testSdr21
+
+Stdlib only: sdr.py imports it before knowing which subcommand runs.
+'''
+import argparse
+import contextlib
+import json
+import sys
+from pathlib import Path
+from typing import Any, Callable, List, Optional
+
+# The three daily runs of the protocol; run_experiments.py --runs may add more.
+RUN_SLOTS = ("1", "2", "3")
+
+
+def parse_slot(value: str) -> Optional[List[str]]:
+    # "all"/"both" -> None (every run), otherwise a comma list of run numbers.
+    if value.strip() in ("all", "both", ""):
+        return None
+    slots = [part.strip() for part in value.split(",") if part.strip()]
+    for slot in slots:
+        if not slot.isdigit() or int(slot) < 1:
+            raise argparse.ArgumentTypeError(
+                f"Invalid slot '{slot}'. Use 'all' or run numbers (e.g. 1,2,3) separated by commas."
+            )
+    return [str(int(slot)) for slot in slots]
+
+
+def slot_label(slots: Optional[List[str]]) -> str:
+    return ",".join(slots) if slots else "all"
+
+
+def add_selection_args(
+    parser: argparse.ArgumentParser,
+    day_required: bool = False,
+    day_help: str = "Day folder (YYYY-MM-DD).",
+    slot_default: str = "all",
+    test_required: bool = False,
+    test_help: str = "Test/scenario name.",
+) -> None:
+    group = parser.add_argument_group("capture selection")
+    group.add_argument(
+        "--base-dir",
+        type=Path,
+        default=Path("captures"),
+        help="Base captures directory (default: ./captures).",
+    )
+    group.add_argument(
+        "--network",
+        default="sepolia",
+        help="Network subfolder under --base-dir (default: sepolia).",
+    )
+    group.add_argument("--day", required=day_required, help=day_help)
+    group.add_argument(
+        "--slot",
+        "--slots",
+        dest="slot",
+        type=parse_slot,
+        default=parse_slot(slot_default),
+        help=f"Runs to include: 'all' or a comma list of run numbers (default: {slot_default}).",
+    )
+    group.add_argument("--test-name", "--test", dest="test_name", required=test_required, help=test_help)
+
+
+def add_json_arg(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--json",
+        action="store_true",
+        default=argparse.SUPPRESS,
+        help="Print a JSON result on stdout (progress messages go to stderr).",
+    )
+
+
+def run_command(run: Callable[[argparse.Namespace], Any], args: argparse.Namespace) -> None:
+    # With --json the human-readable output moves to stderr and stdout carries only the result.
+    if not getattr(args, "json", False):
+        run(args)
+        return
+    with contextlib.redirect_stdout(sys.stderr):
+        result = run(args)
+    json.dump(result, sys.stdout, indent=2, default=str)
+    sys.stdout.write("\n")
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+'''
+# Group the RPC calls of a capture into did:ethr resolution sessions
+python3 did_resolution.py ../captures/local/0ms/testSdr_0ms.pcap --rpc-port 8545
+
+# Sepolia captures need the TLS key log to see the JSON-RPC payloads
+python3 did_resolution.py ../captures/sepolia/2025-11-21/21/testSdr21_2025-11-21_run1.pcap --rpc-port 443 --tls-keylog keys.log
+
+'''
+import argparse
+import csv
+import statistics
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from pcap_io import capture_stem
+from analyze_latency import (
+    CHANGED_SELECTOR,
+    LatencyRecord,
+    check_tshark,
+    collect_requests,
+    percentile,
+    resolve_tls_keylog_path,
+    run_tshark_fields,
+)
+
+
+@dataclass
+class ResolutionSession:
+    address: str
+    calls: List[LatencyRecord] = field(default_factory=list)
+    repeat: bool = False
+
+    @property
+    def start(self) -> float:
+        return min(rec.timestamp - rec.latency for rec in self.calls)
+
+    @property
+    def end(self) -> float:
+        return max(rec.timestamp for rec in self.calls)
+
+    @property
+    def latency(self) -> float:
+        return self.end - self.start
+
+    @property
+    def rpc_time(self) -> float:
+        return sum(rec.latency for rec in self.calls)
+
+
+def group_sessions(records: List[LatencyRecord], idle_gap: float = 1.0) -> List[ResolutionSession]:
+    open_sessions: Dict[str, ResolutionSession] = {}
+    sessions: List[ResolutionSession] = []
+    seen: set = set()
+    for rec in sorted(records, key=lambda item: item.timestamp - item.latency):
+        address = rec.rpc_address
+        if not address:
+            continue
+        request_time = rec.timestamp - rec.latency
+        current = open_sessions.get(address)
+        # A second changed(address) read starts a new resolution; so does a long pause.
+        # Other registry reads (identityOwner, nonce) stay with the open one.
+        restart = rec.rpc_selector == CHANGED_SELECTOR and current is not None and any(
+            call.rpc_selector == CHANGED_SELECTOR for call in current.calls
+        )
+        if current is None or restart or request_time - current.end > idle_gap:
+            current = ResolutionSession(address=address, repeat=address in seen)
+            seen.add(address)
+            open_sessions[address] = current
+            sessions.append(current)
+        current.calls.append(rec)
+    return sessions
+
+
+def walk_calls(session: ResolutionSession) -> List[LatencyRecord]:
+    # The eth_getLogs walk is sequential: each query starts from the block returned by
+    # the previous answer, the first one from changed(address). Without either (a
+    # capture cut mid-resolution) the slowest call is kept.
+    walk = [
+        rec for rec in session.calls
+        if rec.rpc_selector == CHANGED_SELECTOR or rec.rpc_method == "eth_getLogs"
+    ]
+    return walk or [max(session.calls, key=lambda rec: rec.latency)]
+
+
+def merge_intervals(intervals: List[Tuple[float, float]]) -> List[Tuple[float, float]]:
+    merged: List[Tuple[float, float]] = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def batch_saving(session: ResolutionSession) -> Tuple[float, int]:
+    # Independent reads (identityOwner, nonce, ...) can ride in the same batch as a
+    # walk step, so only the time when nothing but them was in flight goes away.
+    walk = walk_calls(session)
+    chained = {id(rec) for rec in walk}
+    independent = [rec for rec in session.calls if id(rec) not in chained]
+    cover = merge_intervals([(rec.timestamp - rec.latency, rec.timestamp) for rec in walk])
+    saved = 0.0
+    for start, end in merge_intervals([(rec.timestamp - rec.latency, rec.timestamp) for rec in independent]):
+        covered = sum(max(0.0, min(end, c_end) - max(start, c_start)) for c_start, c_end in cover)
+        saved += end - start - covered
+    return saved, len(independent)
+
+
+def summarize_sessions(sessions: List[ResolutionSession]) -> List[Tuple[str, str]]:
+    if not sessions:
+        return [("Risoluzioni", "0")]
+    latencies = sorted(session.latency for session in sessions)
+    counts = [len(session.calls) for session in sessions]
+    repeats = [session for session in sessions if session.repeat]
+    # Cache: repeated resolutions disappear. Batch: independent reads join the walk.
+    cache_ms = sum(session.latency for session in repeats) * 1000.0
+    savings = [batch_saving(session) for session in sessions]
+    batch_ms = sum(saved for saved, _ in savings) * 1000.0
+    return [
+        ("Risoluzioni", str(len(sessions))),
+        ("DID distinti", str(len({session.address for session in sessions}))),
+        ("Min (ms)", f"{latencies[0]*1000:.2f}"),
+        ("P50 (ms)", f"{percentile(latencies, 50)*1000:.2f}"),
+        ("P90 (ms)", f"{percentile(latencies, 90)*1000:.2f}"),
+        ("P95 (ms)", f"{percentile(latencies, 95)*1000:.2f}"),
+        ("Max (ms)", f"{latencies[-1]*1000:.2f}"),
+        ("Media (ms)", f"{statistics.mean(latencies)*1000:.2f}"),
+        ("RPC per risoluzione (media)", f"{statistics.mean(counts):.2f}"),
+        ("RPC per risoluzione (max)", str(max(counts))),
+        ("Tasso ripetizione", f"{len(repeats)/len(sessions):.4f}"),
+        ("Risparmio cache (ms)", f"{cache_ms:.2f}"),
+        ("Risparmio cache (RPC)", str(sum(len(session.calls) for session in repeats))),
+        ("Risparmio batch (ms)", f"{batch_ms:.2f}"),
+        ("Risparmio batch (RPC)", str(sum(calls for _, calls in savings))),
+    ]
+
+
+def write_outputs(
+    sessions: List[ResolutionSession], pcap: Path
+) -> Tuple[Path, Path]:
+    details_path = pcap.parent / f"{capture_stem(pcap)}_did_resolution.csv"
+    with details_path.open("w", newline="", encoding="utf-8") as handle:
+        writer = csv.writer(handle)
+        writer.writerow(
+            ("DID", "Inizio", "Latency (ms)", "Tempo RPC (ms)", "RPC", "Ripetuta", "Chiamate")
+        )
+        for session in sessions:
+            writer.writerow(
+                (
+                    f"did:ethr:{session.address}",
+                    f"{session.start:.6f}",
+                    f"{session.latency*1000:.2f}",
+                    f"{session.rpc_time*1000:.2f}",
+                    len(session.calls),
+                    "si" if session.repeat else "no",
+                    " ".join(rec.rpc_method or "-" for rec in session.calls),
+                )
+            )
+    summary_path = pcap.parent / f"{capture_stem(pcap)}_did_resolution_summary.csv"
+    with summary_path.open("w", newline="", encoding="utf-8") as handle:
+        writer = csv.writer(handle)
+        writer.writerow(("Metric", "Value"))
+        writer.writerows(summarize_sessions(sessions))
+    return details_path, summary_path
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Profile did:ethr resolutions from the RPC calls in a capture.",
+    )
+    parser.add_argument("pcaps", nargs="+", type=Path, help="PCAP/PCAPNG files to analyze.")
+    parser.add_argument(
+        "--rpc-port",
+        type=int,
+        default=8545,
+        help="RPC port to analyze (use 443 with --tls-keylog for provider endpoints).",
+    )
+    parser.add_argument(
+        "--tls-keylog",
+        type=Path,
+        help="Path to an SSLKEYLOGFILE used to decrypt HTTPS captures (defaults to $SSLKEYLOGFILE).",
+    )
+    parser.add_argument(
+        "--idle-gap",
+        type=float,
+        default=1.0,
+        help="Seconds without calls for a DID that close its resolution session (default: 1).",
+    )
+    args = parser.parse_args()
+    check_tshark()
+    tls_keylog_path = resolve_tls_keylog_path(args.tls_keylog)
+    extra_args: List[str] = []
+    if tls_keylog_path:
+        extra_args = ["-o", f"tls.keylog_file:{tls_keylog_path}"]
+    for pcap in args.pcaps:
+        if not pcap.exists():
+            raise FileNotFoundError(f"CAPTURE NOT FOUND: {pcap}")
+        print(f"\n[+] Analyzing {pcap}")
+        requests = collect_requests(pcap, args.rpc_port, extra_args=extra_args)
+        records = list(run_tshark_fields(pcap, args.rpc_port, requests, extra_args=extra_args))
+        sessions = group_sessions(records, idle_gap=args.idle_gap)
+        details_path, summary_path = write_outputs(sessions, pcap)
+        unattributed = sum(1 for rec in records if not rec.rpc_address)
+        print(f"  {len(sessions)} risoluzioni DID, {unattributed} chiamate RPC non attribuite")
+        print(f"  Dettagli -> {details_path}")
+        print(f"  Riepilogo -> {summary_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+'''
+# Reconstruct forwarded message lifecycles from the mediator DB only
+python3 mediator_dwell.py --mediator-db ../mediator.sqlite --output-dir ../captures/local/0ms
+
+# Align the lifecycle with the HTTP requests seen in a capture
+python3 mediator_dwell.py ../captures/local/0ms/testSdr_0ms.pcap --mediator-db ../mediator.sqlite
+
+'''
+import argparse
+import bisect
+import csv
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from pcap_io import capture_stem
+from analyze_latency import (
+    ClockOffset,
+    LatencyRecord,
+    MediatorMessage,
+    align_mediator_messages,
+    annotate_with_mediator,
+    check_tshark,
+    collect_requests,
+    load_mediator_messages,
+    percentile,
+    run_tshark_fields,
+)
+
+FORWARD_TYPE = "https://didcomm.org/routing/2.0/forward"
+DELIVERY_REQUEST_TYPE = "https://didcomm.org/messagepickup/3.0/delivery-request"
+STATUS_REQUEST_TYPE = "https://didcomm.org/messagepickup/3.0/status-request"
+DELIVERY_TYPE = "https://didcomm.org/messagepickup/3.0/delivery"
+MESSAGES_RECEIVED_TYPE = "https://didcomm.org/messagepickup/3.0/messages-received"
+
+PICKUP_TYPES = {DELIVERY_REQUEST_TYPE, STATUS_REQUEST_TYPE}
+PROTOCOL_TYPES = {
+    FORWARD_TYPE,
+    DELIVERY_REQUEST_TYPE,
+    STATUS_REQUEST_TYPE,
+    DELIVERY_TYPE,
+    MESSAGES_RECEIVED_TYPE,
+}
+
+
+@dataclass
+class MessageLifecycle:
+    id: str
+    recipient: Optional[str]
+    forwarded: Optional[float] = None
+    stored: Optional[float] = None
+    picked_up: Optional[float] = None
+    acknowledged: Optional[float] = None
+    polls_before_pickup: int = 0
+    network_ms: List[float] = field(default_factory=list)
+
+    @property
+    def start(self) -> Optional[float]:
+        return self.forwarded if self.forwarded is not None else self.stored
+
+
+def forward_recipient(row: MediatorMessage) -> Optional[str]:
+    value = row.data.get("next")
+    return str(value) if value else row.to_did
+
+
+def pickup_recipient(row: MediatorMessage) -> Optional[str]:
+    value = row.data.get("recipient_did")
+    return str(value) if value else row.from_did
+
+
+def build_lifecycles(
+    rows: List[MediatorMessage], mediator_did: Optional[str], tolerance: float = 5.0
+) -> List[MessageLifecycle]:
+    forwards = [row for row in rows if row.msg_type == FORWARD_TYPE]
+    queued = [
+        row
+        for row in rows
+        if row.msg_type not in PROTOCOL_TYPES and row.to_did and row.to_did != mediator_did
+    ]
+    polls: Dict[str, List[float]] = {}
+    deliveries: Dict[str, List[float]] = {}
+    for row in rows:
+        if row.msg_type in PICKUP_TYPES:
+            recipient = pickup_recipient(row)
+            if recipient:
+                polls.setdefault(recipient, []).append(row.timestamp)
+                if row.msg_type == DELIVERY_REQUEST_TYPE:
+                    deliveries.setdefault(recipient, []).append(row.timestamp)
+    for times in (*polls.values(), *deliveries.values()):
+        times.sort()
+    acks_by_id: Dict[str, float] = {}
+    acks_by_recipient: Dict[str, List[float]] = {}
+    for row in rows:
+        if row.msg_type != MESSAGES_RECEIVED_TYPE:
+            continue
+        for message_id in row.data.get("message_id_list") or []:
+            acks_by_id.setdefault(str(message_id), row.timestamp)
+        if row.from_did:
+            acks_by_recipient.setdefault(row.from_did, []).append(row.timestamp)
+
+    lifecycles: List[MessageLifecycle] = []
+    used_queued: set = set()
+    for fwd in forwards:
+        recipient = forward_recipient(fwd)
+        lifecycle = MessageLifecycle(id=fwd.id, recipient=recipient, forwarded=fwd.timestamp)
+        for row in queued:
+            if row.id in used_queued or row.to_did != recipient:
+                continue
+            if 0 <= row.timestamp - fwd.timestamp <= tolerance:
+                used_queued.add(row.id)
+                lifecycle.id = row.id
+                lifecycle.stored = row.timestamp
+                break
+        lifecycles.append(lifecycle)
+    for row in queued:
+        if row.id not in used_queued:
+            lifecycles.append(
+                MessageLifecycle(id=row.id, recipient=row.to_did, stored=row.timestamp)
+            )
+
+    for lifecycle in lifecycles:
+        # Polls count from the moment the message sat in the queue.
+        queued_at = lifecycle.stored if lifecycle.stored is not None else lifecycle.start
+        if queued_at is None or not lifecycle.recipient:
+            continue
+        recipient_polls = polls.get(lifecycle.recipient, [])
+        # The delivery-request that fetched it: the last one before its ack when the
+        # ack lists the id, otherwise the first after storage. Status requests only
+        # count as polls, unless the recipient never sends delivery-requests.
+        fetches = deliveries.get(lifecycle.recipient) or recipient_polls
+        ack = acks_by_id.get(lifecycle.id)
+        first = bisect.bisect_left(fetches, queued_at)
+        last = bisect.bisect_right(fetches, ack) if ack is not None else first
+        if last > first:
+            lifecycle.picked_up = fetches[last - 1]
+        elif first < len(fetches):
+            lifecycle.picked_up = fetches[first]
+        waiting_from = bisect.bisect_left(recipient_polls, queued_at)
+        waiting_to = (
+            bisect.bisect_left(recipient_polls, lifecycle.picked_up)
+            if lifecycle.picked_up is not None
+            else len(recipient_polls)
+        )
+        lifecycle.polls_before_pickup = max(0, waiting_to - waiting_from)
+        if ack is None and lifecycle.picked_up is not None:
+            later = [
+                ts
+                for ts in acks_by_recipient.get(lifecycle.recipient, [])
+                if ts >= lifecycle.picked_up
+            ]
+            ack = later[0] if later else None
+        lifecycle.acknowledged = ack
+    lifecycles.sort(key=lambda item: item.start or 0.0)
+    return lifecycles
+
+
+def attach_network_latency(
+    lifecycles: List[MessageLifecycle],
+    records: List[LatencyRecord],
+    clock: Optional[ClockOffset] = None,
+    tolerance: float = 5.0,
+) -> None:
+    # tolerance: the matching window of align_mediator_messages (clock-offset spread).
+    by_payload = {rec.rpc_id: rec for rec in records if rec.rpc_id}
+    by_request_time = sorted(records, key=lambda rec: rec.timestamp - rec.latency)
+    request_times = [rec.timestamp - rec.latency for rec in by_request_time]
+    for lifecycle in lifecycles:
+        rec = by_payload.get(lifecycle.id)
+        if rec is not None:
+            lifecycle.network_ms.append(rec.latency * 1000.0)
+        for event in (lifecycle.picked_up, lifecycle.acknowledged):
+            if event is None:
+                continue
+            if clock is not None:
+                event -= clock.at(event)
+            lo = bisect.bisect_left(request_times, event - tolerance)
+            hi = bisect.bisect_right(request_times, event + tolerance)
+            if lo == hi:
+                continue
+            nearest = min(range(lo, hi), key=lambda idx: abs(request_times[idx] - event))
+            lifecycle.network_ms.append(by_request_time[nearest].latency * 1000.0)
+
+
+def queue_depth(lifecycles: List[MessageLifecycle]) -> List[Tuple[float, int]]:
+    events: List[Tuple[float, int]] = []
+    for lifecycle in lifecycles:
+        start = lifecycle.start
+        if start is None:
+            continue
+        events.append((start, 1))
+        end = lifecycle.acknowledged or lifecycle.picked_up
+        if end is not None:
+            events.append((end, -1))
+    events.sort()
+    depth = 0
+    series: List[Tuple[float, int]] = []
+    for timestamp, delta in events:
+        depth += delta
+        series.append((timestamp, depth))
+    return series
+
+
+def poll_intervals(rows: List[MediatorMessage]) -> List[float]:
+    last_poll: Dict[str, float] = {}
+    intervals: List[float] = []
+    for row in rows:
+        if row.msg_type not in PICKUP_TYPES:
+            continue
+        recipient = pickup_recipient(row)
+        if not recipient:
+            continue
+        if recipient in last_poll:
+            intervals.append(row.timestamp - last_poll[recipient])
+        last_poll[recipient] = row.timestamp
+    return intervals
+
+
+def delta_ms(start: Optional[float], end: Optional[float]) -> Optional[float]:
+    if start is None or end is None:
+        return None
+    return (end - start) * 1000.0
+
+
+def summarize_values(values: List[float]) -> Dict[str, Optional[float]]:
+    ordered = sorted(values)
+    return {
+        "count": len(ordered),
+        "P50 (ms)": percentile(ordered, 50),
+        "P90 (ms)": percentile(ordered, 90),
+        "P95 (ms)": percentile(ordered, 95),
+        "Max (ms)": ordered[-1] if ordered else None,
+    }
+
+
+def write_outputs(
+    lifecycles: List[MessageLifecycle],
+    depth: List[Tuple[float, int]],
+    intervals: List[float],
+    output_dir: Path,
+    stem: str,
+) -> Tuple[Path, Path, Path]:
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    def fmt(value: Optional[float], pattern: str = "{:.2f}") -> str:
+        return pattern.format(value) if value is not None else "-"
+
+    details_path = output_dir / f"{stem}_dwell.csv"
+    with details_path.open("w", newline="", encoding="utf-8") as handle:
+        writer = csv.writer(handle)
+        writer.writerow(
+            (
+                "Message ID",
+                "Destinatario",
+                "Forward",
+                "Salvato",
+                "Ritirato",
+                "Confermato",
+                "Poll precedenti",
+                "Dwell (ms)",
+                "Ritiro->Conferma (ms)",
+                "Totale (ms)",
+                "Rete (ms)",
+            )
+        )
+        for item in lifecycles:
+            writer.writerow(
+                (
+                    item.id,
+                    item.recipient or "-",
+                    fmt(item.forwarded, "{:.6f}"),
+                    fmt(item.stored, "{:.6f}"),
+                    fmt(item.picked_up, "{:.6f}"),
+                    fmt(item.acknowledged, "{:.6f}"),
+                    item.polls_before_pickup,
+                    fmt(delta_ms(item.start, item.picked_up)),
+                    fmt(delta_ms(item.picked_up, item.acknowledged)),
+                    fmt(delta_ms(item.start, item.acknowledged)),
+                    fmt(sum(item.network_ms) if item.network_ms else None),
+                )
+            )
+
+    summary_path = output_dir / f"{stem}_dwell_summary.csv"
+    groups = {
+        "Dwell": [delta_ms(i.start, i.picked_up) for i in lifecycles],
+        "Ritiro->Conferma": [delta_ms(i.picked_up, i.acknowledged) for i in lifecycles],
+        "Totale": [delta_ms(i.start, i.acknowledged) for i in lifecycles],
+        "Rete": [sum(i.network_ms) if i.network_ms else None for i in lifecycles],
+        "Intervallo polling": [value * 1000.0 for value in intervals],
+    }
+    with summary_path.open("w", newline="", encoding="utf-8") as handle:
+        writer = csv.writer(handle)
+        writer.writerow(("Metric", "Value"))
+        writer.writerow(("Messaggi", len(lifecycles)))
+        writer.writerow(
+            ("Non ritirati", sum(1 for item in lifecycles if item.picked_up is None))
+        )
+        writer.writerow(("Coda massima", max((d for _, d in depth), default=0)))
+        for label, raw in groups.items():
+            stats = summarize_values([value for value in raw if value is not None])
+            writer.writerow((f"{label} Conteggio", stats["count"]))
+            for name in ("P50 (ms)", "P90 (ms)", "P95 (ms)", "Max (ms)"):
+                writer.writerow((f"{label} {name}", fmt(stats[name])))
+
+    queue_path = output_dir / f"{stem}_queue.csv"
+    with queue_path.open("w", newline="", encoding="utf-8") as handle:
+        writer = csv.writer(handle)
+        writer.writerow(("Timestamp", "Coda"))
+        for timestamp, value in depth:
+            writer.writerow((f"{timestamp:.6f}", value))
+    return details_path, summary_path, queue_path
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Mediator message-pickup dwell time from the mediator database.",
+    )
+    parser.add_argument(
+        "pcap",
+        nargs="?",
+        type=Path,
+        help="Optional capture used to attach the HTTP latency of each lifecycle step.",
+    )
+    parser.add_argument(
+        "--mediator-db",
+        type=Path,
+        default=Path("mediator.sqlite"),
+        help="Mediator sqlite database path (default: ./mediator.sqlite).",
+    )
+    parser.add_argument(
+        "--mediator-port",
+        type=int,
+        default=3000,
+        help="Mediator HTTP port in the capture (default: 3000).",
+    )
+    parser.add_argument(
+        "--output-dir",
+        type=Path,
+        help="Output folder (default: capture folder, or the database folder).",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=5.0,
+        help="Max seconds between a forward and the stored message it produced (default: 5).",
+    )
+    args = parser.parse_args()
+    if not args.mediator_db.exists():
+        raise FileNotFoundError(f"DATABASE NOT FOUND: {args.mediator_db}")
+    rows, mediator_did = load_mediator_messages(args.mediator_db, mediator_only=False)
+    lifecycles = build_lifecycles(rows, mediator_did, tolerance=args.tolerance)
+    if args.pcap is not None:
+        if not args.pcap.exists():
+            raise FileNotFoundError(f"CAPTURE NOT FOUND: {args.pcap}")
+        check_tshark()
+        requests = collect_requests(args.pcap, args.mediator_port)
+        records = list(run_tshark_fields(args.pcap, args.mediator_port, requests))
+        messages, _ = load_mediator_messages(args.mediator_db)
+        aligned, tolerance, clock = align_mediator_messages(records, messages)
+        annotate_with_mediator(records, aligned, mediator_did, tolerance=tolerance)
+        attach_network_latency(lifecycles, records, clock, tolerance=tolerance)
+    output_dir = args.output_dir or (
+        args.pcap.parent if args.pcap is not None else args.mediator_db.parent
+    )
+    stem = capture_stem(args.pcap) if args.pcap is not None else args.mediator_db.stem
+    depth = queue_depth(lifecycles)
+    details_path, summary_path, queue_path = write_outputs(
+        lifecycles, depth, poll_intervals(rows), output_dir, stem
+    )
+    dwell = sorted(
+        value
+        for value in (delta_ms(item.start, item.picked_up) for item in lifecycles)
+        if value is not None
+    )
+    print(f"[+] {len(lifecycles)} messaggi inoltrati ricostruiti")
+    if dwell:
+        print(
+            f"  Dwell P50 {percentile(dwell, 50):.2f} ms, P95 {percentile(dwell, 95):.2f} ms,"
+            f" max {dwell[-1]:.2f} ms"
+        )
+    print(f"  Dettagli -> {details_path}")
+    print(f"  Riepilogo -> {summary_path}")
+    print(f"  Coda -> {queue_path}")
+
+
+if __name__ == "__main__":
+    main()
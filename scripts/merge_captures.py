@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+'''
+# Merge captures taken on holder, mediator and anvil containers (first one is the clock reference)
+python3 merge_captures.py mediator=../captures/multi/mediator.pcap holder=../captures/multi/holder.pcap \
+    anvil=../captures/multi/anvil.pcap --output ../captures/multi/merged.pcap
+
+'''
+import argparse
+import csv
+import shutil
+import statistics
+import subprocess
+from collections import deque
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Deque, Dict, List, Optional, Tuple
+
+from analyze_latency import (
+    LatencyRecord,
+    check_tshark,
+    collect_requests,
+    linear_regression,
+    percentile,
+    prepare_table,
+    run_tshark,
+    run_tshark_fields,
+)
+from pcap_io import capture_stem, decompressed_stdin
+
+SEGMENT_FIELDS = [
+    "frame.time_epoch",
+    "ip.src",
+    "tcp.srcport",
+    "ip.dst",
+    "tcp.dstport",
+    "tcp.seq_raw",
+    "tcp.ack_raw",
+    "tcp.len",
+    "tcp.flags",
+]
+
+SegmentKey = Tuple[str, str, str, str]
+Direction = Tuple[str, str, str, str]
+
+
+@dataclass
+class Segment:
+    timestamp: float
+    direction: Direction
+    key: SegmentKey
+
+
+@dataclass
+class HostCapture:
+    label: str
+    pcap: Path
+    segments: Dict[SegmentKey, Segment]
+
+
+@dataclass
+class HostClock:
+    label: str
+    reference: str
+    offset: float
+    drift: float
+    midpoint: float
+    one_way_only: bool = False
+
+    def at(self, timestamp: float) -> float:
+        return self.offset + self.drift * (timestamp - self.midpoint)
+
+
+def parse_capture_arg(value: str) -> Tuple[str, Path]:
+    if "=" in value:
+        label, path = value.split("=", 1)
+        return label, Path(path)
+    path = Path(value)
+    return capture_stem(path), path
+
+
+def load_segments(pcap: Path) -> Dict[SegmentKey, Segment]:
+    cmd = [
+        "-Y",
+        "tcp",
+        "-T",
+        "fields",
+        "-E",
+        "separator=\t",
+        "-E",
+        "occurrence=f",
+    ]
+    for field in SEGMENT_FIELDS:
+        cmd.extend(["-e", field])
+    segments: Dict[SegmentKey, Segment] = {}
+    for line in run_tshark(pcap, cmd).splitlines():
+        parts = line.split("\t")
+        if len(parts) != len(SEGMENT_FIELDS):
+            continue
+        try:
+            timestamp = float(parts[0])
+        except ValueError:
+            continue
+        # Sequence/ack numbers survive NAT, addresses and ports may not.
+        key = (parts[5], parts[6], parts[7], parts[8])
+        if not parts[5] or key in segments:
+            continue
+        segments[key] = Segment(
+            timestamp=timestamp,
+            direction=(parts[1], parts[2], parts[3], parts[4]),
+            key=key,
+        )
+    return segments
+
+
+def estimate_pair_clock(
+    reference: HostCapture, other: HostCapture, window: float = 10.0
+) -> Optional[HostClock]:
+    common = [key for key in reference.segments if key in other.segments]
+    if not common:
+        return None
+    groups: Dict[Direction, List[Tuple[float, float]]] = {}
+    for key in common:
+        ref_seg = reference.segments[key]
+        other_seg = other.segments[key]
+        groups.setdefault(ref_seg.direction, []).append(
+            (ref_seg.timestamp, other_seg.timestamp - ref_seg.timestamp)
+        )
+    # tB - tA >= offset for segments sent by A, <= offset for segments sent by B:
+    # the midpoint between both envelopes cancels a symmetric one-way delay.
+    # One estimate per connection and time window lets the fit pick up drift.
+    estimates: List[Tuple[float, float]] = []
+    seen: set = set()
+    for direction, values in groups.items():
+        reverse = (direction[2], direction[3], direction[0], direction[1])
+        if direction in seen or reverse not in groups:
+            continue
+        seen.update({direction, reverse})
+        reverse_values = groups[reverse]
+        if statistics.median(d for _, d in values) < statistics.median(
+            d for _, d in reverse_values
+        ):
+            values, reverse_values = reverse_values, values
+        windows: Dict[int, Tuple[List[Tuple[float, float]], List[Tuple[float, float]]]] = {}
+        for ts, diff in values:
+            windows.setdefault(int(ts // window), ([], []))[0].append((ts, diff))
+        for ts, diff in reverse_values:
+            windows.setdefault(int(ts // window), ([], []))[1].append((ts, diff))
+        for sent, received in windows.values():
+            if not sent or not received:
+                continue
+            lower = min(d for _, d in sent)
+            upper = max(d for _, d in received)
+            midpoint = statistics.median(ts for ts, _ in sent + received)
+            estimates.append((midpoint, (lower + upper) / 2))
+    one_way_only = not estimates
+    if one_way_only:
+        for values in groups.values():
+            midpoint = statistics.median(ts for ts, _ in values)
+            estimates.append((midpoint, min(d for _, d in values)))
+    estimates.sort()
+    midpoint = statistics.median(ts for ts, _ in estimates)
+    fit = linear_regression([ts - midpoint for ts, _ in estimates], [o for _, o in estimates])
+    if fit is None:
+        offset, drift = statistics.median(o for _, o in estimates), 0.0
+    else:
+        drift, offset, _ = fit
+    return HostClock(
+        label=other.label,
+        reference=reference.label,
+        offset=offset,
+        drift=drift,
+        midpoint=midpoint,
+        one_way_only=one_way_only,
+    )
+
+
+def align_hosts(hosts: List[HostCapture]) -> Dict[str, HostClock]:
+    root = hosts[0]
+    clocks: Dict[str, HostClock] = {
+        root.label: HostClock(root.label, root.label, 0.0, 0.0, 0.0)
+    }
+    queue: Deque[HostCapture] = deque([root])
+    while queue:
+        anchor = queue.popleft()
+        anchor_clock = clocks[anchor.label]
+        for host in hosts:
+            if host.label in clocks:
+                continue
+            pair = estimate_pair_clock(anchor, host)
+            if pair is None:
+                continue
+            # Chain through already aligned hosts: host -> anchor -> root.
+            clocks[host.label] = replace(
+                pair,
+                reference=root.label,
+                offset=pair.offset + anchor_clock.at(pair.midpoint),
+                drift=pair.drift + anchor_clock.drift,
+            )
+            queue.append(host)
+    return clocks
+
+
+def hop_latencies(
+    hosts: List[HostCapture], clocks: Dict[str, HostClock]
+) -> Dict[Tuple[str, str], List[float]]:
+    hops: Dict[Tuple[str, str], List[float]] = {}
+    aligned = [host for host in hosts if host.label in clocks]
+    for idx, first in enumerate(aligned):
+        for second in aligned[idx + 1 :]:
+            first_clock = clocks[first.label]
+            second_clock = clocks[second.label]
+            for key, seg in first.segments.items():
+                other = second.segments.get(key)
+                if other is None:
+                    continue
+                t_first = seg.timestamp - first_clock.at(seg.timestamp)
+                t_second = other.timestamp - second_clock.at(other.timestamp)
+                if t_second >= t_first:
+                    hops.setdefault((first.label, second.label), []).append(t_second - t_first)
+                else:
+                    hops.setdefault((second.label, first.label), []).append(t_first - t_second)
+    return hops
+
+
+def merged_records(
+    hosts: List[HostCapture],
+    clocks: Dict[str, HostClock],
+    ports: List[int],
+) -> List[Tuple[str, LatencyRecord]]:
+    merged: List[Tuple[str, LatencyRecord]] = []
+    for host in hosts:
+        clock = clocks.get(host.label)
+        if clock is None:
+            continue
+        for port in ports:
+            requests = collect_requests(host.pcap, port)
+            for rec in run_tshark_fields(host.pcap, port, requests):
+                rec.timestamp -= clock.at(rec.timestamp)
+                merged.append((host.label, rec))
+    merged.sort(key=lambda item: (item[1].timestamp - item[1].latency, item[0]))
+    return merged
+
+
+def write_merged_pcap(
+    hosts: List[HostCapture], clocks: Dict[str, HostClock], output: Path
+) -> Optional[Path]:
+    if shutil.which("editcap") is None or shutil.which("mergecap") is None:
+        print("[Avviso] editcap/mergecap not found: merged PCAP skipped.")
+        return None
+    output.parent.mkdir(parents=True, exist_ok=True)
+    shifted: List[Path] = []
+    try:
+        for host in hosts:
+            clock = clocks.get(host.label)
+            if clock is None:
+                continue
+            target = output.parent / f".{output.stem}_{host.label}.pcapng"
+            # editcap applies a constant shift: use the offset at the capture midpoint.
+            with decompressed_stdin(host.pcap) as (source, stdin):
+                subprocess.run(
+                    ["editcap", "-t", f"{-clock.offset:.9f}", source, str(target)],
+                    stdin=stdin,
+                    check=True,
+                    capture_output=True,
+                )
+            shifted.append(target)
+        subprocess.run(
+            ["mergecap", "-w", str(output)] + [str(path) for path in shifted],
+            check=True,
+            capture_output=True,
+        )
+    finally:
+        for path in shifted:
+            path.unlink(missing_ok=True)
+    return output
+
+
+def write_records_csv(records: List[Tuple[str, LatencyRecord]], output: Path) -> Path:
+    headers, rows = prepare_table([rec for _, rec in records])
+    csv_path = output.parent / f"{output.stem}_records.csv"
+    with csv_path.open("w", newline="", encoding="utf-8") as handle:
+        writer = csv.writer(handle)
+        writer.writerow(("Host",) + headers)
+        for (label, _), row in zip(records, rows):
+            writer.writerow([label] + row)
+    return csv_path
+
+
+def write_hops_csv(
+    hops: Dict[Tuple[str, str], List[float]],
+    clocks: Dict[str, HostClock],
+    output: Path,
+) -> Path:
+    csv_path = output.parent / f"{output.stem}_hops.csv"
+    with csv_path.open("w", newline="", encoding="utf-8") as handle:
+        writer = csv.writer(handle)
+        writer.writerow(("Host", "Riferimento", "Offset (ms)", "Drift (ppm)", "Solo una direzione"))
+        for clock in clocks.values():
+            writer.writerow(
+                (
+                    clock.label,
+                    clock.reference,
+                    f"{clock.offset*1000:.3f}",
+                    f"{clock.drift*1e6:.2f}",
+                    "si" if clock.one_way_only else "no",
+                )
+            )
+        writer.writerow(())
+        writer.writerow(("Hop", "Conteggio", "Min (ms)", "P50 (ms)", "P95 (ms)", "Max (ms)"))
+        for (src, dst), values in sorted(hops.items()):
+            values.sort()
+            writer.writerow(
+                (
+                    f"{src} -> {dst}",
+                    len(values),
+                    f"{values[0]*1000:.3f}",
+                    f"{percentile(values, 50)*1000:.3f}",
+                    f"{percentile(values, 95)*1000:.3f}",
+                    f"{values[-1]*1000:.3f}",
+                )
+            )
+    return csv_path
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Merge captures from several hosts on a common clock.",
+    )
+    parser.add_argument(
+        "captures",
+        nargs="+",
+        help="Captures as LABEL=PATH (or PATH, labelled by file stem). The first is the clock reference.",
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        required=True,
+        help="Merged PCAPNG path; records and hop CSVs are written next to it.",
+    )
+    parser.add_argument(
+        "--ports",
+        default="3000,8545",
+        help="Comma-separated HTTP ports to extract records from (default: 3000,8545).",
+    )
+    args = parser.parse_args()
+    check_tshark()
+    hosts: List[HostCapture] = []
+    for value in args.captures:
+        label, path = parse_capture_arg(value)
+        if not path.exists():
+            raise FileNotFoundError(f"CAPTURE NOT FOUND: {path}")
+        hosts.append(HostCapture(label=label, pcap=path, segments=load_segments(path)))
+    clocks = align_hosts(hosts)
+    for host in hosts:
+        clock = clocks.get(host.label)
+        if clock is None:
+            print(f"[Avviso] {host.label}: no TCP segment in common with other captures, skipped.")
+            continue
+        print(
+            f"[+] {host.label}: offset {clock.offset*1000:+.3f} ms, drift {clock.drift*1e6:.2f} ppm"
+            + (" (una sola direzione, offset include il ritardo)" if clock.one_way_only else "")
+        )
+    ports = [int(port) for port in args.ports.split(",") if port.strip()]
+    records = merged_records(hosts, clocks, ports)
+    records_csv = write_records_csv(records, args.output)
+    hops_csv = write_hops_csv(hop_latencies(hosts, clocks), clocks, args.output)
+    merged = write_merged_pcap(hosts, clocks, args.output)
+    print(f"  Record -> {records_csv}")
+    print(f"  Hop -> {hops_csv}")
+    if merged:
+        print(f"  PCAP -> {merged}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+'''
+# Gas price of every Sepolia slot vs the latency of its runs, with correlations
+python3 network_conditions.py --base-dir ../captures --network sepolia
+
+# Byte-identical hour folders (see capture_catalog.py --duplicates) are dropped unless --keep-duplicates
+
+# Only some days, adding block interval and confirmation time from the decrypted captures
+python3 network_conditions.py --base-dir ../captures --since 2025-11-17 --until 2025-11-21 \
+    --block-timing --rpc-port 443 --tls-keylog keys.log
+
+'''
+import argparse
+import csv
+import json
+import math
+import re
+import statistics
+from collections import defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from analyze_latency import check_tshark, normalize_payload, resolve_tls_keylog_path, run_tshark
+from capture_catalog import find_duplicates, update_catalog
+from pcap_io import capture_stem, is_capture
+from summarize_runs import load_summary
+
+GAS_UNITS = {"wei": 1e-9, "kwei": 1e-6, "mwei": 1e-3, "gwei": 1.0}
+GAS_PATTERN = re.compile(r"([0-9]+(?:[.,][0-9]+)?)\s*(wei|kwei|mwei|gwei)\b", re.IGNORECASE)
+RUN_PATTERN = re.compile(r"^(?P<test>.+?)(?P<hour>\d{1,2})_(?P<day>\d{4}-\d{2}-\d{2})_run(?P<run>\d+)$")
+INDICATORS = ("Gas price (GWei)", "Intervallo blocchi (s)")
+METRICS = (
+    "RPC P50 (ms)",
+    "RPC P95 (ms)",
+    "Mediator P50 (ms)",
+    "Mediator P95 (ms)",
+    "Conferma P50 (s)",
+)
+
+
+@dataclass
+class GasReading:
+    source: Optional[str]
+    gwei: float
+
+
+@dataclass
+class ChainTiming:
+    blocks: int = 0
+    block_interval: Optional[float] = None
+    confirmations: List[float] = field(default_factory=list)
+
+
+@dataclass
+class RunConditions:
+    day: str
+    hour: str
+    run: str
+    test: str
+    gas: Optional[GasReading]
+    values: Dict[str, Optional[float]] = field(default_factory=dict)
+
+
+def parse_gas_file(path: Path) -> Optional[GasReading]:
+    # Free text: usually the source URL, then e.g. "0.0005 GWei".
+    text = path.read_text(encoding="utf-8", errors="ignore")
+    match = GAS_PATTERN.search(text)
+    if match is None:
+        return None
+    value = float(match.group(1).replace(",", "."))
+    source = next((line.strip() for line in text.splitlines() if line.strip().startswith("http")), None)
+    return GasReading(source=source, gwei=value * GAS_UNITS[match.group(2).lower()])
+
+
+def hex_int(value: Any) -> Optional[int]:
+    if isinstance(value, str) and value.startswith("0x"):
+        try:
+            return int(value, 16)
+        except ValueError:
+            return None
+    return None
+
+
+def rpc_messages(payload: str) -> List[Dict[str, Any]]:
+    try:
+        data = json.loads(normalize_payload(payload))
+    except json.JSONDecodeError:
+        return []
+    items = data if isinstance(data, list) else [data]
+    return [item for item in items if isinstance(item, dict)]
+
+
+def collect_chain_timing(pcap: Path, port: int, extra_args: List[str]) -> ChainTiming:
+    # Request and response bodies of one pass, paired through http.request_in and
+    # the JSON-RPC id: block headers give the block interval, a transaction's
+    # confirmation runs from eth_sendRawTransaction to its first non-null receipt.
+    fields = ["frame.number", "frame.time_epoch", "http.request_in", "http.file_data"]
+    cmd = list(extra_args) + ["-Y", f"http && tcp.port == {port}", "-T", "fields", "-E", "separator=\t"]
+    cmd += ["-E", "occurrence=f"]
+    for name in fields:
+        cmd.extend(["-e", name])
+    requests: Dict[str, Tuple[float, Dict[Any, Dict[str, Any]]]] = {}
+    blocks: Dict[int, int] = {}
+    sent: Dict[str, float] = {}
+    timing = ChainTiming()
+    for line in run_tshark(pcap, cmd).splitlines():
+        parts = line.split("\t")
+        if len(parts) != len(fields):
+            continue
+        frame, epoch, request_in, payload = parts
+        try:
+            timestamp = float(epoch)
+        except ValueError:
+            continue
+        messages = rpc_messages(payload)
+        if not request_in:
+            requests[frame] = (timestamp, {msg.get("id"): msg for msg in messages if "method" in msg})
+            continue
+        request_ts, calls = requests.get(request_in.split(",")[0], (timestamp, {}))
+        for reply in messages:
+            call = calls.get(reply.get("id"))
+            result = reply.get("result")
+            if call is None or result is None:
+                continue
+            method = call.get("method")
+            if method in ("eth_getBlockByNumber", "eth_getBlockByHash") and isinstance(result, dict):
+                number, block_ts = hex_int(result.get("number")), hex_int(result.get("timestamp"))
+                if number is not None and block_ts is not None:
+                    blocks[number] = block_ts
+            elif method in ("eth_sendRawTransaction", "eth_sendTransaction") and isinstance(result, str):
+                sent.setdefault(result.lower(), request_ts)
+            elif method == "eth_getTransactionReceipt":
+                params = call.get("params") or [None]
+                tx_hash = str(params[0]).lower()
+                if tx_hash in sent:
+                    timing.confirmations.append(timestamp - sent.pop(tx_hash))
+    timing.blocks = len(blocks)
+    if len(blocks) > 1:
+        first, last = min(blocks), max(blocks)
+        if last > first:
+            timing.block_interval = (blocks[last] - blocks[first]) / (last - first)
+    return timing
+
+
+def find_runs(base_dir: Path, network: str, since: Optional[str], until: Optional[str]) -> List[Path]:
+    # Hour folders <base>/<network>/<day>/<hour> holding run summaries.
+    root = base_dir / network
+    folders = []
+    for day_dir in sorted(root.iterdir()) if root.exists() else []:
+        if not re.fullmatch(r"\d{4}-\d{2}-\d{2}", day_dir.name):
+            continue
+        if (since and day_dir.name < since) or (until and day_dir.name > until):
+            continue
+        folders.extend(sorted(path for path in day_dir.iterdir() if path.is_dir() and path.name.isdigit()))
+    return folders
+
+
+def duplicate_captures(base_dir: Path) -> Dict[str, str]:
+    # Relative capture path -> the copy that is kept (first path of its hash group).
+    update_catalog(base_dir)
+    duplicates: Dict[str, str] = {}
+    for group in find_duplicates(base_dir):
+        for path in group[1:]:
+            duplicates[path] = group[0]
+    return duplicates
+
+
+def summary_metric(path: Path, metric: str) -> Optional[float]:
+    if not path.exists():
+        return None
+    return load_summary(path)[0].get(metric)
+
+
+def load_hour(
+    folder: Path, args: argparse.Namespace, extra_args: List[str], duplicates: Dict[str, str]
+) -> Tuple[List[RunConditions], List[str]]:
+    day, hour = folder.parent.name, folder.name
+    gas_files = sorted(folder.glob("gasPrice*"))
+    gas = parse_gas_file(gas_files[0]) if gas_files else None
+    captures = {capture_stem(path): path for path in folder.iterdir() if is_capture(path)}
+    runs: List[RunConditions] = []
+    skipped: List[str] = []
+    for summary in sorted(folder.glob("*_run*_rpc_summary.csv")):
+        stem = summary.name[: -len("_rpc_summary.csv")]
+        match = RUN_PATTERN.match(stem)
+        if match is None:
+            continue
+        if args.test_name and match.group("test") != args.test_name:
+            continue
+        pcap = captures.get(stem)
+        relative = str(pcap.relative_to(args.base_dir)) if pcap is not None else None
+        if relative in duplicates:
+            skipped.append(f"{relative} = {duplicates[relative]}")
+            continue
+        conditions = RunConditions(day, hour, match.group("run"), match.group("test"), gas)
+        mediator = folder / f"{stem}_mediator_summary.csv"
+        conditions.values = {
+            "Gas price (GWei)": gas.gwei if gas else None,
+            "RPC P50 (ms)": summary_metric(summary, "P50 (ms)"),
+            "RPC P95 (ms)": summary_metric(summary, "P95 (ms)"),
+            "Mediator P50 (ms)": summary_metric(mediator, "P50 (ms)"),
+            "Mediator P95 (ms)": summary_metric(mediator, "P95 (ms)"),
+            "Intervallo blocchi (s)": None,
+            "Conferma P50 (s)": None,
+        }
+        if args.block_timing:
+            if pcap is not None:
+                timing = collect_chain_timing(pcap, args.rpc_port, extra_args)
+                conditions.values["Intervallo blocchi (s)"] = timing.block_interval
+                if timing.confirmations:
+                    conditions.values["Conferma P50 (s)"] = statistics.median(timing.confirmations)
+        runs.append(conditions)
+    return runs, skipped
+
+
+def normalize_by_day(runs: List[RunConditions], metric: str) -> None:
+    # Run metric over the median of its day: removes day-to-day drift so slots compare.
+    by_day: Dict[str, List[float]] = defaultdict(list)
+    for run in runs:
+        value = run.values.get(metric)
+        if value is not None:
+            by_day[run.day].append(value)
+    for run in runs:
+        value = run.values.get(metric)
+        day_values = by_day.get(run.day)
+        run.values[f"{metric} / mediana giorno"] = (
+            value / statistics.median(day_values) if value is not None and day_values else None
+        )
+
+
+def ranks(values: List[float]) -> List[float]:
+    order = sorted(range(len(values)), key=values.__getitem__)
+    result = [0.0] * len(values)
+    start = 0
+    while start < len(order):
+        end = start
+        while end + 1 < len(order) and values[order[end + 1]] == values[order[start]]:
+            end += 1
+        for pos in range(start, end + 1):
+            result[order[pos]] = (start + end) / 2 + 1
+        start = end + 1
+    return result
+
+
+def correlation(xs: List[float], ys: List[float]) -> Optional[float]:
+    if len(xs) < 3 or len(set(xs)) < 2 or len(set(ys)) < 2:
+        return None
+    return statistics.correlation(xs, ys)
+
+
+def slot_aggregates(runs: List[RunConditions]) -> List[RunConditions]:
+    # One row per (day, hour): the gas price is read once per slot, so its runs are
+    # not independent samples. Run values collapse to their median.
+    by_slot: Dict[Tuple[str, str], List[RunConditions]] = defaultdict(list)
+    for run in runs:
+        by_slot[(run.day, run.hour)].append(run)
+    slots = []
+    for (day, hour), items in sorted(by_slot.items()):
+        values: Dict[str, Optional[float]] = {}
+        for name in items[0].values:
+            present = [item.values[name] for item in items if item.values.get(name) is not None]
+            values[name] = statistics.median(present) if present else None
+        run_ids = ",".join(item.run for item in items)
+        slots.append(RunConditions(day, hour, run_ids, items[0].test, items[0].gas, values))
+    return slots
+
+
+def correlations(slots: List[RunConditions]) -> List[Tuple[str, str, int, Optional[float], Optional[float]]]:
+    rows = []
+    for indicator in INDICATORS:
+        for metric in METRICS + tuple(f"{name} / mediana giorno" for name in METRICS[:2]):
+            pairs = [
+                (slot.values[indicator], slot.values[metric])
+                for slot in slots
+                if slot.values.get(indicator) is not None and slot.values.get(metric) is not None
+            ]
+            xs = [x for x, _ in pairs]
+            ys = [y for _, y in pairs]
+            pearson = correlation(xs, ys)
+            spearman = correlation(ranks(xs), ranks(ys)) if pairs else None
+            rows.append((indicator, metric, len(pairs), pearson, spearman))
+    return rows
+
+
+def slot_table(runs: List[RunConditions]) -> List[Tuple[str, int, Dict[str, Optional[float]]]]:
+    by_hour: Dict[str, List[RunConditions]] = defaultdict(list)
+    for run in runs:
+        by_hour[run.hour].append(run)
+    table = []
+    for hour in sorted(by_hour, key=int):
+        medians: Dict[str, Optional[float]] = {}
+        for name in INDICATORS + METRICS:
+            values = [run.values[name] for run in by_hour[hour] if run.values.get(name) is not None]
+            medians[name] = statistics.median(values) if values else None
+        table.append((hour, len(by_hour[hour]), medians))
+    return table
+
+
+def fmt(value: Optional[float], digits: int = 2) -> str:
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return "-"
+    return f"{value:.{digits}f}"
+
+
+def write_csv(path: Path, header: Iterable[str], rows: Iterable[Iterable[Any]]) -> Path:
+    with path.open("w", newline="", encoding="utf-8") as handle:
+        writer = csv.writer(handle)
+        writer.writerow(list(header))
+        writer.writerows(rows)
+    return path
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Pair Sepolia gas price and block timing with run latency and report correlations.",
+    )
+    parser.add_argument("--base-dir", type=Path, default=Path("captures"), help="Base captures directory (default: ./captures).")
+    parser.add_argument("--network", default="sepolia", help="Network subfolder under --base-dir (default: sepolia).")
+    parser.add_argument("--since", help="First day (YYYY-MM-DD) to include.")
+    parser.add_argument("--until", help="Last day (YYYY-MM-DD) to include.")
+    parser.add_argument("--test-name", help="Only runs of this test (e.g. testSdr).")
+    parser.add_argument(
+        "--block-timing",
+        action="store_true",
+        help="Read block interval and confirmation time from the captured RPC responses (tshark;"
+        " HTTPS captures need --tls-keylog).",
+    )
+    parser.add_argument("--rpc-port", type=int, default=443, help="RPC port in the captures (default: 443).")
+    parser.add_argument(
+        "--tls-keylog",
+        type=Path,
+        help="Path to an SSLKEYLOGFILE used to decrypt HTTPS captures (defaults to $SSLKEYLOGFILE).",
+    )
+    parser.add_argument(
+        "--keep-duplicates",
+        action="store_true",
+        help="Keep runs whose capture is a byte-identical copy of another (found through"
+        " <base-dir>/catalog.sqlite).",
+    )
+    parser.add_argument("--output-dir", type=Path, help="Output folder (default: <base-dir>/<network>).")
+    args = parser.parse_args()
+
+    extra_args: List[str] = []
+    if args.block_timing:
+        check_tshark()
+        tls_keylog_path = resolve_tls_keylog_path(args.tls_keylog)
+        if tls_keylog_path:
+            extra_args = ["-o", f"tls.keylog_file:{tls_keylog_path}"]
+        elif args.rpc_port == 443:
+            print("[Avviso] Nessun SSLKEYLOGFILE: le risposte HTTPS restano cifrate, niente tempi di blocco.")
+    duplicates = {} if args.keep_duplicates else duplicate_captures(args.base_dir)
+    runs: List[RunConditions] = []
+    skipped: List[str] = []
+    for folder in find_runs(args.base_dir, args.network, args.since, args.until):
+        hour_runs, hour_skipped = load_hour(folder, args, extra_args, duplicates)
+        runs.extend(hour_runs)
+        skipped.extend(hour_skipped)
+    if not runs:
+        raise FileNotFoundError(f"No run summaries under {args.base_dir / args.network}")
+    for metric in METRICS[:2]:
+        normalize_by_day(runs, metric)
+
+    output_dir = args.output_dir or args.base_dir / args.network
+    output_dir.mkdir(parents=True, exist_ok=True)
+    columns = list(INDICATORS) + list(METRICS) + [f"{name} / mediana giorno" for name in METRICS[:2]]
+    runs_csv = write_csv(
+        output_dir / "network_conditions.csv",
+        ["Giorno", "Ora", "Test", "Run", "Fonte gas"] + columns,
+        (
+            [run.day, run.hour, run.test, run.run, run.gas.source if run.gas and run.gas.source else "-"]
+            + [fmt(run.values.get(name), 4) for name in columns]
+            for run in runs
+        ),
+    )
+    slot_rows = slot_aggregates(runs)
+    corr_rows = correlations(slot_rows)
+    corr_csv = write_csv(
+        output_dir / "network_correlations.csv",
+        ["Indicatore", "Metrica", "N fasce", "Pearson", "Spearman"],
+        ([indicator, metric, n, fmt(pearson, 3), fmt(spearman, 3)] for indicator, metric, n, pearson, spearman in corr_rows),
+    )
+    slots = slot_table(runs)
+    slots_csv = write_csv(
+        output_dir / "network_slots.csv",
+        ["Ora", "Run"] + [f"{name} mediana" for name in INDICATORS + METRICS],
+        ([hour, count] + [fmt(medians[name], 4) for name in INDICATORS + METRICS] for hour, count, medians in slots),
+    )
+
+    print(f"[+] {len(runs)} run in {len(slot_rows)} fasce orarie (giorno, ora)")
+    if skipped:
+        print(f"  {len(skipped)} run scartati, catture identiche a un'altra:")
+        for item in skipped:
+            print(f"    {item}")
+    for hour, count, medians in slots:
+        print(
+            f"  {hour}h ({count} run): gas {fmt(medians['Gas price (GWei)'], 4)} GWei,"
+            f" RPC P50 {fmt(medians['RPC P50 (ms)'])} ms, P95 {fmt(medians['RPC P95 (ms)'])} ms,"
+            f" mediator P50 {fmt(medians['Mediator P50 (ms)'])} ms"
+        )
+    print("  Correlazioni per fascia (Pearson / Spearman, n = fasce indipendenti):")
+    for indicator, metric, n, pearson, spearman in corr_rows:
+        if n:
+            print(f"    {indicator} ~ {metric}: {fmt(pearson, 3)} / {fmt(spearman, 3)} (n={n})")
+    print(f"  Run -> {runs_csv}")
+    print(f"  Correlazioni -> {corr_csv}")
+    print(f"  Fasce -> {slots_csv}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+'''
+Minimal pure-Python PCAP/PCAPNG reader, enough to index and split captures
+without spawning tshark.
+'''
+import gzip
+import shutil
+import struct
+import subprocess
+import zlib
+from array import array
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+LINKTYPE_LINUX_SLL2 = 276
+
+PCAP_MAGICS = {
+    b"\xd4\xc3\xb2\xa1": ("<", 1e-6),
+    b"\xa1\xb2\xc3\xd4": (">", 1e-6),
+    b"\x4d\x3c\xb2\xa1": ("<", 1e-9),
+    b"\xa1\xb2\x3c\x4d": (">", 1e-9),
+}
+PCAPNG_MAGIC = b"\x0a\x0d\x0d\x0a"
+CAPTURE_SUFFIXES = (
+    ".pcap",
+    ".pcapng",
+    ".pcap.gz",
+    ".pcapng.gz",
+    ".pcap.zst",
+    ".pcapng.zst",
+)
+
+
+@dataclass
+class Packet:
+    timestamp: float
+    linktype: int
+    data: bytes
+    orig_len: int
+
+
+@dataclass
+class TcpInfo:
+    src_ip: str
+    dst_ip: str
+    src_port: int
+    dst_port: int
+    payload_offset: int
+    payload_len: int
+
+
+def is_capture(path: Path) -> bool:
+    return path.name.endswith(CAPTURE_SUFFIXES)
+
+
+def capture_stem(path: Path) -> str:
+    name = path.name
+    for suffix in sorted(CAPTURE_SUFFIXES, key=len, reverse=True):
+        if name.endswith(suffix):
+            return name[: -len(suffix)]
+    return path.stem
+
+
+def compression_of(path: Path) -> Optional[str]:
+    if path.name.endswith(".gz"):
+        return "gzip"
+    if path.name.endswith(".zst"):
+        return "zstd"
+    return None
+
+
+@contextmanager
+def open_capture(path: Path) -> Iterator[BinaryIO]:
+    compression = compression_of(path)
+    if compression == "gzip":
+        with gzip.open(path, "rb") as handle:
+            yield handle
+        return
+    if compression == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            zstandard = None
+        if zstandard is not None:
+            with path.open("rb") as raw, zstandard.ZstdDecompressor().stream_reader(raw) as handle:
+                yield handle
+            return
+        if shutil.which("zstd") is None:
+            raise RuntimeError("zstd not found: install it or the `zstandard` Python package.")
+        process = subprocess.Popen(["zstd", "-dc", str(path)], stdout=subprocess.PIPE)
+        try:
+            yield process.stdout
+        finally:
+            process.stdout.close()
+            process.wait()
+        return
+    with path.open("rb") as handle:
+        yield handle
+
+
+@contextmanager
+def decompressed_stdin(path: Path) -> Iterator[Tuple[str, Optional[BinaryIO]]]:
+    # Gives (tshark -r argument, stdin). tshark reads gzip itself; zstd archives
+    # are streamed through `zstd -dc`, never written back to disk at full size.
+    if compression_of(path) != "zstd":
+        yield str(path), None
+        return
+    if shutil.which("zstd") is None:
+        raise RuntimeError("zstd not found in PATH: needed to stream .zst captures into tshark.")
+    process = subprocess.Popen(["zstd", "-dc", str(path)], stdout=subprocess.PIPE)
+    try:
+        yield "-", process.stdout
+    finally:
+        process.stdout.close()
+        process.wait()
+
+
+def iter_packets(path: Path) -> Iterator[Packet]:
+    with open_capture(path) as handle:
+        yield from iter_stream(handle)
+
+
+def iter_stream(handle: BinaryIO) -> Iterator[Packet]:
+    magic = handle.read(4)
+    if magic == PCAPNG_MAGIC:
+        yield from _iter_pcapng(handle, magic)
+        return
+    if magic not in PCAP_MAGICS:
+        raise ValueError("Not a PCAP/PCAPNG capture")
+    endian, resolution = PCAP_MAGICS[magic]
+    header = handle.read(20)
+    if len(header) < 20:
+        return
+    linktype = struct.unpack(endian + "HHiIII", header)[5] & 0x0FFFFFFF
+    record = struct.Struct(endian + "IIII")
+    while True:
+        raw = handle.read(16)
+        if len(raw) < 16:
+            return
+        ts_sec, ts_frac, caplen, orig_len = record.unpack(raw)
+        data = handle.read(caplen)
+        if len(data) < caplen:
+            return
+        yield Packet(ts_sec + ts_frac * resolution, linktype, data, orig_len)
+
+
+def _iter_pcapng(handle: BinaryIO, first: bytes) -> Iterator[Packet]:
+    endian = "<"
+    interfaces: list = []
+    block_type_raw = first
+    while True:
+        if not block_type_raw:
+            block_type_raw = handle.read(4)
+        if len(block_type_raw) < 4:
+            return
+        length_raw = handle.read(4)
+        if len(length_raw) < 4:
+            return
+        if block_type_raw == PCAPNG_MAGIC:
+            bom = handle.read(4)
+            endian = "<" if bom == b"\x4d\x3c\x2b\x1a" else ">"
+            total = struct.unpack(endian + "I", length_raw)[0]
+            handle.read(total - 12)
+            interfaces = []
+            block_type_raw = b""
+            continue
+        block_type = struct.unpack(endian + "I", block_type_raw)[0]
+        total = struct.unpack(endian + "I", length_raw)[0]
+        body = handle.read(total - 8)
+        block_type_raw = b""
+        if len(body) < total - 8:
+            return
+        body = body[:-4]
+        if block_type == 1:
+            linktype = struct.unpack(endian + "H", body[:2])[0]
+            interfaces.append((linktype, _if_resolution(body[8:], endian)))
+        elif block_type == 6:
+            if_id, ts_high, ts_low, caplen, orig_len = struct.unpack(endian + "IIIII", body[:20])
+            linktype, resolution = interfaces[if_id] if if_id < len(interfaces) else (LINKTYPE_ETHERNET, 1e-6)
+            ts = ((ts_high << 32) | ts_low) * resolution
+            yield Packet(ts, linktype, body[20 : 20 + caplen], orig_len)
+        elif block_type == 3:
+            orig_len = struct.unpack(endian + "I", body[:4])[0]
+            linktype, _ = interfaces[0] if interfaces else (LINKTYPE_ETHERNET, 1e-6)
+            yield Packet(0.0, linktype, body[4 : 4 + orig_len], orig_len)
+
+
+def _if_resolution(options: bytes, endian: str) -> float:
+    offset = 0
+    while offset + 4 <= len(options):
+        code, length = struct.unpack(endian + "HH", options[offset : offset + 4])
+        if code == 0:
+            break
+        if code == 9 and length >= 1:
+            value = options[offset + 4]
+            return 2.0 ** -(value & 0x7F) if value & 0x80 else 10.0 ** -value
+        offset += 4 + length + (-length % 4)
+    return 1e-6
+
+
+def network_offset(linktype: int, data: bytes) -> Optional[Tuple[int, int]]:
+    if linktype == LINKTYPE_ETHERNET:
+        if len(data) < 14:
+            return None
+        offset, ethertype = 14, struct.unpack("!H", data[12:14])[0]
+        while ethertype in (0x8100, 0x88A8) and len(data) >= offset + 4:
+            ethertype = struct.unpack("!H", data[offset + 2 : offset + 4])[0]
+            offset += 4
+        return offset, ethertype
+    if linktype == LINKTYPE_LINUX_SLL:
+        return (16, struct.unpack("!H", data[14:16])[0]) if len(data) >= 16 else None
+    if linktype == LINKTYPE_LINUX_SLL2:
+        return (20, struct.unpack("!H", data[0:2])[0]) if len(data) >= 20 else None
+    if linktype == LINKTYPE_NULL:
+        if len(data) < 4:
+            return None
+        family = struct.unpack("<I", data[:4])[0]
+        if family > 0xFFFF:
+            family = struct.unpack(">I", data[:4])[0]
+        return 4, 0x0800 if family == 2 else 0x86DD
+    if linktype in (LINKTYPE_RAW, LINKTYPE_IPV4, LINKTYPE_IPV6):
+        if not data:
+            return None
+        return 0, 0x0800 if data[0] >> 4 == 4 else 0x86DD
+    return None
+
+
+def parse_tcp(packet: Packet) -> Optional[TcpInfo]:
+    located = network_offset(packet.linktype, packet.data)
+    if located is None:
+        return None
+    offset, ethertype = located
+    data = packet.data
+    if ethertype == 0x0800:
+        if len(data) < offset + 20 or data[offset + 9] != 6:
+            return None
+        ihl = (data[offset] & 0x0F) * 4
+        total_len = struct.unpack("!H", data[offset + 2 : offset + 4])[0]
+        src_ip = ".".join(str(b) for b in data[offset + 12 : offset + 16])
+        dst_ip = ".".join(str(b) for b in data[offset + 16 : offset + 20])
+        tcp_offset = offset + ihl
+        ip_payload = total_len - ihl
+    elif ethertype == 0x86DD:
+        if len(data) < offset + 40 or data[offset + 6] != 6:
+            return None
+        ip_payload = struct.unpack("!H", data[offset + 4 : offset + 6])[0]
+        src_ip = _ipv6(data[offset + 8 : offset + 24])
+        dst_ip = _ipv6(data[offset + 24 : offset + 40])
+        tcp_offset = offset + 40
+    else:
+        return None
+    if len(data) < tcp_offset + 20:
+        return None
+    src_port, dst_port = struct.unpack("!HH", data[tcp_offset : tcp_offset + 4])
+    header_len = (data[tcp_offset + 12] >> 4) * 4
+    return TcpInfo(
+        src_ip=src_ip,
+        dst_ip=dst_ip,
+        src_port=src_port,
+        dst_port=dst_port,
+        payload_offset=tcp_offset + header_len,
+        payload_len=max(0, ip_payload - header_len),
+    )
+
+
+def _ipv6(raw: bytes) -> str:
+    groups = struct.unpack("!8H", raw)
+    return ":".join(f"{group:x}" for group in groups)
+
+
+class PcapngWriter:
+    def __init__(self, handle: BinaryIO, application: str = "3did archive_captures") -> None:
+        self.handle = handle
+        self.interfaces: Dict[int, int] = {}
+        options = self._option(4, application.encode("utf-8")) + self._option(0, b"")
+        body = struct.pack("<IHHq", 0x1A2B3C4D, 1, 0, -1) + options
+        self._block(0x0A0D0D0A, body)
+
+    @staticmethod
+    def _option(code: int, value: bytes) -> bytes:
+        return struct.pack("<HH", code, len(value)) + value + b"\x00" * (-len(value) % 4)
+
+    def _block(self, block_type: int, body: bytes) -> None:
+        total = 12 + len(body)
+        self.handle.write(struct.pack("<II", block_type, total) + body + struct.pack("<I", total))
+
+    def _interface(self, linktype: int) -> int:
+        if linktype not in self.interfaces:
+            self._block(1, struct.pack("<HHI", linktype, 0, 0))
+            self.interfaces[linktype] = len(self.interfaces)
+        return self.interfaces[linktype]
+
+    def write(self, packet: Packet) -> None:
+        if_id = self._interface(packet.linktype)
+        ts = int(round(packet.timestamp * 1e6))
+        data = packet.data + b"\x00" * (-len(packet.data) % 4)
+        body = struct.pack(
+            "<IIIII", if_id, ts >> 32, ts & 0xFFFFFFFF, len(packet.data), packet.orig_len
+        )
+        self._block(6, body + data)
+
+
+def connection_shard(tcp: TcpInfo, shards: int) -> int:
+    # Both directions of a connection hash alike; crc32 is stable across processes.
+    ends = sorted(((tcp.src_ip, tcp.src_port), (tcp.dst_ip, tcp.dst_port)))
+    return zlib.crc32(repr(ends).encode("ascii")) % shards
+
+
+def split_by_connection(
+    path: Path, shards: int, directory: Path
+) -> List[Tuple[Path, array]]:
+    # Writes one pcapng per shard, each holding whole TCP connections in capture
+    # order. The array maps shard frame n (1-based) to the original frame number.
+    # Non-TCP packets are dropped.
+    stem = capture_stem(path)
+    outputs: List[Tuple[Path, array]] = [
+        (directory / f"{stem}_shard{index}.pcapng", array("q")) for index in range(shards)
+    ]
+    handles = [shard_path.open("wb") for shard_path, _ in outputs]
+    try:
+        writers = [PcapngWriter(handle, application="3did analyze_latency shard") for handle in handles]
+        for frame, packet in enumerate(iter_packets(path), start=1):
+            tcp = parse_tcp(packet)
+            if tcp is None:
+                continue
+            index = connection_shard(tcp, shards)
+            writers[index].write(packet)
+            outputs[index][1].append(frame)
+    finally:
+        for handle in handles:
+            handle.close()
+    return outputs
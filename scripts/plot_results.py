@@ -4,22 +4,42 @@ from __future__ import annotations
 import argparse
 import os
 from pathlib import Path
-from typing import Iterable, List, Sequence
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Sequence, Tuple
 
-MPL_DIR = Path("/tmp/mplconfig")
-MPL_DIR.mkdir(parents=True, exist_ok=True)
-os.environ.setdefault("MPLCONFIGDIR", str(MPL_DIR))
+from cli_args import add_json_arg, add_selection_args, run_command
 
-import matplotlib
-import pandas as pd
+if TYPE_CHECKING:
+    import matplotlib
+    import matplotlib.pyplot as plt
+    import numpy as np
+    import pandas as pd
+    from matplotlib import cbook
+    from matplotlib.ticker import FixedLocator, FuncFormatter, LogLocator, NullFormatter
 
-matplotlib.use("Agg")
-import matplotlib.pyplot as plt  # noqa: E402
+MPL_DIR = Path("/tmp/mplconfig")
 
 
 DEFAULT_STYLE = "seaborn-v0_8-colorblind"
 LOCAL_METRICS = ["Min", "P50", "Max", "Media"]
 SEPOLIA_METRICS = ["Min", "P50", "Max", "Media"]
+GROUP_DIMENSIONS = ("network", "day", "hour", "delay", "test", "run", "file")
+DETAIL_KINDS = ("rpc", "mediator", "anvil")
+
+
+def load_plotting() -> None:
+    # matplotlib, numpy and pandas take most of a second to import: only the
+    # plotting paths pay for them, --help and the sdr.py parser do not.
+    global matplotlib, np, pd, plt, cbook, FixedLocator, FuncFormatter, LogLocator, NullFormatter
+    MPL_DIR.mkdir(parents=True, exist_ok=True)
+    os.environ.setdefault("MPLCONFIGDIR", str(MPL_DIR))
+    import matplotlib
+    import numpy as np
+    import pandas as pd
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from matplotlib import cbook
+    from matplotlib.ticker import FixedLocator, FuncFormatter, LogLocator, NullFormatter
 
 
 def clean_columns(columns: Iterable[str]) -> List[str]:
@@ -78,10 +98,247 @@ def plot_sepolia(df: pd.DataFrame, metrics: Sequence[str], output: Path, title:
     print(f"[ok] Grafico salvato in {output}")
 
 
-def parse_args() -> argparse.Namespace:
-    parser = argparse.ArgumentParser(
-        description="Genera i grafici per i 4 file Excel risultati-*.xlsx."
-    )
+def load_timeseries(path: Path) -> pd.DataFrame:
+    df = pd.read_csv(path)
+    for column in df.columns:
+        df[column] = pd.to_numeric(df[column], errors="coerce")
+    return df
+
+
+def plot_timeline(df: pd.DataFrame, output: Path, title: str, warmup: float | None = None) -> None:
+    fig, (ax_latency, ax_load, ax_ops) = plt.subplots(3, 1, figsize=(12, 9), sharex=True)
+    x = df["t (s)"]
+    ax_latency.plot(x, df["P50 mobile (ms)"], linewidth=2, label="P50 mobile")
+    ax_latency.plot(x, df["P95 mobile (ms)"], linewidth=2, label="P95 mobile")
+    ax_latency.set_ylabel("Latenza (ms)")
+    ax_latency.set_title(title)
+
+    step = x.diff().median()
+    ax_load.bar(x, df["Req/s"], width=(step if pd.notna(step) else 1.0) * 0.9, alpha=0.4, label="Req/s")
+    ax_load.set_ylabel("Richieste/s")
+    ax_flight = ax_load.twinx()
+    ax_flight.plot(x, df["In volo medio"], color="black", linewidth=1.5, label="In volo (medio)")
+    ax_flight.plot(x, df["Little L"], color="black", linestyle=":", linewidth=1.2, label="Little L = λW")
+    ax_flight.set_ylabel("Richieste in volo")
+    handles, labels = ax_load.get_legend_handles_labels()
+    flight_handles, flight_labels = ax_flight.get_legend_handles_labels()
+    ax_load.legend(handles + flight_handles, labels + flight_labels, loc="upper left", bbox_to_anchor=(1.06, 1.0))
+
+    op_columns = [column for column in df.columns if column.startswith("Op/s: ")]
+    if op_columns:
+        ax_ops.stackplot(
+            x,
+            [df[column].fillna(0) for column in op_columns],
+            labels=[column[len("Op/s: ") :] for column in op_columns],
+            alpha=0.8,
+        )
+        ax_ops.legend(loc="upper left", bbox_to_anchor=(1.0, 1.0), fontsize="small")
+    ax_ops.set_ylabel("Operazioni/s")
+    ax_ops.set_xlabel("Tempo dall'inizio del run (s)")
+
+    for ax in (ax_latency, ax_load, ax_ops):
+        ax.grid(True, axis="y", linestyle="--", alpha=0.35)
+        if warmup:
+            ax.axvspan(x.min(), warmup, color="grey", alpha=0.15)
+    ax_latency.legend(loc="upper left", bbox_to_anchor=(1.0, 1.0))
+    if warmup:
+        steady = df[x >= warmup]
+        startup = df[x < warmup]
+        ax_latency.text(
+            0.99,
+            0.95,
+            f"P50 avvio {startup['P50 mobile (ms)'].median():.1f} ms"
+            f" / regime {steady['P50 mobile (ms)'].median():.1f} ms",
+            transform=ax_latency.transAxes,
+            ha="right",
+            va="top",
+        )
+    fig.tight_layout()
+    output.parent.mkdir(parents=True, exist_ok=True)
+    fig.savefig(output, dpi=150)
+    plt.close(fig)
+    print(f"[ok] Grafico salvato in {output}")
+
+
+def thin_quantiles(
+    values: np.ndarray, max_points: int, tail: Optional[float] = 0.99
+) -> Tuple[np.ndarray, np.ndarray]:
+    # Sorted values and their ECDF level. Above max_points, keep evenly spaced
+    # ranks (so every quantile stays in place) plus the whole upper tail, up to
+    # half the budget; tail=None keeps only the even ranks.
+    data = np.sort(values[np.isfinite(values)])
+    n = len(data)
+    levels = np.arange(1, n + 1) / n
+    if n <= max_points:
+        return data, levels
+    tail_start = n if tail is None else max(int(n * tail), n - max_points // 2)
+    body = np.linspace(0, tail_start - 1, max_points - (n - tail_start)).round().astype(int)
+    keep = np.unique(np.concatenate([body, np.arange(tail_start, n)]))
+    return data[keep], levels[keep]
+
+
+def readable_log_ticks(axis: matplotlib.axis.Axis) -> None:
+    # 1-2-5 ticks with plain numbers instead of powers of ten.
+    axis.set_major_locator(LogLocator(subs=(1.0, 2.0, 5.0)))
+    axis.set_major_formatter(FuncFormatter(lambda value, _: f"{value:g}"))
+    axis.set_minor_formatter(NullFormatter())
+
+
+def condition_label(path: Path, base_dir: Path, group_by: Sequence[str]) -> str:
+    from capture_catalog import parse_dimensions
+
+    try:
+        relative = path.resolve().relative_to(base_dir.resolve())
+    except ValueError:
+        relative = path
+    dims = parse_dimensions(relative)
+    parts: List[str] = []
+    for dim in group_by:
+        if dim == "file":
+            parts.append(path.stem)
+        elif dim == "delay" and dims["delay_ms"] is not None:
+            parts.append(f"{dims['delay_ms']}ms")
+        elif dim == "hour" and dims["hour"] is not None:
+            parts.append(f"{dims['hour']}h")
+        elif dim == "run" and dims["run"] is not None:
+            parts.append(f"run{dims['run']}")
+        elif dims.get(dim) is not None:
+            parts.append(str(dims[dim]))
+    return " ".join(parts) or path.stem
+
+
+def load_latencies(
+    paths: Sequence[Path], base_dir: Path, group_by: Sequence[str]
+) -> Dict[str, Dict[str, np.ndarray]]:
+    # {kind (rpc, mediator, ...): {condition: latencies in ms}}; runs of the same
+    # condition are pooled.
+    chunks: Dict[str, Dict[str, List[np.ndarray]]] = {}
+    for path in paths:
+        kind = path.stem.rsplit("_", 1)[-1]
+        if kind in ("summary", "timeseries", "avg"):
+            print(f"[avviso] {path} non e' un CSV --details, ignorato.")
+            continue
+        column = pd.read_csv(path, usecols=["Latency (ms)"])["Latency (ms)"]
+        values = pd.to_numeric(column, errors="coerce").to_numpy(dtype=float)
+        label = condition_label(path, base_dir, group_by)
+        chunks.setdefault(kind, {}).setdefault(label, []).append(values[np.isfinite(values) & (values > 0)])
+    return {
+        kind: {label: np.concatenate(parts) for label, parts in sorted(groups.items())}
+        for kind, groups in chunks.items()
+    }
+
+
+def plot_ecdf(groups: Dict[str, np.ndarray], output: Path, title: str, max_points: int) -> None:
+    fig, ax = plt.subplots(figsize=(9, 5.5))
+    for label, values in groups.items():
+        data, levels = thin_quantiles(values, max_points)
+        ax.step(data, levels, where="post", linewidth=1.6, label=f"{label} (n={len(values)})")
+    ax.set_xscale("log")
+    readable_log_ticks(ax.xaxis)
+    ax.set_xlabel("Latenza (ms)")
+    ax.set_ylabel("Frazione di richieste")
+    ax.set_title(title)
+    for level in (0.5, 0.95, 0.99):
+        ax.axhline(level, color="grey", linestyle=":", linewidth=0.8)
+    ax.grid(True, which="both", linestyle="--", alpha=0.35)
+    ax.legend(loc="lower right", fontsize="small")
+    save_figure(fig, output)
+
+
+def plot_log_histogram(groups: Dict[str, np.ndarray], output: Path, title: str, bins: int) -> None:
+    # Binned on the full data: np.histogram is cheap, only drawing is costly.
+    fig, ax = plt.subplots(figsize=(9, 5.5))
+    lowest = min(values.min() for values in groups.values() if len(values))
+    highest = max(values.max() for values in groups.values() if len(values))
+    edges = np.logspace(np.log10(lowest), np.log10(highest), bins + 1)
+    for label, values in groups.items():
+        counts, _ = np.histogram(values, bins=edges)
+        ax.stairs(counts / max(len(values), 1), edges, linewidth=1.6, label=label)
+    ax.set_xscale("log")
+    ax.set_yscale("log")
+    readable_log_ticks(ax.xaxis)
+    ax.set_xlabel("Latenza (ms)")
+    ax.set_ylabel("Frazione di richieste per bin")
+    ax.set_title(title)
+    ax.grid(True, which="both", linestyle="--", alpha=0.35)
+    ax.legend(loc="upper right", fontsize="small")
+    save_figure(fig, output)
+
+
+def plot_box_violin(groups: Dict[str, np.ndarray], output: Path, title: str, max_points: int) -> None:
+    # Violins from the thinned sample, boxes from the exact quantiles of the full
+    # data; both in log10 space so the tails get room. Fliers are thinned too.
+    labels = list(groups)
+    logs = [np.log10(groups[label]) for label in labels]
+    fig, ax = plt.subplots(figsize=(max(6, 1.4 * len(labels) + 2), 5.5))
+    positions = list(range(1, len(labels) + 1))
+    if all(np.ptp(values) > 0 for values in logs):
+        ax.violinplot(
+            [thin_quantiles(values, max_points, tail=None)[0] for values in logs],
+            positions=positions,
+            showextrema=False,
+            widths=0.8,
+        )
+    stats = []
+    for values in logs:
+        entry = cbook.boxplot_stats(values)[0]
+        entry["fliers"] = thin_quantiles(entry["fliers"], max(max_points // 10, 2))[0]
+        stats.append(entry)
+    ax.bxp(stats, positions=positions, widths=0.2, showmeans=True, flierprops={"markersize": 2, "alpha": 0.5})
+    ax.set_xticks(positions)
+    ax.set_xticklabels(labels, rotation=30, ha="right")
+    low = np.floor(min(values.min() for values in logs))
+    high = np.ceil(max(values.max() for values in logs))
+    ticks = [
+        np.log10(mantissa) + exponent
+        for exponent in np.arange(low, high + 1)
+        for mantissa in (1, 2, 5)
+    ]
+    ax.yaxis.set_major_locator(FixedLocator(ticks))
+    ax.yaxis.set_major_formatter(FuncFormatter(lambda value, _: f"{10 ** value:.4g}"))
+    ax.set_ylabel("Latenza (ms, scala log)")
+    ax.set_title(title)
+    ax.grid(True, axis="y", linestyle="--", alpha=0.35)
+    save_figure(fig, output)
+
+
+def save_figure(fig: plt.Figure, output: Path) -> None:
+    fig.tight_layout()
+    output.parent.mkdir(parents=True, exist_ok=True)
+    fig.savefig(output, dpi=150)
+    plt.close(fig)
+    print(f"[ok] Grafico salvato in {output}")
+
+
+def parse_group_by(value: str) -> List[str]:
+    group_by = [item.strip() for item in value.split(",") if item.strip()]
+    unknown = [item for item in group_by if item not in GROUP_DIMENSIONS]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"dimensioni sconosciute in --group-by: {', '.join(unknown)}")
+    return group_by
+
+
+def find_details_csvs(args: argparse.Namespace) -> List[Path]:
+    # --distribution without files: the --details CSVs picked by the shared selection flags.
+    root = args.base_dir / args.network
+    if args.day:
+        root = root / args.day
+    paths = []
+    for path in sorted(root.rglob("*.csv")):
+        stem, _, kind = path.stem.rpartition("_")
+        if kind not in DETAIL_KINDS:
+            continue
+        if args.slot and not any(stem.endswith(f"_run{slot}") for slot in args.slot):
+            continue
+        if args.test_name and args.test_name not in stem:
+            continue
+        paths.append(path)
+    if not paths:
+        raise FileNotFoundError(f"Nessun CSV --details in {root} per i filtri indicati")
+    return paths
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
     parser.add_argument(
         "--output-dir",
         type=Path,
@@ -93,11 +350,49 @@ def parse_args() -> argparse.Namespace:
         default=DEFAULT_STYLE,
         help=f"Stile matplotlib da usare (default: {DEFAULT_STYLE}).",
     )
-    return parser.parse_args()
+    parser.add_argument(
+        "--timeline",
+        nargs="+",
+        type=Path,
+        help="File *_timeseries.csv di analyze_latency.py --timeseries: disegna la timeline del singolo run"
+        " invece dei grafici Excel.",
+    )
+    parser.add_argument(
+        "--warmup",
+        type=float,
+        help="Secondi iniziali da evidenziare come fase di avvio nelle timeline.",
+    )
+    parser.add_argument(
+        "--distribution",
+        nargs="*",
+        type=Path,
+        help="CSV --details di analyze_latency.py: ECDF, istogramma log e box/violin per condizione"
+        " invece dei grafici Excel. Senza file usa quelli scelti da --base-dir/--network/--day/--slot/--test-name.",
+    )
+    parser.add_argument(
+        "--group-by",
+        type=parse_group_by,
+        default="network,day,hour,delay",
+        help="Dimensioni del percorso che definiscono una condizione, separate da virgola"
+        f" ({', '.join(GROUP_DIMENSIONS)}; default: network,day,hour,delay).",
+    )
+    add_selection_args(
+        parser,
+        day_help="Giorno (YYYY-MM-DD) dei CSV --details per --distribution senza file.",
+        test_help="Solo i CSV --details di questo test per --distribution senza file.",
+    )
+    parser.add_argument(
+        "--max-points",
+        type=int,
+        default=4000,
+        help="Punti disegnati per condizione dopo il diradamento per quantili (default: 4000).",
+    )
+    parser.add_argument("--bins", type=int, default=60, help="Bin logaritmici dell'istogramma (default: 60).")
+    add_json_arg(parser)
 
 
-def main() -> None:
-    args = parse_args()
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    load_plotting()
     if args.style:
         try:
             plt.style.use(args.style)
@@ -105,6 +400,32 @@ def main() -> None:
             print(f"[avviso] Stile '{args.style}' non disponibile, uso quello di default.")
 
     output_dir: Path = args.output_dir
+    outputs: List[Path] = []
+
+    if args.timeline:
+        for path in args.timeline:
+            outputs.append(output_dir / f"{path.stem}.png")
+            plot_timeline(
+                load_timeseries(path),
+                output=outputs[-1],
+                title=f"Timeline - {path.stem}",
+                warmup=args.warmup,
+            )
+        return {"plots": outputs}
+
+    if args.distribution is not None:
+        sources = args.distribution or find_details_csvs(args)
+        by_kind = load_latencies(sources, args.base_dir, args.group_by)
+        for kind, groups in by_kind.items():
+            groups = {label: values for label, values in groups.items() if len(values)}
+            if not groups:
+                continue
+            prefix = output_dir / f"distribution_{kind}"
+            outputs.extend(prefix.with_name(f"{prefix.name}_{name}.png") for name in ("ecdf", "hist", "box"))
+            plot_ecdf(groups, outputs[-3], f"ECDF - {kind}", args.max_points)
+            plot_log_histogram(groups, outputs[-2], f"Istogramma - {kind}", args.bins)
+            plot_box_violin(groups, outputs[-1], f"Box/violin - {kind}", args.max_points)
+        return {"sources": sources, "plots": outputs}
 
     # Local tables
     local_mediator_df = load_table(Path("risultati-locale-mediator.xlsx"))
@@ -141,6 +462,16 @@ def main() -> None:
         output=output_dir / "sepolia_rpc.png",
         title="Test Sepolia - Chiamate RPC",
     )
+    names = ("local_mediator", "local_rpc", "sepolia_mediator", "sepolia_rpc")
+    return {"plots": [output_dir / f"{name}.png" for name in names]}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Genera i grafici per i 4 file Excel risultati-*.xlsx."
+    )
+    add_arguments(parser)
+    run_command(run, parser.parse_args())
 
 
 if __name__ == "__main__":
@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+'''
+# Continuous baseline against the local Anvil node and mediator, 5 probes/s, hourly files
+python3 probe_latency.py --rpc-url http://127.0.0.1:8545 --mediator-url http://127.0.0.1:3000/didcomm \
+    --rate 5 --concurrency 4 --output-dir ../captures/probe/local
+
+# Sepolia provider only, one file per 15/18/21 slot hour, for 24 hours
+python3 probe_latency.py --rpc-url https://sepolia.infura.io/v3/$INFURA_PROJECT_ID \
+    --rate 2 --duration 86400 --output-dir ../captures/probe/sepolia
+
+# Offline smoke test against the built-in mock JSON-RPC server
+python3 probe_latency.py --mock-rpc 8545 --rpc-url http://127.0.0.1:8545 --duration 10
+
+'''
+import argparse
+import asyncio
+import itertools
+import ssl
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from http.server import ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from analyze_latency import (
+    compute_goodput,
+    compute_summary,
+    decode_didcomm_payload,
+    extract_rpc_target,
+    extract_rpc_info,
+    save_csv,
+    save_summary_csv,
+)
+from record_store import RecordStore
+from run_experiments import MockRpcHandler
+
+# ERC-1056 registry used by the agents (src/veramoAgent*.ts) and its changed(address) read.
+DEFAULT_REGISTRY = "0x03d5003bf0e79C5F5223588F347ebA39AfbC3818"
+CHANGED_SELECTOR = "0xf96d0f9f"
+TRUST_PING_TYPE = "https://didcomm.org/trust-ping/2.0/ping"
+RPC_PROBES = ("eth_blockNumber", "eth_chainId", "eth_call")
+
+
+@dataclass(frozen=True)
+class Endpoint:
+    suffix: str
+    host: str
+    port: int
+    path: str
+    tls: bool
+
+    @classmethod
+    def parse(cls, url: str, suffix: str) -> "Endpoint":
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError(f"unsupported URL: {url}")
+        tls = parts.scheme == "https"
+        path = parts.path or "/"
+        if parts.query:
+            path += f"?{parts.query}"
+        return cls(suffix, parts.hostname, parts.port or (443 if tls else 80), path, tls)
+
+
+@dataclass
+class Probe:
+    endpoint: Endpoint
+    body: bytes
+    content_type: str
+
+
+@dataclass
+class HttpResponse:
+    status: int
+    body: bytes
+    local: Tuple[str, int]
+    remote: Tuple[str, int]
+
+
+class HttpConnection:
+    # One keep-alive HTTP/1.1 connection; reopened lazily when the server closes it.
+    def __init__(self, endpoint: Endpoint, timeout: float, stats: "ProbeStats") -> None:
+        self.endpoint = endpoint
+        self.timeout = timeout
+        self.stats = stats
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+
+    async def connect(self) -> None:
+        context = ssl.create_default_context() if self.endpoint.tls else None
+        self.reader, self.writer = await asyncio.wait_for(
+            asyncio.open_connection(self.endpoint.host, self.endpoint.port, ssl=context),
+            self.timeout,
+        )
+        self.stats.connections += 1
+
+    def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+    async def post(self, probe: Probe) -> Tuple[HttpResponse, float]:
+        # Connection setup stays out of the latency, as in the capture analysis.
+        if self.writer is None or self.writer.is_closing():
+            await self.connect()
+        assert self.reader is not None and self.writer is not None
+        head = (
+            f"POST {self.endpoint.path} HTTP/1.1\r\n"
+            f"Host: {self.endpoint.host}:{self.endpoint.port}\r\n"
+            f"Content-Type: {probe.content_type}\r\n"
+            f"Content-Length: {len(probe.body)}\r\n"
+            "Connection: keep-alive\r\n\r\n"
+        ).encode("ascii")
+        start = time.perf_counter()
+        self.writer.write(head + probe.body)
+        await self.writer.drain()
+        status, headers, body = await asyncio.wait_for(self.read_response(), self.timeout)
+        latency = time.perf_counter() - start
+        response = HttpResponse(
+            status,
+            body,
+            self.writer.get_extra_info("sockname")[:2],
+            self.writer.get_extra_info("peername")[:2],
+        )
+        if headers.get("connection", "").lower() == "close" or headers.get("_version") == "HTTP/1.0":
+            self.close()
+        return response, latency
+
+    async def read_response(self) -> Tuple[int, Dict[str, str], bytes]:
+        assert self.reader is not None
+        status_line = (await self.reader.readline()).decode("latin-1").strip()
+        if not status_line:
+            raise ConnectionError("connection closed by server")
+        version, status, *_ = status_line.split(" ", 2)
+        headers: Dict[str, str] = {"_version": version}
+        while True:
+            line = (await self.reader.readline()).decode("latin-1").strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await self.reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    await self.reader.readline()
+                    break
+                chunks.append(await self.reader.readexactly(size))
+                await self.reader.readline()
+            body = b"".join(chunks)
+        elif "content-length" in headers:
+            body = await self.reader.readexactly(int(headers["content-length"]))
+        else:
+            body = await self.reader.read()
+            headers["connection"] = "close"
+        return int(status), headers, body
+
+
+@dataclass
+class ProbeStats:
+    sent: int = 0
+    errors: int = 0
+    skipped: int = 0
+    connections: int = 0
+
+
+@dataclass
+class ProbeWindow:
+    # Records of one output file (one --rotate interval).
+    label: str
+    stores: Dict[str, RecordStore] = field(default_factory=dict)
+
+
+def rpc_body(method: str, request_id: int, registry: str, identity: str) -> bytes:
+    params = "[]"
+    if method == "eth_call":
+        data = CHANGED_SELECTOR + identity.lower().removeprefix("0x").rjust(64, "0")
+        params = f'[{{"to":"{registry}","data":"{data}"}},"latest"]'
+    return f'{{"jsonrpc":"2.0","id":{request_id},"method":"{method}","params":{params}}}'.encode()
+
+
+def ping_body(mode: str) -> bytes:
+    if mode == "trust-ping":
+        return (
+            f'{{"type":"{TRUST_PING_TYPE}","id":"{uuid.uuid4()}",'
+            '"body":{"response_requested":false}}'
+        ).encode()
+    # An empty plaintext envelope goes through /didcomm and the agent's message
+    # handlers, then is rejected before anything is stored.
+    return b"{}"
+
+
+class Prober:
+    def __init__(self, args: argparse.Namespace) -> None:
+        self.args = args
+        self.stats = ProbeStats()
+        self.sequence = itertools.count(1)
+        self.endpoints: List[Endpoint] = []
+        if args.rpc_url:
+            self.endpoints.append(Endpoint.parse(args.rpc_url, "rpc"))
+        if args.mediator_url:
+            self.endpoints.append(Endpoint.parse(args.mediator_url, "mediator"))
+        self.pools: Dict[Endpoint, asyncio.Queue] = {}
+        self.window: Optional[ProbeWindow] = None
+        self.tasks: set = set()
+        self.started = time.time()
+
+    def next_probes(self) -> itertools.cycle:
+        kinds: List[Tuple[Endpoint, str]] = []
+        for endpoint in self.endpoints:
+            if endpoint.suffix == "rpc":
+                kinds.extend((endpoint, method) for method in RPC_PROBES)
+            else:
+                kinds.append((endpoint, "ping"))
+        return itertools.cycle(kinds)
+
+    def build_probe(self, endpoint: Endpoint, kind: str, request_id: int) -> Probe:
+        if kind == "ping":
+            return Probe(endpoint, ping_body(self.args.ping), "application/didcomm-plain+json")
+        return Probe(
+            endpoint,
+            rpc_body(kind, request_id, self.args.registry, self.args.identity),
+            "application/json",
+        )
+
+    def window_label(self, now: float) -> str:
+        start = now - now % self.args.rotate if self.args.rotate else self.started
+        return datetime.fromtimestamp(start, tz=timezone.utc).strftime("%Y-%m-%d_%H%M%S")
+
+    def record(self, probe: Probe, response: HttpResponse, latency: float, sequence: int) -> None:
+        timestamp = time.time()
+        label = self.window_label(timestamp)
+        if self.window is None or self.window.label != label:
+            self.flush()
+            self.window = ProbeWindow(label)
+        payload = probe.body.decode("utf-8")
+        didcomm = decode_didcomm_payload(payload) if probe.endpoint.suffix == "mediator" else None
+        if didcomm is not None:
+            rpc_method, rpc_id = didcomm.label, didcomm.msg_id
+        elif probe.endpoint.suffix == "mediator":
+            rpc_method, rpc_id = "didcomm-empty", None
+        else:
+            rpc_method, rpc_id = extract_rpc_info(payload)
+        rpc_address, rpc_selector = (None, None) if didcomm else extract_rpc_target(payload)
+        request_bytes = len(probe.body)
+        response_bytes = len(response.body)
+        store = self.window.stores.setdefault(probe.endpoint.suffix, RecordStore())
+        store.append(
+            frame_number=sequence,
+            timestamp=timestamp,
+            src_ip=response.local[0],
+            src_port=str(response.local[1]),
+            dst_ip=response.remote[0],
+            dst_port=str(response.remote[1]),
+            method="POST",
+            host=probe.endpoint.host,
+            uri=probe.endpoint.path,
+            status=str(response.status),
+            latency=latency,
+            rpc_method=rpc_method,
+            rpc_id=rpc_id,
+            request_bytes=request_bytes,
+            response_bytes=response_bytes,
+            goodput=compute_goodput(request_bytes, response_bytes, latency),
+            rpc_address=rpc_address,
+            rpc_selector=rpc_selector,
+            app_actor=didcomm.from_did if didcomm else None,
+        )
+
+    def output_base(self, label: str, stores: Dict[str, RecordStore]) -> Path:
+        # A restart or a second flush in the same --rotate window writes probe_<label>_<n>
+        # instead of overwriting the records already saved for that window.
+        base = self.args.output_dir / f"probe_{label}"
+        part = 1
+        while any((base.parent / f"{base.name}_{suffix}.csv").exists() for suffix in stores):
+            part += 1
+            base = self.args.output_dir / f"probe_{label}_{part}"
+        return base
+
+    def flush(self) -> None:
+        if self.window is None:
+            return
+        base = self.output_base(self.window.label, self.window.stores)
+        for suffix, store in sorted(self.window.stores.items()):
+            summary = compute_summary(store)
+            summary_csv = save_summary_csv(summary, base, suffix)
+            details_csv = save_csv(store, base, suffix)
+            p50 = f"{summary['median']*1000:.2f} ms" if summary["count"] else "-"
+            print(f"  {suffix}: {summary['count']} richieste, P50 {p50} -> {summary_csv}, {details_csv}")
+        self.window = None
+
+    async def send(self, connection: HttpConnection, probe: Probe, sequence: int) -> None:
+        pool = self.pools[probe.endpoint]
+        try:
+            response, latency = await connection.post(probe)
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as exc:
+            self.stats.errors += 1
+            connection.close()
+            if self.args.verbose:
+                print(f"  [!] {probe.endpoint.suffix}: {exc!r}")
+        else:
+            self.record(probe, response, latency, sequence)
+        finally:
+            pool.put_nowait(connection)
+
+    async def run(self) -> None:
+        self.started = time.time()
+        for endpoint in self.endpoints:
+            pool: asyncio.Queue = asyncio.Queue()
+            for _ in range(self.args.concurrency):
+                pool.put_nowait(HttpConnection(endpoint, self.args.timeout, self.stats))
+            self.pools[endpoint] = pool
+        probes = self.next_probes()
+        interval = 1.0 / self.args.rate
+        deadline = time.monotonic() + self.args.duration if self.args.duration else None
+        next_tick = time.monotonic()
+        try:
+            while deadline is None or next_tick < deadline:
+                await asyncio.sleep(max(0.0, next_tick - time.monotonic()))
+                next_tick += interval
+                endpoint, kind = next(probes)
+                pool = self.pools[endpoint]
+                if pool.empty():
+                    # Open loop: a tick finding every connection busy is dropped,
+                    # not queued, so a slow endpoint does not thin out its own samples.
+                    self.stats.skipped += 1
+                    continue
+                sequence = next(self.sequence)
+                self.stats.sent += 1
+                task = asyncio.create_task(
+                    self.send(pool.get_nowait(), self.build_probe(endpoint, kind, sequence), sequence)
+                )
+                self.tasks.add(task)
+                task.add_done_callback(self.tasks.discard)
+            if self.tasks:
+                await asyncio.wait(self.tasks, timeout=self.args.timeout)
+        finally:
+            for task in self.tasks:
+                task.cancel()
+            for pool in self.pools.values():
+                while not pool.empty():
+                    pool.get_nowait().close()
+            self.flush()
+            print(
+                f"[*] Inviate {self.stats.sent}, errori {self.stats.errors},"
+                f" saltate (connessioni occupate) {self.stats.skipped},"
+                f" connessioni aperte {self.stats.connections}"
+            )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Active JSON-RPC and mediator latency prober; writes the analyze_latency.py CSV format.",
+    )
+    parser.add_argument("--rpc-url", help="JSON-RPC endpoint (Anvil, Infura, ...).")
+    parser.add_argument("--mediator-url", help="Mediator DIDComm endpoint, e.g. http://127.0.0.1:3000/didcomm.")
+    parser.add_argument("--rate", type=float, default=1.0, help="Probes per second over all endpoints (default: 1).")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=2,
+        help="Pooled keep-alive connections, hence max requests in flight, per endpoint (default: 2).",
+    )
+    parser.add_argument("--duration", type=float, default=0.0, help="Seconds to run; 0 runs until Ctrl-C (default: 0).")
+    parser.add_argument(
+        "--rotate",
+        type=float,
+        default=3600.0,
+        help="Start new CSVs every ROTATE seconds, aligned to the UTC clock; 0 keeps one file (default: 3600).",
+    )
+    parser.add_argument("--timeout", type=float, default=10.0, help="Per-request timeout in seconds (default: 10).")
+    parser.add_argument("--registry", default=DEFAULT_REGISTRY, help="ERC-1056 registry for the eth_call probe.")
+    parser.add_argument(
+        "--identity",
+        default="0x" + "0" * 40,
+        help="Address passed to changed(address) in the eth_call probe (default: zero address).",
+    )
+    parser.add_argument(
+        "--ping",
+        choices=["empty", "trust-ping"],
+        default="empty",
+        help="Mediator probe: 'empty' is rejected before storage; 'trust-ping' is a plaintext"
+        " trust-ping 2.0 that the mediator stores, having no trust-ping handler (default: empty).",
+    )
+    parser.add_argument(
+        "--output-dir",
+        type=Path,
+        default=Path("captures/probe"),
+        help="Folder for probe_<start>_<rpc|mediator>.csv and summaries (default: ./captures/probe).",
+    )
+    parser.add_argument("--mock-rpc", type=int, metavar="PORT", help="Serve the built-in mock JSON-RPC on PORT.")
+    parser.add_argument("--verbose", action="store_true", help="Print every failed request.")
+    args = parser.parse_args()
+    if not args.rpc_url and not args.mediator_url:
+        parser.error("pass --rpc-url and/or --mediator-url")
+    if args.rate <= 0 or args.concurrency < 1:
+        parser.error("--rate must be positive and --concurrency at least 1")
+    args.output_dir.mkdir(parents=True, exist_ok=True)
+    if args.mock_rpc:
+        mock_server = ThreadingHTTPServer(("127.0.0.1", args.mock_rpc), MockRpcHandler)
+        threading.Thread(target=mock_server.serve_forever, daemon=True).start()
+        print(f"[*] Mock JSON-RPC su http://127.0.0.1:{args.mock_rpc}")
+    try:
+        asyncio.run(Prober(args).run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+'''
+Columnar container for latency records: typed arrays for numbers, one interned
+string table for endpoints/methods/ids and HTTP status codes as small ints.
+Rows are addressed by index; nothing per row is kept as a Python object.
+'''
+import math
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+FLOAT_COLUMNS = ("timestamp", "latency", "mediator_delta_ms", "goodput")
+INT_COLUMNS = ("frame_number", "request_bytes", "response_bytes", "tcp_segments")
+STRING_COLUMNS = (
+    "src_ip",
+    "src_port",
+    "dst_ip",
+    "dst_port",
+    "method",
+    "host",
+    "uri",
+    "rpc_method",
+    "rpc_id",
+    "app_actor",
+    "related_payload_id",
+    "rpc_address",
+    "rpc_selector",
+)
+# Same order as analyze_latency.LatencyRecord.
+FIELDS = (
+    "frame_number",
+    "timestamp",
+    "src_ip",
+    "src_port",
+    "dst_ip",
+    "dst_port",
+    "method",
+    "host",
+    "uri",
+    "status",
+    "latency",
+    "rpc_method",
+    "rpc_id",
+    "app_actor",
+    "related_payload_id",
+    "mediator_delta_ms",
+    "request_bytes",
+    "response_bytes",
+    "tcp_segments",
+    "goodput",
+    "rpc_address",
+    "rpc_selector",
+)
+
+MISSING_INT = -1
+NO_STATUS = 0
+
+
+class StringTable:
+    # Code 0 is None; every distinct string is stored once.
+    __slots__ = ("values", "codes")
+
+    def __init__(self) -> None:
+        self.values: List[Optional[str]] = [None]
+        self.codes: Dict[str, int] = {}
+
+    def code(self, value: Optional[str]) -> int:
+        if value is None:
+            return 0
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.codes[value] = code
+            self.values.append(value)
+        return code
+
+    def value(self, code: int) -> Optional[str]:
+        return self.values[code]
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+
+def status_code(value: Optional[str]) -> int:
+    if not value:
+        return NO_STATUS
+    try:
+        code = int(value.split(",")[0])
+    except ValueError:
+        return NO_STATUS
+    return code if 0 < code < 1000 else NO_STATUS
+
+
+class RecordStore:
+    def __init__(self, strings: Optional[StringTable] = None) -> None:
+        self.strings = strings or StringTable()
+        self.floats: Dict[str, array] = {name: array("d") for name in FLOAT_COLUMNS}
+        self.ints: Dict[str, array] = {name: array("q") for name in INT_COLUMNS}
+        self.codes: Dict[str, array] = {name: array("I") for name in STRING_COLUMNS}
+        self.status = array("H")
+
+    def __len__(self) -> int:
+        return len(self.status)
+
+    @classmethod
+    def from_records(cls, records: Iterable[Any], strings: Optional[StringTable] = None) -> "RecordStore":
+        store = cls(strings)
+        for rec in records:
+            store.append(**{name: getattr(rec, name, None) for name in FIELDS})
+        return store
+
+    def append(self, **fields: Any) -> int:
+        for name, column in self.floats.items():
+            value = fields.get(name)
+            column.append(math.nan if value is None else float(value))
+        for name, column in self.ints.items():
+            value = fields.get(name)
+            try:
+                column.append(MISSING_INT if value in (None, "") else int(value))
+            except ValueError:
+                column.append(MISSING_INT)
+        for name, column in self.codes.items():
+            column.append(self.strings.code(fields.get(name)))
+        self.status.append(status_code(fields.get("status")))
+        return len(self.status) - 1
+
+    def get(self, name: str, index: int) -> Any:
+        if name in self.codes:
+            return self.strings.values[self.codes[name][index]]
+        if name in self.floats:
+            value = self.floats[name][index]
+            return None if math.isnan(value) else value
+        if name in self.ints:
+            value = self.ints[name][index]
+            return None if value == MISSING_INT else value
+        if name == "status":
+            code = self.status[index]
+            return str(code) if code != NO_STATUS else "-"
+        raise KeyError(name)
+
+    def set(self, name: str, index: int, value: Any) -> None:
+        if name in self.codes:
+            self.codes[name][index] = self.strings.code(value)
+        elif name in self.floats:
+            self.floats[name][index] = math.nan if value is None else float(value)
+        elif name in self.ints:
+            self.ints[name][index] = MISSING_INT if value is None else int(value)
+        elif name == "status":
+            self.status[index] = status_code(value)
+        else:
+            raise KeyError(name)
+
+    def column(self, name: str) -> Sequence[Any]:
+        for group in (self.floats, self.ints, self.codes):
+            if name in group:
+                return group[name]
+        if name == "status":
+            return self.status
+        raise KeyError(name)
+
+    def values(self, name: str) -> Iterator[Any]:
+        return (self.get(name, index) for index in range(len(self)))
+
+    def swap_endpoints(self, index: int) -> None:
+        codes = self.codes
+        codes["src_ip"][index], codes["dst_ip"][index] = codes["dst_ip"][index], codes["src_ip"][index]
+        codes["src_port"][index], codes["dst_port"][index] = (
+            codes["dst_port"][index],
+            codes["src_port"][index],
+        )
+
+    def order_by(self, name: str) -> List[int]:
+        column = self.column(name)
+        return sorted(range(len(self)), key=column.__getitem__)
+
+    def request_times(self) -> array:
+        timestamps, latencies = self.floats["timestamp"], self.floats["latency"]
+        return array("d", (ts - lat for ts, lat in zip(timestamps, latencies)))
+
+    def row(self, index: int) -> Dict[str, Any]:
+        row = {name: self.get(name, index) for name in FIELDS}
+        row["frame_number"] = str(row["frame_number"]) if row["frame_number"] is not None else ""
+        for name in ("src_ip", "src_port", "dst_ip", "dst_port", "method", "host", "uri"):
+            row[name] = row[name] or ""
+        return row
+
+    def write_back(self, records: Sequence[Any]) -> None:
+        # Used when a list of record objects went through a store-based function:
+        # only the columns matching/annotation can change are copied back.
+        for index, rec in enumerate(records):
+            for name in STRING_COLUMNS + FLOAT_COLUMNS:
+                setattr(rec, name, self.get(name, index))
+
+    def nbytes(self) -> int:
+        columns = list(self.floats.values()) + list(self.ints.values()) + list(self.codes.values())
+        columns.append(self.status)
+        arrays = sum(column.itemsize * len(column) for column in columns)
+        return arrays + sum(len(value) for value in self.strings.values[1:])
@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+'''
+# Local matrix: 3 runs of testSdr for each netem delay on the Anvil port
+python3 scripts/run_experiments.py --tests testSdr --runs 3 --delays 0,74,211,317 \
+    --network local --apply-netem --rpc-cmd "anvil --port 8545 --chain-id 11155111"
+
+# Same matrix from a JSON file, resuming an interrupted session
+python3 scripts/run_experiments.py --matrix matrix.json
+
+# Offline smoke run against the built-in mock JSON-RPC server
+python3 scripts/run_experiments.py --tests testSdr --runs 1 --network local --mock-rpc 8545
+
+matrix.json:
+{"tests": ["testSdr"], "runs": 3, "network": "local", "rpc_port": 8545,
+ "profiles": [{"name": "0ms", "delay_ms": 0}, {"name": "74ms", "delay_ms": 74}]}
+
+'''
+import argparse
+import json
+import os
+import shlex
+import signal
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+SCRIPTS_DIR = Path(__file__).resolve().parent
+DEFAULT_TEST_CMD = "node --loader ts-node/esm test/{test}.ts"
+DEFAULT_CAPTURE_CMD = "bash {scripts}/capture.sh {iface} {output_dir} {test_name} {day} {run}"
+
+
+@dataclass
+class Profile:
+    name: str
+    delay_ms: Optional[int] = None
+    tag: Optional[str] = None
+
+
+@dataclass
+class Matrix:
+    tests: List[str]
+    runs: int
+    profiles: List[Profile]
+    network: str = "local"
+    rpc_port: int = 8545
+    day: str = field(default_factory=lambda: datetime.now(timezone.utc).strftime("%Y-%m-%d"))
+
+
+class Checkpoint:
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.lock = threading.Lock()
+        self.done: Dict[str, Any] = {}
+        if path.exists():
+            self.done = json.loads(path.read_text(encoding="utf-8")).get("done", {})
+
+    def is_done(self, key: str) -> bool:
+        with self.lock:
+            return key in self.done
+
+    def get(self, key: str) -> Any:
+        with self.lock:
+            return self.done.get(key)
+
+    def mark(self, key: str, value: Any = True) -> None:
+        with self.lock:
+            self.done[key] = value
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(json.dumps({"done": self.done}, indent=2), encoding="utf-8")
+            os.replace(tmp, self.path)
+
+
+class MockRpcHandler(BaseHTTPRequestHandler):
+    # Keep-alive, like Anvil: clients reuse their pooled connections.
+    protocol_version = "HTTP/1.1"
+    block_number = 0x6A0000
+
+    def do_POST(self) -> None:  # noqa: N802
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            payload = {}
+        calls = payload if isinstance(payload, list) else [payload]
+        replies = [self.reply(call) for call in calls if isinstance(call, dict)]
+        body = json.dumps(replies if isinstance(payload, list) else (replies or [{}])[0]).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def reply(self, call: Dict[str, Any]) -> Dict[str, Any]:
+        method = call.get("method")
+        results: Dict[str, Any] = {
+            "eth_chainId": "0xaa36a7",
+            "net_version": "11155111",
+            "eth_blockNumber": hex(self.block_number),
+            "eth_call": "0x" + "0" * 64,
+            "eth_getLogs": [],
+            "eth_gasPrice": "0x3b9aca00",
+            "eth_getBalance": "0x0",
+            "eth_getTransactionCount": "0x0",
+        }
+        return {"jsonrpc": "2.0", "id": call.get("id"), "result": results.get(method)}
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+        return
+
+
+def load_matrix(args: argparse.Namespace) -> Matrix:
+    data: Dict[str, Any] = {}
+    if args.matrix:
+        data = json.loads(args.matrix.read_text(encoding="utf-8"))
+    tests = args.tests.split(",") if args.tests else data.get("tests", ["testSdr"])
+    profiles = [Profile(**item) for item in data.get("profiles", [])]
+    if args.delays:
+        profiles = [Profile(name=f"{int(value)}ms", delay_ms=int(value)) for value in args.delays.split(",")]
+    if not profiles:
+        profiles = [Profile(name="default")]
+    matrix = Matrix(
+        tests=[test.strip() for test in tests if test.strip()],
+        runs=args.runs or int(data.get("runs", 3)),
+        profiles=profiles,
+        network=args.network or data.get("network", "local"),
+        rpc_port=args.rpc_port or int(data.get("rpc_port", 8545)),
+    )
+    matrix.day = args.day or data.get("day") or matrix.day
+    return matrix
+
+
+def fill(template: str, **values: Any) -> str:
+    # str.format would choke on literal braces (e.g. inline JSON bodies).
+    for key, value in values.items():
+        template = template.replace("{" + key + "}", str(value))
+    return template
+
+
+def sudo_prefix() -> List[str]:
+    return [] if os.geteuid() == 0 else ["sudo"]
+
+
+def apply_netem(dev: str, port: int, delay_ms: Optional[int], installed: bool) -> bool:
+    # Same qdisc layout as scripts/netem.md: prio root, netem on band 1:1, sport filter.
+    # Installed on the first profile with a delay, changed in place afterwards; returns
+    # whether the qdisc is now installed.
+    if delay_ms is None:
+        return installed
+    prefix = sudo_prefix()
+    if not installed:
+        subprocess.run(prefix + ["tc", "qdisc", "del", "dev", dev, "root"], capture_output=True)
+        subprocess.run(prefix + ["tc", "qdisc", "add", "dev", dev, "root", "handle", "1:", "prio"], check=True)
+        subprocess.run(
+            prefix
+            + ["tc", "qdisc", "add", "dev", dev, "parent", "1:1", "handle", "20:", "netem", "delay", f"{delay_ms}ms"],
+            check=True,
+        )
+        subprocess.run(
+            prefix
+            + [
+                "tc", "filter", "add", "dev", dev, "protocol", "ip", "parent", "1:", "prio", "1", "u32",
+                "match", "ip", "protocol", "6", "0xff", "match", "ip", "sport", str(port), "0xffff",
+                "flowid", "1:1",
+            ],
+            check=True,
+        )
+        return True
+    subprocess.run(
+        prefix
+        + ["tc", "qdisc", "change", "dev", dev, "parent", "1:1", "handle", "20:", "netem", "delay", f"{delay_ms}ms"],
+        check=True,
+    )
+    return True
+
+
+def clear_netem(dev: str) -> None:
+    subprocess.run(sudo_prefix() + ["tc", "qdisc", "del", "dev", dev, "root"], capture_output=True)
+
+
+def start_background(command: str) -> subprocess.Popen:
+    return subprocess.Popen(shlex.split(command), start_new_session=True)
+
+
+def stop_background(process: subprocess.Popen, timeout: float = 10.0) -> None:
+    if process.poll() is not None:
+        return
+    try:
+        os.killpg(process.pid, signal.SIGINT)
+        process.wait(timeout=timeout)
+    except (ProcessLookupError, subprocess.TimeoutExpired):
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        process.wait()
+
+
+def analyze(pcap: Path, rpc_port: int, extra: List[str]) -> None:
+    cmd = [sys.executable, str(SCRIPTS_DIR / "analyze_latency.py"), str(pcap), "--details", "--rpc-port", str(rpc_port)]
+    subprocess.run(cmd + extra, check=True)
+
+
+def summarize(matrix: Matrix, base_dir: Path, test_name: str) -> None:
+    slots = ",".join(str(run) for run in range(1, matrix.runs + 1))
+    cmd = [
+        sys.executable,
+        str(SCRIPTS_DIR / "summarize_runs.py"),
+        "--day", matrix.day,
+        "--test-name", test_name,
+        "--slots", slots,
+        "--base-dir", str(base_dir),
+        "--network", matrix.network,
+    ]
+    subprocess.run(cmd, check=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Run a tests x runs x network-profile matrix: capture, test, analysis, summary.",
+    )
+    parser.add_argument("--matrix", type=Path, help="JSON scenario matrix (CLI options override it).")
+    parser.add_argument("--tests", help="Comma-separated test names (default: testSdr).")
+    parser.add_argument("--runs", type=int, help="Runs per test and profile (default: 3).")
+    parser.add_argument("--delays", help="Comma-separated netem delays in ms, one profile each.")
+    parser.add_argument("--day", help="Day folder (YYYY-MM-DD, default: today).")
+    parser.add_argument("--network", help="Network subfolder under --base-dir (default: local).")
+    parser.add_argument("--base-dir", type=Path, default=Path("captures"), help="Base captures directory.")
+    parser.add_argument("--rpc-port", type=int, help="RPC port to analyze and delay (default: 8545).")
+    parser.add_argument("--iface", default="any", help="Capture interface (default: any).")
+    parser.add_argument("--test-cmd", default=DEFAULT_TEST_CMD, help=f"Test command template (default: {DEFAULT_TEST_CMD}).")
+    parser.add_argument("--capture-cmd", default=DEFAULT_CAPTURE_CMD, help="Capture command template.")
+    parser.add_argument("--rpc-cmd", help="Local RPC stand-in started for the whole matrix (e.g. anvil).")
+    parser.add_argument("--mediator-cmd", help="Mediator started for the whole matrix.")
+    parser.add_argument("--mock-rpc", type=int, metavar="PORT", help="Serve a built-in mock JSON-RPC on PORT.")
+    parser.add_argument("--apply-netem", action="store_true", help="Apply each profile delay with tc netem.")
+    parser.add_argument("--netem-dev", default="lo", help="Device for tc netem (default: lo).")
+    parser.add_argument("--jobs", type=int, default=2, help="Parallel analysis workers (default: 2).")
+    parser.add_argument("--settle", type=float, default=2.0, help="Seconds between capture start/stop and the test.")
+    parser.add_argument("--test-timeout", type=float, default=600.0, help="Seconds before a test run is killed.")
+    parser.add_argument("--checkpoint", type=Path, help="Progress file (default: <base-dir>/<network>/<day>/.runner.json).")
+    parser.add_argument("--analyze-args", default="", help="Extra arguments for analyze_latency.py.")
+    args = parser.parse_args()
+
+    matrix = load_matrix(args)
+    day_dir = args.base_dir / matrix.network / matrix.day
+    checkpoint = Checkpoint(args.checkpoint or day_dir / ".runner.json")
+    analyze_extra = shlex.split(args.analyze_args)
+    services: List[subprocess.Popen] = []
+    mock_server: Optional[ThreadingHTTPServer] = None
+    if args.mock_rpc:
+        mock_server = ThreadingHTTPServer(("127.0.0.1", args.mock_rpc), MockRpcHandler)
+        threading.Thread(target=mock_server.serve_forever, daemon=True).start()
+        print(f"[*] Mock JSON-RPC su http://127.0.0.1:{args.mock_rpc}")
+    for command in (args.rpc_cmd, args.mediator_cmd):
+        if command:
+            services.append(start_background(command))
+    if services:
+        time.sleep(args.settle)
+
+    pending: List[Future] = []
+    failures: List[str] = []
+    executor = ThreadPoolExecutor(max_workers=max(1, args.jobs))
+    # Summaries wait on analyses: keep them off the analysis pool.
+    summary_executor = ThreadPoolExecutor(max_workers=1)
+
+    def analysis_task(key: str, pcap: Path) -> None:
+        try:
+            analyze(pcap, matrix.rpc_port, analyze_extra)
+        except (OSError, subprocess.CalledProcessError) as exc:
+            failures.append(f"{key}: {exc}")
+            raise
+        checkpoint.mark(key)
+
+    def summary_task(futures: List[Future], test_name: str, key: str) -> None:
+        if any(future.exception() is not None for future in futures):
+            failures.append(f"{key}: skipped, some analyses failed")
+            return
+        try:
+            summarize(matrix, args.base_dir, test_name)
+        except (OSError, subprocess.CalledProcessError) as exc:
+            failures.append(f"{key}: {exc}")
+            return
+        checkpoint.mark(key)
+
+    netem_installed = False
+    try:
+        for profile in matrix.profiles:
+            if args.apply_netem:
+                netem_installed = apply_netem(args.netem_dev, matrix.rpc_port, profile.delay_ms, netem_installed)
+            output_dir = day_dir / profile.name
+            for test in matrix.tests:
+                test_name = f"{test}{profile.tag if profile.tag is not None else profile.name}"
+                analyses: List[Future] = []
+                complete = True
+                for run in range(1, matrix.runs + 1):
+                    prefix = f"{profile.name}/{test}/run{run}"
+                    pcap = output_dir / f"{test_name}_{matrix.day}_run{run}.pcap"
+                    if not checkpoint.is_done(f"{prefix}/capture"):
+                        print(f"\n[+] {prefix}: capture + test")
+                        capture = start_background(
+                            fill(
+                                args.capture_cmd,
+                                scripts=SCRIPTS_DIR,
+                                iface=args.iface,
+                                output_dir=output_dir,
+                                test_name=test_name,
+                                day=matrix.day,
+                                run=run,
+                            )
+                        )
+                        time.sleep(args.settle)
+                        started = time.monotonic()
+                        try:
+                            result = subprocess.run(
+                                shlex.split(fill(args.test_cmd, test=test, run=run, profile=profile.name)),
+                                timeout=args.test_timeout,
+                            )
+                            returncode = result.returncode
+                        except subprocess.TimeoutExpired:
+                            returncode = -1
+                        duration = time.monotonic() - started
+                        time.sleep(args.settle)
+                        stop_background(capture)
+                        if returncode != 0:
+                            failures.append(f"{prefix}: test exit code {returncode}")
+                            complete = False
+                            continue
+                        checkpoint.mark(f"{prefix}/capture", {"pcap": str(pcap), "seconds": round(duration, 3)})
+                    if checkpoint.is_done(f"{prefix}/analyze"):
+                        continue
+                    # Analysis overlaps with the next test run.
+                    future = executor.submit(analysis_task, f"{prefix}/analyze", pcap)
+                    analyses.append(future)
+                    pending.append(future)
+                summary_key = f"{profile.name}/{test}/summarize"
+                if complete and not checkpoint.is_done(summary_key):
+                    pending.append(
+                        summary_executor.submit(summary_task, analyses, test_name, summary_key)
+                    )
+        for future in pending:
+            future.exception()
+    finally:
+        executor.shutdown(wait=True)
+        summary_executor.shutdown(wait=True)
+        for service in services:
+            stop_background(service)
+        if mock_server is not None:
+            mock_server.shutdown()
+        if args.apply_netem:
+            clear_netem(args.netem_dev)
+    print(f"\n[ok] Matrice completata, checkpoint -> {checkpoint.path}")
+    if failures:
+        print("[!] Passi non completati (rilancia per riprendere):")
+        for failure in failures:
+            print(f"    {failure}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+'''
+# One entry point for the analysis scripts: each subcommand takes the options of its script
+python3 sdr.py analyze ../captures/sepolia/2025-11-21/21/testSdr21_2025-11-21_run1.pcap --details --rpc-port 443
+python3 sdr.py summarize --day 2025-11-21 --test-name testSdr21
+
+# JSON result on stdout for automation (before or after the subcommand)
+python3 sdr.py --json summarize --day 2025-11-21 --test-name testSdr21 --slot 1,3
+python3 sdr.py plot --distribution --network local --group-by delay --json
+
+'''
+import argparse
+import importlib
+import sys
+from typing import Dict, List, Optional, Tuple
+
+from cli_args import run_command
+
+# name -> (module, help). A module becomes a subcommand by exposing add_arguments(parser)
+# and run(args) -> JSON-serializable result; it is imported only when its subcommand is
+# the one being run, so `sdr.py summarize` never loads the tshark helpers or matplotlib.
+COMMANDS: Dict[str, Tuple[str, str]] = {
+    "analyze": ("analyze_latency", "Latency of mediator/RPC exchanges in captures (needs tshark)."),
+    "summarize": ("summarize_runs", "Average the mediator/RPC summaries of the runs of a day."),
+    "plot": ("plot_results", "Excel, timeline and latency distribution plots (needs matplotlib)."),
+}
+
+
+def build_parser(argv: List[str]) -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Latency analysis of the SDR benchmark captures.")
+    parser.add_argument(
+        "--json",
+        action="store_true",
+        help="Print a JSON result on stdout (progress messages go to stderr).",
+    )
+    subparsers = parser.add_subparsers(dest="command", metavar="COMMAND", required=True)
+    # The top-level options take no value, so the first positional is the subcommand.
+    chosen = next((arg for arg in argv if not arg.startswith("-")), None)
+    for name, (module_name, help_text) in COMMANDS.items():
+        subparser = subparsers.add_parser(name, help=help_text, description=help_text)
+        if name == chosen:
+            module = importlib.import_module(module_name)
+            module.add_arguments(subparser)
+            subparser.set_defaults(run=module.run)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    argv = sys.argv[1:] if argv is None else argv
+    args = build_parser(argv).parse_args(argv)
+    run_command(args.run, args)
+
+
+if __name__ == "__main__":
+    main()
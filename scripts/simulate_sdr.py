@@ -0,0 +1,493 @@
+#!/usr/bin/env python3
+'''
+# What-if: the 0ms testSdr run replayed with 0/74/150/300 ms of RPC delay
+python3 simulate_sdr.py --template ../captures/local/0ms/testSdr_0ms_mediator.csv --rpc-delay 0,74,150,300
+
+# Same, with eth_chainId cached by the agents and 4 concurrent sessions sharing the mediator
+python3 simulate_sdr.py --template ../captures/local/0ms/testSdr_0ms_mediator.csv --rpc-delay 74 \
+    --cache eth_chainId --sessions 4 --stagger 2
+
+# Check the predictions against every captures/local/<N>ms run
+python3 simulate_sdr.py --template ../captures/local/0ms/testSdr_0ms_mediator.csv --validate ../captures/local
+
+'''
+import argparse
+import bisect
+import csv
+import heapq
+import random
+import re
+from collections import defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from analyze_latency import LatencyRecord, load_details_csv, percentile, resolve_tls_keylog_path
+from attribution_report import load_from_capture, request_start
+from pcap_io import is_capture
+
+# Slack for the rounding of details CSVs (0.01 ms) when nesting and ordering intervals.
+EPSILON = 0.0005
+RPC_SUFFIXES = ("_anvil.csv", "_rpc.csv")
+
+
+@dataclass
+class Step:
+    kind: str
+    operation: str
+    after: Optional[int]
+    gap: float
+    latency: float
+    children: List["Step"] = field(default_factory=list)
+    tail: float = 0.0
+
+
+@dataclass
+class Template:
+    source: str
+    rpc_delay: float
+    steps: List[Step]
+    duration: float
+    mediator_latencies: List[float]
+    rpc_calls: int
+
+
+@dataclass
+class Scenario:
+    rpc_delay: float = 0.0
+    mediator_delay: float = 0.0
+    cache: Tuple[str, ...] = ()
+    sessions: int = 1
+    stagger: float = 0.0
+    mediator_workers: int = 1
+
+
+@dataclass
+class Outcome:
+    durations: List[float] = field(default_factory=list)
+    mediator_latencies: List[float] = field(default_factory=list)
+    rpc_calls: int = 0
+    runs: int = 0
+
+
+def delay_of(path: Path) -> Optional[float]:
+    # captures/local/<N>ms/...: the netem delay the run was measured with.
+    for part in reversed(path.parts[:-1]):
+        match = re.fullmatch(r"(\d+)ms", part)
+        if match:
+            return int(match.group(1)) / 1000.0
+    return None
+
+
+def rpc_csv_for(mediator_csv: Path) -> Optional[Path]:
+    stem = mediator_csv.name[: -len("_mediator.csv")]
+    for suffix in RPC_SUFFIXES:
+        candidate = mediator_csv.with_name(stem + suffix)
+        if candidate.exists():
+            return candidate
+    return None
+
+
+def chain_steps(
+    items: Sequence[Tuple[LatencyRecord, List[Step], float]],
+    kind_of: Callable[[LatencyRecord], str],
+    origin: float,
+) -> List[Step]:
+    # Each request waits for the sibling that completed last before it started
+    # (or for the start of its container); the time in between is local work.
+    ordered = sorted(items, key=lambda item: request_start(item[0]))
+    steps: List[Step] = []
+    ends: List[Tuple[float, int]] = []
+    for rec, children, tail in ordered:
+        start = request_start(rec)
+        pos = bisect.bisect_right(ends, (start + EPSILON, len(ordered)))
+        after = ends[pos - 1][1] if pos else None
+        ready = ends[pos - 1][0] if pos else origin
+        steps.append(
+            Step(
+                kind=kind_of(rec),
+                operation=rec.rpc_method or "-",
+                after=after,
+                gap=max(0.0, start - ready),
+                latency=rec.latency,
+                children=children,
+                tail=tail,
+            )
+        )
+        bisect.insort(ends, (rec.timestamp, len(steps) - 1))
+    return steps
+
+
+def build_template(
+    mediator_records: List[LatencyRecord], rpc_records: List[LatencyRecord], source: str, rpc_delay: float
+) -> Template:
+    mediators = sorted(mediator_records, key=request_start)
+    nested: Dict[int, List[LatencyRecord]] = defaultdict(list)
+    top_level: List[LatencyRecord] = []
+    starts = [request_start(rec) for rec in mediators]
+    for rec in rpc_records:
+        # A call inside a mediator request window is part of that request.
+        pos = bisect.bisect_right(starts, request_start(rec) + EPSILON) - 1
+        if pos >= 0 and rec.timestamp <= mediators[pos].timestamp + EPSILON:
+            nested[pos].append(rec)
+        else:
+            top_level.append(rec)
+    items: List[Tuple[LatencyRecord, List[Step], float]] = [(rec, [], 0.0) for rec in top_level]
+    for index, mediator in enumerate(mediators):
+        start = request_start(mediator)
+        children = chain_steps([(rec, [], 0.0) for rec in nested[index]], lambda _: "rpc", start)
+        # Local work between the last nested call and the response.
+        last = max((rec.timestamp for rec in nested[index]), default=start)
+        items.append((mediator, children, max(0.0, mediator.timestamp - last)))
+    mediator_ids = {id(rec) for rec in mediators}
+    records = mediators + rpc_records
+    origin = min(request_start(rec) for rec in records)
+    steps = chain_steps(items, lambda rec: "mediator" if id(rec) in mediator_ids else "rpc", origin)
+    return Template(
+        source=source,
+        rpc_delay=rpc_delay,
+        steps=steps,
+        duration=max(rec.timestamp for rec in records) - origin,
+        mediator_latencies=[rec.latency for rec in mediators],
+        rpc_calls=len(rpc_records),
+    )
+
+
+class ServiceModel:
+    # Empirical RPC service time per operation: measured latency minus the netem
+    # delay of its capture, resampled with replacement.
+    def __init__(self, rng: random.Random) -> None:
+        self.rng = rng
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+
+    def fit(self, records: List[LatencyRecord], delay: float) -> None:
+        for rec in records:
+            service = max(0.0, rec.latency - delay)
+            self.samples[rec.rpc_method or "-"].append(service)
+            self.samples["*"].append(service)
+
+    def sample(self, operation: str) -> float:
+        values = self.samples.get(operation) or self.samples.get("*") or [0.0]
+        return self.rng.choice(values)
+
+
+class Simulation:
+    def __init__(self, template: Template, scenario: Scenario, service: ServiceModel) -> None:
+        self.template = template
+        self.scenario = scenario
+        self.service = service
+        self.events: List[Tuple[float, int, Callable[[], None]]] = []
+        self.sequence = 0
+        # Mediator local work runs on its Node event loop: a FIFO pool of workers.
+        self.workers = [0.0] * max(1, scenario.mediator_workers)
+        self.outcome = Outcome()
+
+    def at(self, time: float, action: Callable[[], None]) -> None:
+        self.sequence += 1
+        heapq.heappush(self.events, (time, self.sequence, action))
+
+    def local_work(self, now: float, duration: float, on_mediator: bool) -> float:
+        if not on_mediator or duration <= 0:
+            return now + duration
+        free = heapq.heappop(self.workers)
+        end = max(now, free) + duration
+        heapq.heappush(self.workers, end)
+        return end
+
+    def run_steps(
+        self,
+        steps: List[Step],
+        now: float,
+        on_mediator: bool,
+        cache: Set[str],
+        done: Callable[[float], None],
+    ) -> None:
+        if not steps:
+            done(now)
+            return
+        waiting: Dict[Optional[int], List[int]] = defaultdict(list)
+        for index, step in enumerate(steps):
+            waiting[step.after].append(index)
+        remaining = [len(steps)]
+
+        def launch(index: int, ready: float) -> None:
+            start = self.local_work(ready, steps[index].gap, on_mediator)
+            self.at(start, lambda: self.run_step(steps[index], start, cache, lambda end: finished(index, end)))
+
+        def finished(index: int, end: float) -> None:
+            for follower in waiting.get(index, []):
+                launch(follower, end)
+            remaining[0] -= 1
+            if remaining[0] == 0:
+                done(end)
+
+        for index in waiting.get(None, []):
+            launch(index, now)
+
+    def run_step(self, step: Step, now: float, cache: Set[str], done: Callable[[float], None]) -> None:
+        scenario = self.scenario
+        if step.kind == "rpc":
+            if step.operation in scenario.cache and step.operation in cache:
+                self.at(now, lambda: done(now))
+                return
+            cache.add(step.operation)
+            self.outcome.rpc_calls += 1
+            end = now + self.service.sample(step.operation) + scenario.rpc_delay
+            self.at(end, lambda: done(end))
+            return
+
+        def respond(children_done: float) -> None:
+            end = self.local_work(children_done, step.tail, True) + scenario.mediator_delay
+            self.outcome.mediator_latencies.append(end - now)
+            self.at(end, lambda: done(end))
+
+        self.run_steps(step.children, now, True, cache, respond)
+
+    def run(self) -> Outcome:
+        for session in range(max(1, self.scenario.sessions)):
+            start = session * self.scenario.stagger
+
+            def begin(start: float = start) -> None:
+                self.run_steps(
+                    self.template.steps,
+                    start,
+                    False,
+                    set(),
+                    lambda end: self.outcome.durations.append(end - start),
+                )
+
+            self.at(start, begin)
+        while self.events:
+            _, _, action = heapq.heappop(self.events)
+            action()
+        self.outcome.runs = max(1, self.scenario.sessions)
+        return self.outcome
+
+
+def simulate(
+    template: Template, scenario: Scenario, service: ServiceModel, replicas: int
+) -> Outcome:
+    total = Outcome()
+    for _ in range(replicas):
+        outcome = Simulation(template, scenario, service).run()
+        total.durations.extend(outcome.durations)
+        total.mediator_latencies.extend(outcome.mediator_latencies)
+        total.rpc_calls += outcome.rpc_calls
+        total.runs += outcome.runs
+    return total
+
+
+def quantiles_ms(values: List[float]) -> Dict[str, Optional[float]]:
+    ordered = sorted(values)
+
+    def ms(pct: float) -> Optional[float]:
+        value = percentile(ordered, pct)
+        return value * 1000 if value is not None else None
+
+    return {
+        "P50": ms(50),
+        "P90": ms(90),
+        "P95": ms(95),
+        "Max": ordered[-1] * 1000 if ordered else None,
+    }
+
+
+def load_run(
+    path: Path, rpc_csv: Optional[Path], args: argparse.Namespace
+) -> Tuple[List[LatencyRecord], List[LatencyRecord]]:
+    if is_capture(path):
+        tls_keylog_path = resolve_tls_keylog_path(args.tls_keylog)
+        extra_args = ["-o", f"tls.keylog_file:{tls_keylog_path}"] if tls_keylog_path else []
+        return load_from_capture(path, args.mediator_port, args.rpc_port, extra_args)
+    rpc_path = rpc_csv or rpc_csv_for(path)
+    if rpc_path is None:
+        raise FileNotFoundError(f"RPC details CSV not found next to {path} (use --rpc-csv)")
+    return load_details_csv(path), load_details_csv(rpc_path)
+
+
+def format_ms(value: Optional[float]) -> str:
+    return f"{value:.2f}" if value is not None else "-"
+
+
+def error_pct(predicted: Optional[float], measured: Optional[float]) -> str:
+    if predicted is None or not measured:
+        return "-"
+    return f"{(predicted - measured) / measured * 100:+.1f}"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Replay the request structure of a testSdr run under other RPC/mediator conditions.",
+    )
+    parser.add_argument(
+        "--template",
+        type=Path,
+        required=True,
+        help="Mediator details CSV of the reference run (the RPC CSV next to it is used) or a capture.",
+    )
+    parser.add_argument("--rpc-csv", type=Path, help="RPC details CSV of the reference run, if not next to it.")
+    parser.add_argument(
+        "--template-delay",
+        type=float,
+        help="Netem RPC delay (ms) the reference run was captured with (default: from the <N>ms folder, else 0).",
+    )
+    parser.add_argument(
+        "--fit",
+        nargs="*",
+        type=Path,
+        default=[],
+        help="More mediator details CSVs whose RPC calls feed the service-time distributions"
+        " (their delay is read from the <N>ms folder).",
+    )
+    parser.add_argument("--rpc-delay", default="0", help="Comma-separated RPC delays in ms (default: 0).")
+    parser.add_argument("--mediator-delay", default="0", help="Comma-separated mediator delays in ms (default: 0).")
+    parser.add_argument("--cache", default="", help="Comma-separated RPC methods answered from a cache after the first call.")
+    parser.add_argument("--sessions", type=int, default=1, help="Concurrent testSdr sessions (default: 1).")
+    parser.add_argument("--stagger", type=float, default=0.0, help="Seconds between session starts (default: 0).")
+    parser.add_argument(
+        "--mediator-workers",
+        type=int,
+        default=1,
+        help="Mediator requests processed at once; Node runs one event loop (default: 1).",
+    )
+    parser.add_argument("--replicas", type=int, default=100, help="Monte Carlo replicas per scenario (default: 100).")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed (default: 1).")
+    parser.add_argument(
+        "--validate",
+        type=Path,
+        help="Folder of <N>ms runs (e.g. captures/local): predict each measured delay and compare.",
+    )
+    parser.add_argument("--test-name", default="testSdr", help="Test name used with --validate (default: testSdr).")
+    parser.add_argument("--mediator-port", type=int, default=3000, help="Mediator HTTP port for capture input (default: 3000).")
+    parser.add_argument("--rpc-port", type=int, default=8545, help="RPC port for capture input (default: 8545).")
+    parser.add_argument(
+        "--tls-keylog",
+        type=Path,
+        help="Path to an SSLKEYLOGFILE used to decrypt HTTPS captures (defaults to $SSLKEYLOGFILE).",
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        help="Results CSV (default: simulate_sdr.csv next to the template).",
+    )
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    mediator_records, rpc_records = load_run(args.template, args.rpc_csv, args)
+    if not mediator_records:
+        parser.error(f"no mediator requests in {args.template}")
+    template_delay = (
+        args.template_delay / 1000.0 if args.template_delay is not None else delay_of(args.template) or 0.0
+    )
+    template = build_template(mediator_records, rpc_records, str(args.template), template_delay)
+    service = ServiceModel(rng)
+    service.fit(rpc_records, template_delay)
+    for path in args.fit:
+        _, fit_rpc = load_run(path, None, args)
+        service.fit(fit_rpc, delay_of(path) or 0.0)
+    top_mediator = sum(1 for step in template.steps if step.kind == "mediator")
+    nested = sum(len(step.children) for step in template.steps)
+    print(
+        f"[+] Modello da {args.template}: {top_mediator} richieste mediator, {nested} chiamate RPC annidate,"
+        f" {len(template.steps) - top_mediator} chiamate RPC dei client, durata {template.duration:.2f} s"
+    )
+
+    cache = tuple(item.strip() for item in args.cache.split(",") if item.strip())
+    header = [
+        "Ritardo RPC (ms)",
+        "Ritardo mediator (ms)",
+        "Cache",
+        "Sessioni",
+        "Chiamate RPC per run",
+        "Durata P50 (ms)",
+        "Durata P95 (ms)",
+        "Mediator P50 (ms)",
+        "Mediator P90 (ms)",
+        "Mediator P95 (ms)",
+        "Mediator Max (ms)",
+    ]
+    rows: List[List[str]] = []
+    if args.validate:
+        header += [
+            "Durata misurata (ms)",
+            "Errore durata (%)",
+            "Mediator P50 misurato (ms)",
+            "Errore P50 (%)",
+            "Mediator P90 misurato (ms)",
+            "Errore P90 (%)",
+        ]
+        runs = []
+        for folder in sorted(args.validate.iterdir(), key=lambda item: delay_of(item / "x") or 0.0):
+            delay = delay_of(folder / "x")
+            mediator_csv = folder / f"{args.test_name}_{folder.name}_mediator.csv"
+            if delay is None or not mediator_csv.exists():
+                continue
+            measured = build_template(*load_run(mediator_csv, None, args), str(mediator_csv), delay)
+            runs.append((delay, measured))
+        scenarios = [(Scenario(rpc_delay=delay, cache=cache), measured) for delay, measured in runs]
+    else:
+        scenarios = [
+            (
+                Scenario(
+                    rpc_delay=float(rpc_delay) / 1000.0,
+                    mediator_delay=float(mediator_delay) / 1000.0,
+                    cache=cache,
+                    sessions=args.sessions,
+                    stagger=args.stagger,
+                    mediator_workers=args.mediator_workers,
+                ),
+                None,
+            )
+            for rpc_delay in args.rpc_delay.split(",")
+            for mediator_delay in args.mediator_delay.split(",")
+        ]
+
+    for scenario, measured in scenarios:
+        outcome = simulate(template, scenario, service, args.replicas)
+        duration = quantiles_ms(outcome.durations)
+        mediator = quantiles_ms(outcome.mediator_latencies)
+        row = [
+            f"{scenario.rpc_delay * 1000:g}",
+            f"{scenario.mediator_delay * 1000:g}",
+            ",".join(scenario.cache) or "-",
+            str(scenario.sessions),
+            f"{outcome.rpc_calls / max(outcome.runs, 1):.0f}",
+            format_ms(duration["P50"]),
+            format_ms(duration["P95"]),
+            format_ms(mediator["P50"]),
+            format_ms(mediator["P90"]),
+            format_ms(mediator["P95"]),
+            format_ms(mediator["Max"]),
+        ]
+        line = (
+            f"  RPC +{scenario.rpc_delay * 1000:g} ms, mediator +{scenario.mediator_delay * 1000:g} ms,"
+            f" {scenario.sessions} sessioni: durata P50 {format_ms(duration['P50'])} ms,"
+            f" mediator P50 {format_ms(mediator['P50'])} / P90 {format_ms(mediator['P90'])} ms"
+        )
+        if measured is not None:
+            real = quantiles_ms(measured.mediator_latencies)
+            row += [
+                f"{measured.duration * 1000:.2f}",
+                error_pct(duration["P50"], measured.duration * 1000),
+                format_ms(real["P50"]),
+                error_pct(mediator["P50"], real["P50"]),
+                format_ms(real["P90"]),
+                error_pct(mediator["P90"], real["P90"]),
+            ]
+            line += (
+                f" | misurato: durata {measured.duration * 1000:.2f} ms ({row[-5]}%),"
+                f" P50 {row[-4]} ms ({row[-3]}%), P90 {row[-2]} ms ({row[-1]}%)"
+            )
+        rows.append(row)
+        print(line)
+
+    output = args.output or args.template.parent / "simulate_sdr.csv"
+    with output.open("w", newline="", encoding="utf-8") as handle:
+        writer = csv.writer(handle)
+        writer.writerow(header)
+        writer.writerows(rows)
+    print(f"Risultati -> {output}")
+
+
+if __name__ == "__main__":
+    main()
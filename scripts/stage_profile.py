@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+'''
+Per-stage timings for the analysis scripts: wall and CPU time (tshark children
+included), rows handled and how much each stage raised peak RSS, optionally with
+a cProfile per stage. Stages nest; "self" figures exclude nested stages.
+'''
+import json
+import os
+import resource
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    import cProfile
+
+
+@dataclass
+class StageTiming:
+    capture: str
+    stage: str
+    calls: int = 0
+    wall: float = 0.0
+    self_wall: float = 0.0
+    cpu: float = 0.0
+    self_cpu: float = 0.0
+    rows: int = 0
+    rss_raise_kb: int = 0
+    child_rss_raise_kb: int = 0
+    pid: int = 0
+
+
+@dataclass
+class _Frame:
+    timing: StageTiming
+    wall_start: float
+    cpu_start: float
+    rss_start: Tuple[int, int] = (0, 0)
+    child_wall: float = 0.0
+    child_cpu: float = 0.0
+    child_rss: Tuple[int, int] = (0, 0)
+    profile: Optional["cProfile.Profile"] = None
+    rows: List[int] = field(default_factory=lambda: [0])
+
+
+def _cpu_now() -> float:
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+def _maxrss_now() -> Tuple[int, int]:
+    # High-water marks of this process and of the largest waited-for child (tshark).
+    return (
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+
+
+class StageProfiler:
+    def __init__(self, capture: str = "-", with_pstats: bool = False) -> None:
+        self.capture = capture
+        self.with_pstats = with_pstats
+        self.timings: Dict[tuple, StageTiming] = {}
+        self.stack: List[_Frame] = []
+        self.pstats_files: Dict[str, List[str]] = {}
+        self._profiles: Dict[str, "cProfile.Profile"] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[List[int]]:
+        key = (self.capture, name)
+        timing = self.timings.setdefault(key, StageTiming(self.capture, name, pid=os.getpid()))
+        frame = _Frame(timing, time.perf_counter(), _cpu_now(), _maxrss_now())
+        if self.with_pstats:
+            # cProfile/pstats load only with --profile-pstats: they cost the CLI's cold start.
+            import cProfile
+
+            # One profiler per stage, paused while a nested stage runs: exclusive stats.
+            if self.stack and self.stack[-1].profile is not None:
+                self.stack[-1].profile.disable()
+            frame.profile = self._profiles.setdefault(name, cProfile.Profile())
+            frame.profile.enable()
+        self.stack.append(frame)
+        try:
+            yield frame.rows
+        finally:
+            if frame.profile is not None:
+                frame.profile.disable()
+            self.stack.pop()
+            wall = time.perf_counter() - frame.wall_start
+            cpu = _cpu_now() - frame.cpu_start
+            timing.calls += 1
+            timing.wall += wall
+            timing.cpu += cpu
+            timing.self_wall += wall - frame.child_wall
+            timing.self_cpu += cpu - frame.child_cpu
+            timing.rows += frame.rows[0]
+            # ru_maxrss only grows, so a stage owns the part of the peak it added: the
+            # self raises of all stages add up to the process's peak growth.
+            rss_end = _maxrss_now()
+            raised = (rss_end[0] - frame.rss_start[0], rss_end[1] - frame.rss_start[1])
+            timing.rss_raise_kb += raised[0] - frame.child_rss[0]
+            timing.child_rss_raise_kb += raised[1] - frame.child_rss[1]
+            if self.stack:
+                parent = self.stack[-1]
+                parent.child_wall += wall
+                parent.child_cpu += cpu
+                parent.child_rss = (parent.child_rss[0] + raised[0], parent.child_rss[1] + raised[1])
+                if parent.profile is not None:
+                    parent.profile.enable()
+
+    def dump_pstats(self, directory: Optional[Path] = None) -> Dict[str, List[str]]:
+        # Profiles are not picklable: workers hand back file paths the parent can merge.
+        import tempfile
+
+        for name, profile in self._profiles.items():
+            handle, path = tempfile.mkstemp(
+                prefix=f"stage_{name}_", suffix=".pstats", dir=str(directory) if directory else None
+            )
+            os.close(handle)
+            profile.dump_stats(path)
+            self.pstats_files.setdefault(name, []).append(path)
+        self._profiles = {}
+        return self.pstats_files
+
+    def absorb(self, timings: List[StageTiming], pstats_files: Dict[str, List[str]]) -> None:
+        # Timings of helper processes (e.g. capture shards) stay separate rows,
+        # merged by stage in the report like those of --jobs workers.
+        for timing in timings:
+            self.timings[(timing.capture, timing.stage, timing.pid, len(self.timings))] = timing
+        for name, paths in pstats_files.items():
+            self.pstats_files.setdefault(name, []).extend(paths)
+
+    def results(self) -> List[StageTiming]:
+        return list(self.timings.values())
+
+
+_ACTIVE: Optional[StageProfiler] = None
+
+
+def activate_profiler(profiler: Optional[StageProfiler]) -> None:
+    global _ACTIVE
+    _ACTIVE = profiler
+
+
+def active_profiler() -> Optional[StageProfiler]:
+    return _ACTIVE
+
+
+@contextmanager
+def profile_stage(name: str) -> Iterator[List[int]]:
+    # No-op unless a profiler is active; the yielded list holds the row count.
+    if _ACTIVE is None:
+        yield [0]
+        return
+    with _ACTIVE.stage(name) as rows:
+        yield rows
+
+
+def aggregate_stages(timings: List[StageTiming]) -> List[Dict[str, Any]]:
+    totals: Dict[str, Dict[str, Any]] = {}
+    for timing in timings:
+        entry = totals.setdefault(
+            timing.stage,
+            {
+                "stage": timing.stage,
+                "calls": 0,
+                "captures": set(),
+                "workers": set(),
+                "wall": 0.0,
+                "self_wall": 0.0,
+                "cpu": 0.0,
+                "self_cpu": 0.0,
+                "rows": 0,
+                "rss_raise_kb": 0,
+                "child_rss_raise_kb": 0,
+            },
+        )
+        entry["calls"] += timing.calls
+        entry["captures"].add(timing.capture)
+        entry["workers"].add(timing.pid)
+        for key in ("wall", "self_wall", "cpu", "self_cpu", "rows", "rss_raise_kb", "child_rss_raise_kb"):
+            entry[key] += getattr(timing, key)
+    rows = []
+    for entry in totals.values():
+        entry["captures"] = len(entry["captures"])
+        entry["workers"] = len(entry["workers"])
+        entry["rows_per_s"] = entry["rows"] / entry["wall"] if entry["wall"] else None
+        rows.append(entry)
+    rows.sort(key=lambda item: item["self_wall"], reverse=True)
+    return rows
+
+
+def write_profile_report(
+    path: Path,
+    timings: List[StageTiming],
+    wall_total: float,
+    jobs: int,
+    pstats_files: Optional[Dict[str, List[str]]] = None,
+    pstats_path: Optional[Path] = None,
+    external_stages: Tuple[str, ...] = ("tshark",),
+) -> Dict[str, Any]:
+    stages = aggregate_stages(timings)
+    hottest = stages[0]["stage"] if stages else None
+    # Stages that only wait on a subprocess have nothing to show in cProfile.
+    python_stage = next(
+        (item["stage"] for item in stages if item["stage"] not in external_stages), None
+    )
+    dumped = None
+    if pstats_path is not None and python_stage and pstats_files and pstats_files.get(python_stage):
+        import pstats
+
+        stats = pstats.Stats(*pstats_files[python_stage])
+        stats.dump_stats(str(pstats_path))
+        dumped = str(pstats_path)
+    for paths in (pstats_files or {}).values():
+        for item in paths:
+            Path(item).unlink(missing_ok=True)
+    captures: Dict[str, List[Dict[str, Any]]] = {}
+    for timing in timings:
+        captures.setdefault(timing.capture, []).append(asdict(timing))
+    report = {
+        "jobs": jobs,
+        "wall_total": wall_total,
+        "stage_wall_sum": sum(item["self_wall"] for item in stages),
+        "hottest_stage": hottest,
+        "hottest_python_stage": python_stage,
+        "pstats": dumped,
+        "stages": stages,
+        "captures": [
+            {
+                "capture": capture,
+                "wall": sum(item["self_wall"] for item in items),
+                "cpu": sum(item["self_cpu"] for item in items),
+                "stages": items,
+            }
+            for capture, items in captures.items()
+        ],
+    }
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    return report
+
+
+def print_profile_report(report: Dict[str, Any], limit: int = 10) -> None:
+    print(
+        f"\n[profile] {report['wall_total']:.2f} s totali, {report['jobs']} worker,"
+        f" stadio piu' pesante: {report['hottest_stage'] or '-'}"
+    )
+    for item in report["stages"][:limit]:
+        print(
+            f"  {item['stage']:<18} self {item['self_wall']:8.3f} s  cpu {item['self_cpu']:8.3f} s"
+            f"  righe {item['rows']:>9}  +RSS {item['rss_raise_kb'] / 1024:7.1f} MB"
+            f"  +tshark RSS {item['child_rss_raise_kb'] / 1024:7.1f} MB"
+        )
@@ -2,7 +2,9 @@
 import argparse
 import csv
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple
+
+from cli_args import RUN_SLOTS, add_json_arg, add_selection_args, run_command
 
 SUMMARY_ORDER = [
     "Conteggio",
@@ -20,16 +22,6 @@ SUFFIX_LABELS = {
 }
 
 
-def parse_slots(value: str) -> List[str]:
-    raw = [part.strip() for part in value.split(",") if part.strip()]
-    slots = raw or ["1", "2", "3"]
-    for slot in slots:
-        if slot not in {"1", "2", "3"}:
-            raise argparse.ArgumentTypeError(
-                f"Invalid slot '{slot}'. Use digits 1,2,3 separated by commas."
-            )
-    return slots
-
 def find_summary_file(day_dir: Path, filename: str) -> Optional[Path]:
     matches = sorted(day_dir.rglob(filename))
     if not matches:
@@ -139,34 +131,25 @@ def write_summary_csv(
     return csv_path
 
 
-def main() -> None:
-    parser = argparse.ArgumentParser(
-        description="Aggregate mediator/RPC summaries across multiple runs.",
-    )
-    parser.add_argument("--day", required=True, help="Target day folder (YYYY-MM-DD).")
-    parser.add_argument("--test-name", required=True, help="Test/scenario prefix.")
-    parser.add_argument(
-        "--slots",
-        default="1,2,3",
-        help="Comma-separated run slots to include (default: 1,2,3).",
-    )
-    parser.add_argument(
-        "--base-dir",
-        type=Path,
-        default=Path("captures"),
-        help="Base captures directory (default: ./captures).",
-    )
-    parser.add_argument(
-        "--network",
-        default="sepolia",
-        help="Network subfolder under --base-dir (default: sepolia).",
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    add_selection_args(
+        parser,
+        day_required=True,
+        day_help="Target day folder (YYYY-MM-DD).",
+        slot_default="1,2,3",
+        test_required=True,
+        test_help="Test/scenario prefix.",
     )
-    args = parser.parse_args()
-    slots = parse_slots(args.slots)
+    add_json_arg(parser)
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    slots = args.slot or list(RUN_SLOTS)
     day_dir = args.base_dir / args.network / args.day
     if not day_dir.exists():
         raise FileNotFoundError(f"Day folder not found: {day_dir}")
 
+    result: Dict[str, Any] = {"day": args.day, "test_name": args.test_name, "suffixes": {}}
     for suffix in ("mediator", "rpc"):
         per_run_metrics: List[Dict[str, float]] = []
         per_run_methods: List[Dict[str, float]] = []
@@ -201,6 +184,22 @@ def main() -> None:
             missing_slots,
             output_path,
         )
+        result["suffixes"][suffix] = {
+            "runs": found_slots,
+            "missing": missing_slots,
+            "metrics": averaged_metrics,
+            "methods": averaged_methods,
+            "output": output_path,
+        }
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Aggregate mediator/RPC summaries across multiple runs.",
+    )
+    add_arguments(parser)
+    run_command(run, parser.parse_args())
 
 
 if __name__ == "__main__":
@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+'''
+# 10k-frame capture mixing JSON-RPC (8545), DIDComm (3000) and TLS (443) streams
+python3 synth_captures.py ../captures/bench/synth_10k.pcapng --frames 10000
+
+# Slower RPC, more batching and retransmissions, fixed seed
+python3 synth_captures.py /tmp/synth.pcapng --frames 50000 --rpc-latency 120 --batch-every 3 --retransmit-every 5 --seed 7
+
+'''
+import argparse
+import base64
+import csv
+import heapq
+import json
+import random
+import struct
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+from pcap_io import LINKTYPE_ETHERNET, Packet, PcapngWriter, capture_stem
+
+CLIENT_IP = "10.0.0.1"
+SERVER_IPS = {"rpc": "10.0.0.2", "didcomm": "10.0.0.3", "tls": "10.0.0.4"}
+PORTS = {"rpc": 8545, "didcomm": 3000, "tls": 443}
+MSS = 1448
+TLS_RECORD = 1024
+# 2025-11-13T00:00:00Z, so synthetic frames sort next to the real captures.
+EPOCH_US = 1_762_992_000_000_000
+
+RPC_METHODS = ("eth_call", "eth_getLogs", "eth_blockNumber", "eth_chainId", "eth_getBalance")
+DIDCOMM_TYP = "application/didcomm-encrypted+json"
+
+ACK, PSH_ACK, SYN, SYN_ACK = 0x10, 0x18, 0x02, 0x12
+
+# One frame of a synthetic stream: (time in us, tie-breaker, packet, ground truth row)
+Frame = Tuple[int, int, Packet, Optional["Exchange"]]
+
+
+@dataclass
+class SynthConfig:
+    frames: int = 10000
+    rpc_streams: int = 4
+    didcomm_streams: int = 2
+    tls_streams: int = 2
+    rpc_latency_ms: float = 40.0
+    didcomm_latency_ms: float = 15.0
+    tls_latency_ms: float = 80.0
+    jitter_ms: float = 10.0
+    think_ms: float = 5.0
+    batch_every: int = 5
+    large_every: int = 7
+    retransmit_every: int = 11
+    seed: int = 1
+
+
+@dataclass
+class Exchange:
+    kind: str
+    client_port: int
+    operation: str
+    request_us: int
+    response_us: int
+    response_segments: int
+    retransmissions: int
+
+    @property
+    def latency_us(self) -> int:
+        return self.response_us - self.request_us
+
+
+def checksum(header: bytes) -> int:
+    total = sum(struct.unpack(f"!{len(header) // 2}H", header))
+    while total >> 16:
+        total = (total & 0xFFFF) + (total >> 16)
+    return ~total & 0xFFFF
+
+
+def ip_bytes(address: str) -> bytes:
+    return bytes(int(part) for part in address.split("."))
+
+
+class TcpFlow:
+    def __init__(self, client_port: int, kind: str) -> None:
+        self.kind = kind
+        self.client = (ip_bytes(CLIENT_IP), client_port)
+        self.server = (ip_bytes(SERVER_IPS[kind]), PORTS[kind])
+        self.seq = {True: 1000, False: 5000}
+        self.ip_id = 0
+
+    def packet(self, ts_us: int, from_client: bool, flags: int, payload: bytes = b"", seq: Optional[int] = None) -> Packet:
+        (src_ip, src_port), (dst_ip, dst_port) = (
+            (self.client, self.server) if from_client else (self.server, self.client)
+        )
+        own_seq = self.seq[from_client] if seq is None else seq
+        ack = self.seq[not from_client] if flags != SYN else 0
+        tcp = struct.pack("!HHIIBBHHH", src_port, dst_port, own_seq, ack, 5 << 4, flags, 65535, 0, 0)
+        self.ip_id = (self.ip_id + 1) & 0xFFFF
+        ip = struct.pack(
+            "!BBHHHBBH4s4s", 0x45, 0, 20 + len(tcp) + len(payload), self.ip_id, 0x4000, 64, 6, 0, src_ip, dst_ip
+        )
+        ip = ip[:10] + struct.pack("!H", checksum(ip)) + ip[12:]
+        ethernet = b"\x02\x00\x00\x00\x00\x02\x02\x00\x00\x00\x00\x01\x08\x00"
+        if seq is None:
+            self.seq[from_client] = (own_seq + len(payload) + (1 if flags & SYN else 0)) & 0xFFFFFFFF
+        data = ethernet + ip + tcp + payload
+        return Packet(ts_us / 1e6, LINKTYPE_ETHERNET, data, len(data))
+
+
+def http_request(path: str, content_type: str, body: bytes) -> bytes:
+    head = (
+        f"POST {path} HTTP/1.1\r\nHost: synth\r\nContent-Type: {content_type}\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n"
+    )
+    return head.encode("ascii") + body
+
+
+def http_response(status: str, body: bytes) -> bytes:
+    head = (
+        f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n"
+    )
+    return head.encode("ascii") + body
+
+
+def b64url(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def rpc_exchange(rng: random.Random, config: SynthConfig, index: int) -> Tuple[str, bytes, bytes]:
+    method = RPC_METHODS[index % len(RPC_METHODS)]
+    calls = 3 if config.batch_every and index % config.batch_every == config.batch_every - 1 else 1
+    payload = [
+        {"jsonrpc": "2.0", "id": index * 10 + n, "method": method, "params": [{"to": "0x" + "ab" * 20}, "latest"]}
+        for n in range(calls)
+    ]
+    body = json.dumps(payload if calls > 1 else payload[0]).encode("utf-8")
+    result_len = 6000 if config.large_every and index % config.large_every == 0 else 64
+    result = "0x" + rng.randbytes(result_len // 2).hex()
+    answers = [{"jsonrpc": "2.0", "id": call["id"], "result": result} for call in payload]
+    response = json.dumps(answers if calls > 1 else answers[0]).encode("utf-8")
+    return method, http_request("/", "application/json", body), http_response("200 OK", response)
+
+
+def didcomm_exchange(rng: random.Random, config: SynthConfig, index: int) -> Tuple[str, bytes, bytes]:
+    protected = {"typ": DIDCOMM_TYP, "skid": "did:peer:2.synthsender#key-1"}
+    message = {
+        "protected": b64url(json.dumps(protected).encode("utf-8")),
+        "recipients": [{"header": {"kid": "did:peer:2.synthmediator#key-1"}, "encrypted_key": b64url(rng.randbytes(40))}],
+        "iv": b64url(rng.randbytes(12)),
+        "ciphertext": b64url(rng.randbytes(700 if index % 2 else 2800)),
+        "tag": b64url(rng.randbytes(16)),
+    }
+    body = json.dumps(message).encode("utf-8")
+    status = "202 Accepted" if index % 2 else "200 OK"
+    answer = b"" if index % 2 else json.dumps({"status": "ok"}).encode("utf-8")
+    # Only the protected header is visible on an encrypted envelope, so typ is the operation.
+    return DIDCOMM_TYP, http_request("/", DIDCOMM_TYP, body), http_response(status, answer)
+
+
+def tls_record(content_type: int, body: bytes) -> bytes:
+    return struct.pack("!BHH", content_type, 0x0303, len(body)) + body
+
+
+def tls_hello(rng: random.Random, client: bool) -> bytes:
+    if client:
+        hello = struct.pack("!H", 0x0303) + rng.randbytes(32) + b"\x00" + b"\x00\x02\x13\x01" + b"\x01\x00" + b"\x00\x00"
+        handshake = b"\x01" + len(hello).to_bytes(3, "big") + hello
+    else:
+        extensions = b"\x00\x2b\x00\x02\x03\x04"
+        hello = (
+            struct.pack("!H", 0x0303) + rng.randbytes(32) + b"\x00" + b"\x13\x01" + b"\x00"
+            + struct.pack("!H", len(extensions)) + extensions
+        )
+        handshake = b"\x02" + len(hello).to_bytes(3, "big") + hello
+    return tls_record(22, handshake)
+
+
+def segments_of(payload: bytes, size: int) -> List[bytes]:
+    return [payload[offset : offset + size] for offset in range(0, len(payload), size)] or [b""]
+
+
+def stream_frames(kind: str, stream_index: int, config: SynthConfig, budget: int) -> Iterator[Frame]:
+    rng = random.Random(config.seed * 1_000_003 + stream_index)
+    flow = TcpFlow(40000 + stream_index, kind)
+    latency_ms = {
+        "rpc": config.rpc_latency_ms,
+        "didcomm": config.didcomm_latency_ms,
+        "tls": config.tls_latency_ms,
+    }[kind]
+    order = 0
+    now = EPOCH_US + int(stream_index * 1700 + rng.uniform(0, 1000))
+
+    def emit(ts: int, packet: Packet, truth: Optional[Exchange] = None) -> Frame:
+        nonlocal order
+        order += 1
+        return ts, order, packet, truth
+
+    rtt = 200
+    yield emit(now, flow.packet(now, True, SYN))
+    yield emit(now + rtt, flow.packet(now + rtt, False, SYN_ACK))
+    now += 2 * rtt
+    yield emit(now, flow.packet(now, True, ACK))
+    if kind == "tls":
+        now += 50
+        yield emit(now, flow.packet(now, True, PSH_ACK, tls_hello(rng, True)))
+        now += rtt
+        yield emit(now, flow.packet(now, False, PSH_ACK, tls_hello(rng, False)))
+    emitted = order
+    index = 0
+    while emitted < budget:
+        index += 1
+        now += int(rng.uniform(0.5, 1.5) * config.think_ms * 1000)
+        if kind == "rpc":
+            operation, request, response = rpc_exchange(rng, config, index)
+            request_parts = segments_of(request, MSS)
+            response_parts = segments_of(response, MSS)
+        elif kind == "didcomm":
+            operation, request, response = didcomm_exchange(rng, config, index)
+            request_parts = segments_of(request, MSS)
+            response_parts = segments_of(response, MSS)
+        else:
+            operation = "TLS"
+            request_parts = [tls_record(23, rng.randbytes(rng.randint(200, 900)))]
+            records = 4 if config.large_every and index % config.large_every == 0 else 1
+            response_parts = [tls_record(23, rng.randbytes(TLS_RECORD)) for _ in range(records)]
+        for part in request_parts[:-1]:
+            yield emit(now, flow.packet(now, True, ACK, part))
+            now += 30
+        request_us = now
+        yield emit(now, flow.packet(now, True, PSH_ACK, request_parts[-1]))
+        latency = max(1.0, rng.gauss(latency_ms, config.jitter_ms)) * 1000
+        first_us = request_us + int(latency)
+        yield emit(request_us + rtt // 2, flow.packet(request_us + rtt // 2, False, ACK))
+        retransmit = bool(
+            config.retransmit_every
+            and len(response_parts) > 1
+            and index % config.retransmit_every == 0
+        )
+        # HTTP latency ends on the segment that completes the response; the TLS
+        # fallback pairs the request with the first application-data record.
+        ts = first_us
+        response_us = first_us
+        for position, part in enumerate(response_parts):
+            flags = PSH_ACK if position == len(response_parts) - 1 else ACK
+            seq = flow.seq[False]
+            yield emit(ts, flow.packet(ts, False, flags, part))
+            if kind != "tls" or position == 0:
+                response_us = ts
+            if retransmit and position == 0:
+                ts += 40
+                yield emit(ts, flow.packet(ts, False, ACK, part, seq=seq))
+            ts += 60
+        truth = Exchange(
+            kind=kind,
+            client_port=flow.client[1],
+            operation=operation,
+            request_us=request_us,
+            response_us=response_us,
+            response_segments=len(response_parts),
+            retransmissions=1 if retransmit else 0,
+        )
+        now = ts + 100
+        yield emit(now, flow.packet(now, True, ACK), truth)
+        emitted = order
+
+
+def generate(path: Path, config: SynthConfig) -> Tuple[int, List[Exchange]]:
+    streams = (
+        [("rpc", n) for n in range(config.rpc_streams)]
+        + [("didcomm", config.rpc_streams + n) for n in range(config.didcomm_streams)]
+        + [("tls", config.rpc_streams + config.didcomm_streams + n) for n in range(config.tls_streams)]
+    )
+    if not streams:
+        raise ValueError("at least one stream is required")
+    budget = max(1, config.frames // len(streams))
+    generators = [stream_frames(kind, index, config, budget) for kind, index in streams]
+    merged = heapq.merge(
+        *(((ts, n, order, packet, truth) for ts, order, packet, truth in gen) for n, gen in enumerate(generators)),
+        key=lambda item: item[:3],
+    )
+    exchanges: List[Exchange] = []
+    frames = 0
+    with path.open("wb") as handle:
+        writer = PcapngWriter(handle, application="3did synth_captures")
+        for _, _, _, packet, truth in merged:
+            writer.write(packet)
+            frames += 1
+            if truth is not None:
+                exchanges.append(truth)
+    return frames, exchanges
+
+
+def truth_path(path: Path) -> Path:
+    return path.parent / f"{capture_stem(path)}_truth.csv"
+
+
+def write_truth(path: Path, exchanges: List[Exchange]) -> Path:
+    target = truth_path(path)
+    with target.open("w", newline="", encoding="utf-8") as handle:
+        writer = csv.writer(handle)
+        writer.writerow(
+            ("Tipo", "Porta", "Porta client", "Operazione", "Richiesta", "Risposta", "Latency (ms)", "Segmenti risposta", "Ritrasmissioni")
+        )
+        for item in sorted(exchanges, key=lambda exchange: exchange.response_us):
+            writer.writerow(
+                (
+                    item.kind,
+                    PORTS[item.kind],
+                    item.client_port,
+                    item.operation,
+                    f"{item.request_us / 1e6:.6f}",
+                    f"{item.response_us / 1e6:.6f}",
+                    f"{item.latency_us / 1000:.3f}",
+                    item.response_segments,
+                    item.retransmissions,
+                )
+            )
+    return target
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Write a deterministic synthetic capture plus its ground-truth latencies.",
+    )
+    parser.add_argument("output", type=Path, help="Output .pcapng path.")
+    parser.add_argument("--frames", type=int, default=10000, help="Approximate number of frames (default: 10000).")
+    parser.add_argument("--rpc-streams", type=int, default=4, help="HTTP/1.1 JSON-RPC connections on 8545 (default: 4).")
+    parser.add_argument("--didcomm-streams", type=int, default=2, help="DIDComm-over-HTTP connections on 3000 (default: 2).")
+    parser.add_argument("--tls-streams", type=int, default=2, help="Opaque TLS connections on 443 (default: 2).")
+    parser.add_argument("--rpc-latency", type=float, default=40.0, help="Mean JSON-RPC latency in ms (default: 40).")
+    parser.add_argument("--didcomm-latency", type=float, default=15.0, help="Mean DIDComm latency in ms (default: 15).")
+    parser.add_argument("--tls-latency", type=float, default=80.0, help="Mean TLS request latency in ms (default: 80).")
+    parser.add_argument("--jitter", type=float, default=10.0, help="Latency standard deviation in ms (default: 10).")
+    parser.add_argument("--batch-every", type=int, default=5, help="Every Nth RPC request is a 3-call batch, 0 disables (default: 5).")
+    parser.add_argument(
+        "--large-every",
+        type=int,
+        default=7,
+        help="Every Nth response spans several segments/records, 0 disables (default: 7).",
+    )
+    parser.add_argument(
+        "--retransmit-every",
+        type=int,
+        default=11,
+        help="Every Nth multi-segment response retransmits its first segment, 0 disables (default: 11).",
+    )
+    parser.add_argument("--seed", type=int, default=1, help="Random seed (default: 1).")
+    args = parser.parse_args()
+    config = SynthConfig(
+        frames=args.frames,
+        rpc_streams=args.rpc_streams,
+        didcomm_streams=args.didcomm_streams,
+        tls_streams=args.tls_streams,
+        rpc_latency_ms=args.rpc_latency,
+        didcomm_latency_ms=args.didcomm_latency,
+        tls_latency_ms=args.tls_latency,
+        jitter_ms=args.jitter,
+        batch_every=args.batch_every,
+        large_every=args.large_every,
+        retransmit_every=args.retransmit_every,
+        seed=args.seed,
+    )
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    frames, exchanges = generate(args.output, config)
+    truth = write_truth(args.output, exchanges)
+    print(f"[ok] {frames} frame, {len(exchanges)} scambi -> {args.output}")
+    print(f"  Ground truth -> {truth}")
+
+
+if __name__ == "__main__":
+    main()
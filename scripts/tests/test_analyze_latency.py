@@ -0,0 +1,117 @@
+from pathlib import Path
+
+import base64
+import concurrent.futures
+import json
+from array import array
+
+import pytest
+
+import analyze_latency
+from analyze_latency import (
+    LatencyRecord,
+    MediatorMessage,
+    align_mediator_messages,
+    annotate_with_mediator,
+    collect_port_records,
+    collect_sharded_records,
+    decode_didcomm_payload,
+)
+from record_store import RecordStore
+
+
+def mediator_store(requests):
+    # requests: (start, latency) pairs in seconds
+    store = RecordStore()
+    for frame, (start, latency) in enumerate(requests, start=1):
+        store.append(frame_number=frame, timestamp=start + latency, latency=latency, method="POST", status="202")
+    return store
+
+
+def message(msg_id, timestamp):
+    return MediatorMessage(id=msg_id, msg_type="https://didcomm.org/basicmessage/2.0/message",
+                           timestamp=timestamp, from_did=None, to_did=None)
+
+
+def test_overlapping_requests_match_their_own_messages():
+    # A starts first but answers last; B starts and ends inside A.
+    store = mediator_store([(100.0, 3.0), (101.0, 0.1)])
+    messages = [message("msg-a", 100.001), message("msg-b", 101.001)]
+    annotate_with_mediator(store, messages, None, tolerance=0.005)
+    assert [store.get("rpc_id", index) for index in range(2)] == ["msg-a", "msg-b"]
+
+
+def test_estimated_offset_keeps_overlapping_matches():
+    # Mediator DB clock 2 s ahead; a slow request overlaps the next three.
+    starts = [(10.0, 4.0), (11.0, 0.2), (12.0, 0.3), (13.0, 0.1), (20.0, 0.2)]
+    store = mediator_store(starts)
+    messages = [message(f"msg-{index}", start + 2.0 + 0.001) for index, (start, _) in enumerate(starts)]
+    aligned, tolerance, clock = align_mediator_messages(store, messages)
+    assert clock is not None and abs(clock.offset - 2.001) < 0.01
+    assert tolerance < 0.1
+    annotate_with_mediator(store, aligned, None, tolerance=tolerance)
+    assert [store.get("rpc_id", index) for index in range(len(starts))] == [
+        f"msg-{index}" for index in range(len(starts))
+    ]
+
+
+def test_http2_rows_are_merged_in_time_order(monkeypatch):
+    def http1(frame, timestamp):
+        return dict(frame_number=str(frame), timestamp=timestamp, latency=0.05, method="POST", status="200",
+                    tcp_segments=2)
+
+    def http2(frame, timestamp):
+        return LatencyRecord(str(frame), timestamp, "10.0.0.1", "50000", "10.0.0.2", "443", "POST",
+                             "rpc.example", "/", "200", 0.05)
+
+    monkeypatch.setattr(analyze_latency, "collect_requests", lambda *args, **kwargs: {})
+    monkeypatch.setattr(analyze_latency, "response_fields",
+                        lambda *args, **kwargs: iter([http1(10, 1.0), http1(30, 3.0)]))
+    monkeypatch.setattr(analyze_latency, "collect_http2_records",
+                        lambda *args, **kwargs: [http2(20, 2.0), http2(40, 4.0)])
+    store, tls_fallback = collect_port_records(Path("x.pcap"), 443, "rpc", tls_keylog_path=Path("keys.log"))
+    assert not tls_fallback
+    assert list(store.values("timestamp")) == [1.0, 2.0, 3.0, 4.0]
+    assert list(store.values("tcp_segments")) == [2, None, 2, None]
+
+
+@pytest.mark.parametrize("signatures", [[{"header": "kid"}], [{"header": ["kid"]}], "sig", [], ["sig"], {"0": {}}])
+def test_malformed_jws_signatures_are_ignored(signatures):
+    message = {"type": "https://didcomm.org/trust-ping/2.0/ping", "id": "ping-1", "from": "did:ethr:alice"}
+    payload = base64.urlsafe_b64encode(json.dumps(message).encode()).decode().rstrip("=")
+    info = decode_didcomm_payload(json.dumps({"payload": payload, "signatures": signatures}))
+    assert info.envelope == "signed"
+    assert info.msg_id == "ping-1"
+    assert info.kid is None
+
+
+def test_shard_pool_is_capped_by_the_worker_budget(monkeypatch):
+    pools = []
+
+    class InlinePool:
+        def __init__(self, max_workers):
+            pools.append(max_workers)
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def submit(self, fn, *args):
+            future = concurrent.futures.Future()
+            future.set_result(fn(*args))
+            return future
+
+    targets = [("RPC", 8545, "rpc")]
+    monkeypatch.setattr(concurrent.futures, "ProcessPoolExecutor", InlinePool)
+    monkeypatch.setattr(analyze_latency, "split_by_connection",
+                        lambda pcap, shards, directory: [(directory / f"s{i}", array("q", [i + 1]))
+                                                         for i in range(shards)])
+    monkeypatch.setattr(analyze_latency, "shard_records_job",
+                        lambda *args: ({8545: {"http": [], "http2": [], "tls": []}}, [], {}))
+    monkeypatch.setattr(analyze_latency.os, "cpu_count", lambda: 4)
+    collect_sharded_records(Path("x.pcap"), targets, 16)
+    collect_sharded_records(Path("x.pcap"), targets, 16, workers=2)
+    collect_sharded_records(Path("x.pcap"), targets, 3)
+    assert pools == [4, 2, 3]
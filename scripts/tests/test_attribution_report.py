@@ -0,0 +1,49 @@
+from analyze_latency import LatencyRecord
+from attribution_report import attribute, mediator_rpc_sources
+
+MEDIATOR = "10.0.0.9"
+
+
+def request(src, start, latency, dst=(MEDIATOR, "3000"), method="POST"):
+    return LatencyRecord("1", start + latency, src[0], src[1], dst[0], dst[1], method, "-", "/", "202", latency)
+
+
+def rpc(src, start, latency, name="eth_call"):
+    return LatencyRecord("1", start + latency, src[0], src[1], "10.0.0.5", "8545", "POST", "-", "/", "200", latency,
+                         rpc_method=name)
+
+
+def test_overlapping_request_from_another_client_is_not_on_the_path():
+    slow = request(("10.0.0.1", "50000"), 0.0, 1.0)
+    other = request(("10.0.0.2", "50001"), -0.1, 0.8)  # another client, started first
+    mediator_call = rpc((MEDIATOR, "40000"), 0.2, 0.2)
+    client_call = rpc(("10.0.0.2", "40001"), 0.5, 0.2)  # the other client's own resolution
+    attribution = attribute(slow, [slow, other], [mediator_call, client_call])
+    assert attribution.chain == [mediator_call]
+    assert abs(attribution.rpc_time - 0.2) < 1e-9
+    assert attribution.mediator_time == 0.0
+    assert abs(attribution.local_time - 0.8) < 1e-9
+
+
+def test_earlier_request_on_the_same_connection_is_waited_behind():
+    ahead = request(("10.0.0.1", "50000"), -0.5, 0.7)
+    slow = request(("10.0.0.1", "50000"), 0.0, 1.0)
+    attribution = attribute(slow, [ahead, slow], [])
+    assert abs(attribution.mediator_time - 0.2) < 1e-9
+    assert abs(attribution.local_time - 0.8) < 1e-9
+
+
+def test_single_host_client_rpc_connection_is_told_apart():
+    # Everything on loopback: the client's RPC connection also calls while no
+    # mediator request is in flight, the mediator's never does.
+    local = "127.0.0.1"
+    first = request((local, "50000"), 0.0, 1.0, dst=(local, "3000"))
+    second = request((local, "50002"), 0.3, 0.5, dst=(local, "3000"))
+    mediator_call = rpc((local, "40000"), 0.1, 0.1)
+    client_inside = rpc((local, "40001"), 0.4, 0.2)
+    client_outside = rpc((local, "40001"), 2.0, 0.1)
+    records = [mediator_call, client_inside, client_outside]
+    assert mediator_rpc_sources([first, second], records) == {(local, "40000")}
+    attribution = attribute(first, [first, second], records)
+    assert attribution.chain == [mediator_call]
+    assert attribution.mediator_time == 0.0
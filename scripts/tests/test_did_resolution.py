@@ -0,0 +1,71 @@
+import json
+
+from analyze_latency import LatencyRecord, extract_rpc_target
+from did_resolution import batch_saving, group_sessions, summarize_sessions, walk_calls
+
+ADDRESS = "0x" + "ab" * 20
+OTHER = "0x" + "cd" * 20
+REGISTRY = "0x03d5003bf0e79C5F5223588F347ebA39AfbC3818"
+CHANGED, OWNER, NONCE = "0xf96d0f9f", "0x8733d4e8", "0x70ae92d2"
+
+
+def payload(method, address, selector=None):
+    if method == "eth_getLogs":
+        params = [{"address": REGISTRY, "topics": [None, "0x" + address[2:].rjust(64, "0")]}]
+    else:
+        params = [{"to": REGISTRY, "data": selector + address[2:].rjust(64, "0")}, "latest"]
+    return json.dumps({"jsonrpc": "2.0", "id": 1, "method": method, "params": params})
+
+
+def call(method, start, latency, selector=None, address=ADDRESS):
+    rpc_address, rpc_selector = extract_rpc_target(payload(method, address, selector))
+    return LatencyRecord("1", start + latency, "10.0.0.1", "40000", "10.0.0.2", "8545", "POST", "anvil", "/",
+                         "200", latency, rpc_method=method, rpc_address=rpc_address, rpc_selector=rpc_selector)
+
+
+def test_registry_reads_keep_their_selector():
+    assert extract_rpc_target(payload("eth_call", ADDRESS, CHANGED)) == (ADDRESS, CHANGED)
+    assert extract_rpc_target(payload("eth_call", ADDRESS, OWNER)) == (ADDRESS, OWNER)
+    assert extract_rpc_target(payload("eth_getLogs", ADDRESS)) == (ADDRESS, None)
+    assert extract_rpc_target(payload("eth_call", ADDRESS, "0xdeadbeef")) == (None, None)
+
+
+def test_dependent_log_walk_is_not_batchable():
+    changed = call("eth_call", 0.0, 0.1, CHANGED)
+    logs = [call("eth_getLogs", 0.1 + step * 0.1, 0.1) for step in range(3)]
+    [session] = group_sessions([changed] + logs)
+    assert walk_calls(session) == [changed] + logs
+    assert batch_saving(session) == (0.0, 0)
+    summary = dict(summarize_sessions([session]))
+    assert summary["Risparmio batch (ms)"] == "0.00"
+    assert summary["Risparmio batch (RPC)"] == "0"
+
+
+def test_trailing_independent_read_stays_in_its_resolution():
+    owner = call("eth_call", -0.05, 0.1, OWNER)  # half overlapped with changed()
+    changed = call("eth_call", 0.0, 0.1, CHANGED)
+    logs = [call("eth_getLogs", 0.2, 0.1), call("eth_getLogs", 0.3, 0.1)]
+    nonce = call("eth_call", 0.45, 0.05, NONCE)  # after the walk, alone on the wire
+    sessions = group_sessions([owner, changed] + logs + [nonce])
+    assert [(session.repeat, len(session.calls)) for session in sessions] == [(False, 5)]
+    [session] = sessions
+    assert walk_calls(session) == [changed] + logs
+    saved, calls = batch_saving(session)
+    assert calls == 2
+    assert abs(saved - 0.1) < 1e-9  # owner before changed() starts, plus all of nonce
+
+
+def test_resolutions_without_events_are_split_on_changed():
+    # No registry events: each resolution is a lone changed() read, well within --idle-gap.
+    first = call("eth_call", 0.0, 0.05, CHANGED)
+    other = call("eth_call", 0.02, 0.05, CHANGED, address=OTHER)
+    second = call("eth_call", 0.2, 0.05, CHANGED)
+    sessions = group_sessions([first, other, second], idle_gap=1.0)
+    assert [(session.address, session.repeat, len(session.calls)) for session in sessions] == [
+        (ADDRESS, False, 1),
+        (OTHER, False, 1),
+        (ADDRESS, True, 1),
+    ]
+    summary = dict(summarize_sessions(sessions))
+    assert summary["Tasso ripetizione"] == f"{1/3:.4f}"
+    assert summary["Risparmio cache (RPC)"] == "1"
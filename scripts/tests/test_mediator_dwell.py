@@ -0,0 +1,83 @@
+import json
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+from analyze_latency import LatencyRecord, load_mediator_messages
+from mediator_dwell import (
+    DELIVERY_REQUEST_TYPE,
+    FORWARD_TYPE,
+    MESSAGES_RECEIVED_TYPE,
+    STATUS_REQUEST_TYPE,
+    attach_network_latency,
+    build_lifecycles,
+)
+
+T0 = datetime(2025, 11, 13, tzinfo=timezone.utc)
+MEDIATOR = "did:ethr:mediator"
+ALICE = "did:ethr:alice"
+BOB = "did:ethr:bob"
+
+
+def iso(seconds):
+    return (T0 + timedelta(seconds=seconds)).isoformat()
+
+
+def write_db(path, rows):
+    connection = sqlite3.connect(str(path))
+    connection.execute("CREATE TABLE identifier (did TEXT, alias TEXT)")
+    connection.execute("INSERT INTO identifier VALUES (?, 'mediator')", (MEDIATOR,))
+    connection.execute(
+        "CREATE TABLE message (id TEXT, type TEXT, saveDate TEXT, createdAt TEXT,"
+        " fromDid TEXT, toDid TEXT, data TEXT)"
+    )
+    for msg_id, msg_type, seconds, from_did, to_did, data in rows:
+        connection.execute(
+            "INSERT INTO message VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (msg_id, msg_type, iso(seconds), iso(seconds), from_did, to_did, json.dumps(data)),
+        )
+    connection.commit()
+    connection.close()
+
+
+def lifecycle_db(tmp_path):
+    path = tmp_path / "mediator.sqlite"
+    write_db(
+        path,
+        [
+            # Bob polls before the message exists: these must not count.
+            ("s0", STATUS_REQUEST_TYPE, 0.0, BOB, MEDIATOR, {}),
+            ("d0", DELIVERY_REQUEST_TYPE, 1.0, BOB, MEDIATOR, {}),
+            ("fwd", FORWARD_TYPE, 2.0, ALICE, MEDIATOR, {"next": BOB}),
+            ("msg", "https://didcomm.org/basicmessage/2.0/message", 2.01, ALICE, BOB, {}),
+            ("s1", STATUS_REQUEST_TYPE, 3.0, BOB, MEDIATOR, {}),
+            ("d1", DELIVERY_REQUEST_TYPE, 4.0, BOB, MEDIATOR, {}),
+            ("ack", MESSAGES_RECEIVED_TYPE, 4.5, BOB, MEDIATOR, {"message_id_list": ["msg"]}),
+            ("s2", STATUS_REQUEST_TYPE, 6.0, BOB, MEDIATOR, {}),
+        ],
+    )
+    return path
+
+
+def test_polls_count_only_while_the_message_is_queued(tmp_path):
+    rows, mediator_did = load_mediator_messages(lifecycle_db(tmp_path), mediator_only=False)
+    assert mediator_did == MEDIATOR and len(rows) == 8
+    assert rows[2].data == {"next": BOB}
+    [lifecycle] = build_lifecycles(rows, mediator_did)
+    assert lifecycle.id == "msg"
+    assert lifecycle.picked_up == rows[5].timestamp
+    assert lifecycle.acknowledged == rows[6].timestamp
+    assert lifecycle.polls_before_pickup == 1
+
+
+def test_network_latency_needs_a_request_within_tolerance(tmp_path):
+    rows, mediator_did = load_mediator_messages(lifecycle_db(tmp_path), mediator_only=False)
+    [lifecycle] = build_lifecycles(rows, mediator_did)
+
+    def record(start, latency):
+        return LatencyRecord("1", start + latency, "10.0.0.1", "5000", "10.0.0.3", "3000",
+                             "POST", "mediator", "/", "200", latency)
+
+    # A request right at the pickup; the closest one to the ack is a minute away.
+    records = [record(lifecycle.picked_up + 0.002, 0.050), record(lifecycle.acknowledged + 60.0, 9.0)]
+    attach_network_latency([lifecycle], records, tolerance=0.01)
+    assert [round(value, 3) for value in lifecycle.network_ms] == [50.0]
@@ -0,0 +1,152 @@
+import shutil
+import struct
+from dataclasses import replace
+
+import pytest
+
+import merge_captures
+from analyze_latency import LatencyRecord
+from merge_captures import HostCapture, align_hosts, hop_latencies, load_segments, merged_records
+from pcap_io import PcapngWriter, iter_packets, parse_tcp
+from synth_captures import ACK, PSH_ACK, SYN, SYN_ACK, TcpFlow, http_request, http_response
+
+T0 = 1_762_992_000.0
+SKEW = 5.0  # server clock minus client clock, larger than the gap between exchanges
+ONE_WAY = 0.0005
+EXCHANGES = 6
+GAP = 2.0
+SERVICE = 0.040
+
+
+def write_pcap(path, packets):
+    with path.open("wb") as handle:
+        writer = PcapngWriter(handle, application="3did tests")
+        for packet in sorted(packets, key=lambda packet: packet.timestamp):
+            writer.write(packet)
+
+
+def write_host_pair(tmp_path):
+    # One JSON-RPC connection seen by the client and by the server. Each segment is
+    # stamped when it leaves one host and ONE_WAY later on the other; the server
+    # clock runs SKEW ahead. The first response segment is retransmitted 40 ms later
+    # and both copies reach both captures.
+    flow = TcpFlow(40000, "rpc")
+    client, server = [], []
+
+    def send(at, from_client, flags, payload=b"", seq=None):
+        packet = flow.packet(0, from_client, flags, payload, seq=seq)
+        sent, received = (client, server) if from_client else (server, client)
+        sender_clock, receiver_clock = (0.0, SKEW) if from_client else (SKEW, 0.0)
+        sent.append(replace(packet, timestamp=at + sender_clock))
+        received.append(replace(packet, timestamp=at + ONE_WAY + receiver_clock))
+
+    now = T0
+    send(now, True, SYN)
+    send(now + 0.001, False, SYN_ACK)
+    send(now + 0.002, True, ACK)
+    for index in range(EXCHANGES):
+        now = T0 + 1.0 + index * GAP
+        body = f'{{"jsonrpc":"2.0","id":{index},"method":"eth_blockNumber","params":[]}}'.encode()
+        send(now, True, PSH_ACK, http_request("/", "application/json", body))
+        send(now + ONE_WAY, False, ACK)
+        response = http_response("200 OK", f'{{"jsonrpc":"2.0","id":{index},"result":"0x1"}}'.encode())
+        seq = flow.seq[False]
+        send(now + SERVICE, False, PSH_ACK, response)
+        if index == 0:
+            send(now + SERVICE + 0.040, False, PSH_ACK, response, seq=seq)
+        send(now + SERVICE + 2 * ONE_WAY, True, ACK)
+    client_pcap, server_pcap = tmp_path / "client.pcapng", tmp_path / "server.pcapng"
+    write_pcap(client_pcap, client)
+    write_pcap(server_pcap, server)
+    return client_pcap, server_pcap
+
+
+def emulated_tshark(pcap, args):
+    # Same columns as load_segments asks tshark for (SEGMENT_FIELDS), read with pcap_io.
+    lines = []
+    for packet in iter_packets(pcap):
+        tcp = parse_tcp(packet)
+        header = tcp.payload_offset - 20
+        seq, ack = struct.unpack("!II", packet.data[header + 4 : header + 12])
+        flags = packet.data[header + 13]
+        lines.append(
+            "\t".join(
+                (
+                    f"{packet.timestamp:.6f}",
+                    tcp.src_ip,
+                    str(tcp.src_port),
+                    tcp.dst_ip,
+                    str(tcp.dst_port),
+                    str(seq),
+                    str(ack),
+                    str(tcp.payload_len),
+                    f"0x{flags:04x}",
+                )
+            )
+        )
+    return "\n".join(lines)
+
+
+def exchange_records(pcap, port, requests):
+    # Client-side records end when the response arrives, server-side ones when it leaves.
+    from_server = pcap.stem == "server"
+    shift = SKEW if from_server else 0.0
+    latency = SERVICE if from_server else SERVICE + 2 * ONE_WAY
+    start = T0 + 1.0 + (ONE_WAY if from_server else 0.0)
+    for index in range(EXCHANGES):
+        request_start = start + index * GAP + shift
+        yield LatencyRecord(
+            str(index + 1), request_start + latency, "10.0.0.1", "40000", "10.0.0.2", "8545",
+            "POST", "synth", "/", "200", latency, rpc_method="eth_blockNumber", rpc_id=str(index),
+        )
+
+
+def hosts_from(client_pcap, server_pcap):
+    return [
+        HostCapture("client", client_pcap, load_segments(client_pcap)),
+        HostCapture("server", server_pcap, load_segments(server_pcap)),
+    ]
+
+
+def test_merge_recovers_skew_dedups_and_orders(tmp_path, monkeypatch):
+    client_pcap, server_pcap = write_host_pair(tmp_path)
+    monkeypatch.setattr(merge_captures, "run_tshark", emulated_tshark)
+    monkeypatch.setattr(merge_captures, "collect_requests", lambda pcap, port: {})
+    monkeypatch.setattr(merge_captures, "run_tshark_fields", exchange_records)
+    hosts = hosts_from(client_pcap, server_pcap)
+
+    # The retransmitted response segment is kept once, with the original's timestamp.
+    assert len(hosts[0].segments) == len(list(iter_packets(client_pcap))) - 1
+    key = next(key for key, seg in hosts[0].segments.items() if key[2] != "0" and seg.direction[1] == "8545")
+    assert hosts[0].segments[key].timestamp == pytest.approx(T0 + 1.0 + SERVICE + ONE_WAY, abs=1e-6)
+
+    clocks = align_hosts(hosts)
+    assert clocks["client"].offset == 0.0
+    assert clocks["server"].offset == pytest.approx(SKEW, abs=1e-5)
+    assert not clocks["server"].one_way_only
+    hops = hop_latencies(hosts, clocks)
+    assert max(hops[("client", "server")]) == pytest.approx(ONE_WAY, abs=1e-5)
+    assert max(hops[("server", "client")]) == pytest.approx(ONE_WAY, abs=1e-5)
+
+    merged = merged_records(hosts, clocks, [8545])
+    # Unaligned, every server record would sort SKEW seconds later; aligned, each
+    # client request is followed by its server-side twin.
+    assert [(label, rec.rpc_id) for label, rec in merged] == [
+        (label, str(index)) for index in range(EXCHANGES) for label in ("client", "server")
+    ]
+    starts = [rec.timestamp - rec.latency for _, rec in merged]
+    assert starts == sorted(starts)
+    assert starts[1] - starts[0] == pytest.approx(ONE_WAY, abs=1e-5)
+
+
+@pytest.mark.skipif(shutil.which("tshark") is None, reason="tshark not installed")
+def test_merge_with_tshark_matches_the_emulated_fields(tmp_path):
+    client_pcap, server_pcap = write_host_pair(tmp_path)
+    hosts = hosts_from(client_pcap, server_pcap)
+    assert len(hosts[0].segments) == len(list(iter_packets(client_pcap))) - 1
+    clocks = align_hosts(hosts)
+    assert clocks["server"].offset == pytest.approx(SKEW, abs=1e-5)
+    merged = merged_records(hosts, clocks, [8545])
+    assert [label for label, _ in merged] == ["client", "server"] * EXCHANGES
+    starts = [rec.timestamp - rec.latency for _, rec in merged]
+    assert starts == sorted(starts)
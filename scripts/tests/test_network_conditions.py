@@ -0,0 +1,74 @@
+import pytest
+
+from conftest import SCRIPTS_DIR
+from network_conditions import RunConditions, correlations, parse_gas_file, ranks, slot_aggregates
+
+SEPOLIA = SCRIPTS_DIR.parent / "captures" / "sepolia"
+
+
+def test_gas_files_of_the_sepolia_slots_parse():
+    paths = sorted(SEPOLIA.glob("*/*/gasPrice*"))
+    assert paths
+    readings = {f"{path.parent.parent.name}/{path.parent.name}": parse_gas_file(path) for path in paths}
+    assert all(reading is not None for reading in readings.values())
+    assert {reading.source for reading in readings.values()} == {"https://owlracle.info/sepolia"}
+    # "0.0005 GWei" without a trailing newline, mixed-case unit.
+    assert readings["2025-11-13/15"].gwei == pytest.approx(0.0005)
+    assert readings["2025-11-19/15"].gwei == pytest.approx(0.7504)
+
+
+@pytest.mark.parametrize(
+    "text, gwei",
+    [
+        ("https://owlracle.info/sepolia\n1.5 gwei\n", 1.5),
+        ("0,75 GWEI", 0.75),
+        ("1500000000 wei", 1.5),
+        ("2500 mwei", 2.5),
+        ("https://example.org/v2\n3 kwei", 3e-6),
+        ("12gwei (safe low)", 12.0),
+    ],
+)
+def test_gas_units_scale_to_gwei(tmp_path, text, gwei):
+    path = tmp_path / "gasPrice15_2025-11-13"
+    path.write_text(text, encoding="utf-8")
+    assert parse_gas_file(path).gwei == pytest.approx(gwei)
+
+
+def test_gas_file_without_a_reading(tmp_path):
+    path = tmp_path / "gasPrice15_2025-11-13"
+    path.write_text("https://owlracle.info/sepolia\nn/a\n", encoding="utf-8")
+    assert parse_gas_file(path) is None
+
+
+def test_ranks_average_ties():
+    assert ranks([10.0, 30.0, 20.0]) == [1.0, 3.0, 2.0]
+    assert ranks([5.0, 1.0, 5.0, 5.0, 0.0]) == [4.0, 2.0, 4.0, 4.0, 1.0]
+    assert ranks([]) == []
+
+
+def run(day, hour, number, gas, rpc_p50):
+    return RunConditions(day, hour, number, "testSdr", None, {"Gas price (GWei)": gas, "RPC P50 (ms)": rpc_p50})
+
+
+def test_slots_collapse_runs_before_correlating():
+    runs = [
+        run("2025-11-13", "15", "1", 0.001, 100.0),
+        run("2025-11-13", "15", "2", 0.001, 300.0),
+        run("2025-11-13", "15", "3", 0.001, 200.0),
+        run("2025-11-13", "18", "1", 0.002, 250.0),
+        run("2025-11-13", "18", "2", 0.002, None),
+        run("2025-11-14", "15", "1", 0.003, 400.0),
+    ]
+    slots = slot_aggregates(runs)
+    assert [(slot.day, slot.hour, slot.run) for slot in slots] == [
+        ("2025-11-13", "15", "1,2,3"),
+        ("2025-11-13", "18", "1,2"),
+        ("2025-11-14", "15", "1"),
+    ]
+    assert [slot.values["RPC P50 (ms)"] for slot in slots] == [200.0, 250.0, 400.0]
+    rows = {(indicator, metric): row for indicator, metric, *row in correlations(slots)}
+    count, pearson, spearman = rows[("Gas price (GWei)", "RPC P50 (ms)")]
+    # n is the number of slots, not the 5 runs with a value.
+    assert count == 3
+    assert spearman == pytest.approx(1.0)
+    assert pearson == pytest.approx(0.9608, abs=1e-4)
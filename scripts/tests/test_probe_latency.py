@@ -0,0 +1,52 @@
+import argparse
+
+from probe_latency import Prober, ProbeWindow
+from record_store import RecordStore
+
+
+def make_prober(output_dir):
+    args = argparse.Namespace(
+        rpc_url="http://127.0.0.1:8545",
+        mediator_url=None,
+        rotate=3600,
+        output_dir=output_dir,
+    )
+    return Prober(args)
+
+
+def window_with(label, latencies):
+    store = RecordStore()
+    for index, latency in enumerate(latencies, start=1):
+        store.append(
+            frame_number=index,
+            timestamp=1763726400.0 + index,
+            src_ip="127.0.0.1",
+            src_port="50000",
+            dst_ip="127.0.0.1",
+            dst_port="8545",
+            method="POST",
+            host="127.0.0.1",
+            uri="/",
+            status="200",
+            latency=latency,
+            rpc_method="eth_blockNumber",
+        )
+    return ProbeWindow(label, {"rpc": store})
+
+
+def test_flush_in_same_window_keeps_earlier_files(tmp_path):
+    label = "2025-11-21_120000"
+    first = make_prober(tmp_path)
+    first.window = window_with(label, [0.010, 0.012])
+    first.flush()
+    # A restarted prober lands in the same --rotate window.
+    second = make_prober(tmp_path)
+    second.window = window_with(label, [0.020])
+    second.flush()
+
+    first_csv = tmp_path / f"probe_{label}_rpc.csv"
+    second_csv = tmp_path / f"probe_{label}_2_rpc.csv"
+    assert len(first_csv.read_text().splitlines()) == 3
+    assert len(second_csv.read_text().splitlines()) == 2
+    assert (tmp_path / f"probe_{label}_rpc_summary.csv").exists()
+    assert (tmp_path / f"probe_{label}_2_rpc_summary.csv").exists()
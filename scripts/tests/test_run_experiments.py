@@ -0,0 +1,84 @@
+import shutil
+import socket
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+import run_experiments
+from run_experiments import Matrix, Profile, apply_netem, summarize
+
+SUMMARY = "Metric,Value\nConteggio,{count}\nP50 (ms),{p50}\nOperazione: eth_call,{count}\n"
+
+
+def test_apply_netem_installs_on_first_delayed_profile(monkeypatch):
+    calls = []
+    monkeypatch.setattr(run_experiments, "sudo_prefix", lambda: [])
+    monkeypatch.setattr(run_experiments.subprocess, "run", lambda cmd, **kwargs: calls.append(cmd))
+    installed = False
+    for delay in (None, 74, 211):
+        installed = apply_netem("lo", 8545, delay, installed)
+    actions = [cmd[2] for cmd in calls if cmd[1] == "qdisc"]
+    assert actions == ["del", "add", "add", "change"]
+    assert calls[2][-1] == "74ms" and calls[-1][-1] == "211ms"
+
+
+def test_summarize_accepts_more_than_three_runs(tmp_path):
+    day_dir = tmp_path / "local" / "2025-11-13" / "0ms"
+    day_dir.mkdir(parents=True)
+    for run in range(1, 5):
+        for suffix in ("mediator", "rpc"):
+            path = day_dir / f"testSdr0ms_2025-11-13_run{run}_{suffix}_summary.csv"
+            path.write_text(SUMMARY.format(count=10, p50=run * 10), encoding="utf-8")
+    matrix = Matrix(tests=["testSdr"], runs=4, profiles=[Profile("0ms")], day="2025-11-13")
+    summarize(matrix, tmp_path, "testSdr0ms")
+    averaged = (day_dir / "testSdr0ms_2025-11-13_run1234_rpc_summary_avg.csv").read_text(encoding="utf-8")
+    assert "P50 (ms),25.00" in averaged
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.mark.skipif(shutil.which("tshark") is None, reason="analyze_latency.py needs tshark")
+def test_matrix_offline_end_to_end(tmp_path):
+    # Mock RPC + stub test hitting it + stub capture writing a synthetic capture
+    # (tcpdump needs root), then the real analyze and summarize steps.
+    port = free_port()
+    client = tmp_path / "client.py"
+    client.write_text(
+        "import json, sys, urllib.request\n"
+        "body = json.dumps({'jsonrpc': '2.0', 'id': 1, 'method': 'eth_blockNumber'}).encode()\n"
+        f"request = urllib.request.Request('http://127.0.0.1:{port}', body, {{'Content-Type': 'application/json'}})\n"
+        "assert json.load(urllib.request.urlopen(request))['result'].startswith('0x')\n",
+        encoding="utf-8",
+    )
+    synth = run_experiments.SCRIPTS_DIR / "synth_captures.py"
+    result = subprocess.run(
+        [
+            sys.executable,
+            str(run_experiments.SCRIPTS_DIR / "run_experiments.py"),
+            "--tests", "testSdr",
+            "--runs", "4",
+            "--network", "local",
+            "--day", "2025-11-13",
+            "--base-dir", str(tmp_path / "captures"),
+            "--mock-rpc", str(port),
+            "--settle", "0.2",
+            "--test-cmd", f"{sys.executable} {client}",
+            "--capture-cmd",
+            f"{sys.executable} {synth} {{output_dir}}/{{test_name}}_{{day}}_run{{run}}.pcap --frames 300 --seed {{run}}",
+        ],
+        capture_output=True,
+        text=True,
+        timeout=300,
+    )
+    assert result.returncode == 0, result.stdout + result.stderr
+    profile_dir = tmp_path / "captures" / "local" / "2025-11-13" / "default"
+    for run in range(1, 5):
+        assert (profile_dir / f"testSdrdefault_2025-11-13_run{run}_rpc_summary.csv").exists()
+    averaged = profile_dir / "testSdrdefault_2025-11-13_run1234_rpc_summary_avg.csv"
+    assert "Conteggio" in averaged.read_text(encoding="utf-8")
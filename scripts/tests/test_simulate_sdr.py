@@ -0,0 +1,66 @@
+import argparse
+import csv
+import random
+
+import pytest
+
+from simulate_sdr import Scenario, ServiceModel, build_template, delay_of, load_run, simulate
+
+T0 = 1_762_803_130.0
+HEADER = ["Frame", "Timestamp", "Src", "Dst", "Metodo", "URI", "Status", "Operazione", "Latency (ms)"]
+
+# (operation, start, end) in seconds from T0. The agent reads the chain once, then
+# each mediator request makes its own RPC calls: three back to back inside the
+# first, two in parallel followed by one more inside the second. The parallel
+# pair starts with the request, so no mediator local work serializes it.
+MEDIATOR = [("-", 0.020, 0.200), ("-", 0.250, 0.400)]
+RPC = [
+    ("eth_chainId", 0.000, 0.010),
+    ("eth_call", 0.030, 0.050),
+    ("eth_getLogs", 0.060, 0.080),
+    ("eth_getBlockByNumber", 0.090, 0.110),
+    ("eth_getTransactionCount", 0.250, 0.290),
+    ("eth_gasPrice", 0.250, 0.300),
+    ("eth_sendRawTransaction", 0.320, 0.350),
+]
+SEQUENTIAL_RPC = 6  # the two parallel calls count once
+
+
+def write_details(path, rows, port):
+    with path.open("w", newline="", encoding="utf-8") as handle:
+        writer = csv.writer(handle)
+        writer.writerow(HEADER)
+        for index, (operation, start, end) in enumerate(rows):
+            writer.writerow(
+                [index + 1, f"{T0 + end:.6f}", f"127.0.0.1:{44000 + index}", f"127.0.0.1:{port}",
+                 "POST", "/", "200", operation, f"{(end - start) * 1000:.2f}"]
+            )
+
+
+def test_rpc_delay_adds_once_per_sequential_call(tmp_path):
+    run_dir = tmp_path / "0ms"
+    run_dir.mkdir()
+    mediator_csv = run_dir / "testSdr_0ms_mediator.csv"
+    write_details(mediator_csv, MEDIATOR, 3000)
+    write_details(run_dir / "testSdr_0ms_anvil.csv", RPC, 8545)
+
+    # The RPC CSV is found next to the mediator one, the delay from the run folder.
+    mediator_records, rpc_records = load_run(mediator_csv, None, argparse.Namespace())
+    delay = delay_of(mediator_csv)
+    assert delay == 0.0
+    template = build_template(mediator_records, rpc_records, mediator_csv.name, delay)
+    assert template.rpc_calls == len(RPC)
+    assert template.duration == pytest.approx(0.400, abs=1e-5)
+
+    # One sample per operation, so every replica replays the template exactly.
+    service = ServiceModel(random.Random(1))
+    service.fit(rpc_records, delay)
+    durations = {}
+    for extra in (0.0, 0.074, 0.300):
+        outcome = simulate(template, Scenario(rpc_delay=extra), service, replicas=3)
+        assert outcome.rpc_calls == 3 * len(RPC)
+        assert max(outcome.durations) == pytest.approx(min(outcome.durations))
+        durations[extra] = outcome.durations[0]
+    assert durations[0.0] == pytest.approx(template.duration, abs=1e-4)
+    for extra in (0.074, 0.300):
+        assert durations[extra] - durations[0.0] == pytest.approx(SEQUENTIAL_RPC * extra, abs=1e-4)
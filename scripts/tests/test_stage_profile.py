@@ -0,0 +1,21 @@
+from stage_profile import StageProfiler, aggregate_stages
+
+MB = 1024 * 1024
+
+
+def test_rss_raise_is_charged_to_the_stage_that_allocates():
+    profiler = StageProfiler("synth")
+    with profiler.stage("outer"):
+        with profiler.stage("heavy"):
+            block = b"\x01" * (128 * MB)
+            del block
+        with profiler.stage("light"):
+            block = b"\x01" * MB
+            del block
+    stages = {item["stage"]: item for item in aggregate_stages(profiler.results())}
+    # Linux reports ru_maxrss in KB.
+    assert stages["heavy"]["rss_raise_kb"] > 100 * 1024
+    # The later stages stay under the high-water mark heavy left behind, and the
+    # parent is not charged for what its nested stage allocated.
+    assert stages["light"]["rss_raise_kb"] < 8 * 1024
+    assert stages["outer"]["rss_raise_kb"] < 8 * 1024
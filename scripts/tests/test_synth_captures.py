@@ -0,0 +1,76 @@
+import struct
+from collections import Counter, defaultdict
+
+from bench_analyzer import load_truth
+from pcap_io import iter_packets, parse_tcp
+from synth_captures import MSS, PORTS, SynthConfig, generate, truth_path, write_truth
+
+KIND_OF_PORT = {port: kind for kind, port in PORTS.items()}
+
+
+def exchanges_in(pcap):
+    # Rebuilds every exchange from the wire with pcap_io alone: a request starts on
+    # the first client segment of an HTTP POST or TLS application-data record, and
+    # each distinct server sequence number after it is one response segment.
+    exchanges = defaultdict(list)
+    retransmissions = 0
+    seen = set()
+    for packet in iter_packets(pcap):
+        tcp = parse_tcp(packet)
+        assert tcp is not None
+        payload = packet.data[tcp.payload_offset : tcp.payload_offset + tcp.payload_len]
+        if not payload:
+            continue
+        seq = struct.unpack("!I", packet.data[tcp.payload_offset - 16 : tcp.payload_offset - 12])[0]
+        from_client = tcp.dst_port in KIND_OF_PORT
+        port = tcp.dst_port if from_client else tcp.src_port
+        client_port = tcp.src_port if from_client else tcp.dst_port
+        stream = exchanges[(KIND_OF_PORT[port], client_port)]
+        if from_client:
+            if payload.startswith(b"POST ") or payload[0] == 0x17:
+                stream.append({"request": 0, "response": 0, "segments": 0})
+            if stream:
+                stream[-1]["request"] += len(payload)
+        elif stream:
+            if (client_port, seq) in seen:
+                retransmissions += 1
+                continue
+            seen.add((client_port, seq))
+            stream[-1]["response"] += len(payload)
+            stream[-1]["segments"] += 1
+    return exchanges, retransmissions
+
+
+def test_generated_capture_parses_with_expected_exchanges(tmp_path):
+    pcap = tmp_path / "synth.pcapng"
+    config = SynthConfig(frames=3000, seed=5)
+    frames, truth = generate(pcap, config)
+    write_truth(pcap, truth)
+
+    assert sum(1 for _ in iter_packets(pcap)) == frames
+    assert abs(frames - config.frames) < config.frames * 0.05
+    exchanges, retransmissions = exchanges_in(pcap)
+    counts = Counter(kind for (kind, _), stream in exchanges.items() for _ in stream)
+    assert counts == Counter(item.kind for item in truth)
+    assert set(counts) == {"rpc", "didcomm", "tls"}
+    assert retransmissions == sum(item.retransmissions for item in truth) > 0
+    assert len(load_truth(truth_path(pcap))) == len(truth)
+
+    # Per connection, the wire segments match the ground truth exchange by exchange.
+    expected = defaultdict(list)
+    for item in sorted(truth, key=lambda item: item.request_us):
+        expected[(item.kind, item.client_port)].append(item.response_segments)
+    assert {key: [item["segments"] for item in stream] for key, stream in exchanges.items()} == expected
+
+    # Size mix: every --large-every-th RPC answer and TLS response spans several
+    # segments, and DIDComm requests alternate between a small and a multi-segment body.
+    rpc = [item for (kind, _), stream in exchanges.items() if kind == "rpc" for item in stream]
+    large = [item for item in rpc if item["response"] > MSS]
+    assert all(item["response"] > 6000 for item in large)
+    assert all(item["response"] < 1000 for item in rpc if item not in large)
+    assert abs(len(large) / len(rpc) - 1 / config.large_every) < 0.05
+    tls = [item for (kind, _), stream in exchanges.items() if kind == "tls" for item in stream]
+    assert {item["segments"] for item in tls} == {1, 4}
+    didcomm = [item for (kind, _), stream in exchanges.items() if kind == "didcomm" for item in stream]
+    multi = sum(1 for item in didcomm if item["request"] > MSS)
+    assert abs(multi - len(didcomm) / 2) <= config.didcomm_streams